@@ -10,6 +10,11 @@ import os
 import logging
 from flask import Flask
 from config import config
+from .json_provider import create_json_provider
+from .compression import init_compression
+from .assets import init_assets
+from .metrics import init_metrics
+from .profiling import init_profiling
 
 def create_app(config_name=None):
     """
@@ -31,6 +36,7 @@ def create_app(config_name=None):
     
     # Carga la configuración desde el objeto importado de config.py
     app.config.from_object(config[config_name])
+    app.json = create_json_provider(app)
     
     # Asegurarse de que la carpeta de instancia exista
     try:
@@ -41,6 +47,11 @@ def create_app(config_name=None):
     # Configurar el logging
     setup_logging(app)
 
+    # La compresión se registra primero para que sea lo último que se aplique a la respuesta.
+    init_compression(app)
+    init_assets(app)
+    init_metrics(app)
+
     # Registrar Blueprints (módulos de la aplicación)
     from .auth.routes import auth_bp
     app.register_blueprint(auth_bp, url_prefix='/auth')
@@ -48,6 +59,9 @@ def create_app(config_name=None):
     from .main.routes import main_bp
     app.register_blueprint(main_bp)
 
+    # Después de registrar las rutas: envuelve sus vistas si el perfilado está activo.
+    init_profiling(app)
+
     return app
 
 def setup_logging(app):
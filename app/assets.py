@@ -0,0 +1,77 @@
+# app/assets.py
+# -*- coding: utf-8 -*-
+"""
+URLs de los archivos estáticos con el hash de su contenido.
+
+``url_for('static', filename=...)`` agrega ``v=<hash>`` (el inicio del SHA-1 del
+archivo). Como la URL cambia cuando cambia el archivo, las respuestas pedidas
+con el hash vigente se guardan en el navegador por ``STATIC_MAX_AGE`` segundos
+(``immutable``) sin volver a pedirlas. Sin el parámetro, o con un hash viejo,
+se revalidan con ETag en cada uso.
+"""
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from flask import current_app, request
+from werkzeug.security import safe_join
+
+HASH_LENGTH = 12
+
+
+class AssetHashes:
+    """Hash del contenido de cada archivo estático, recalculado si cambia su fecha."""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._hashes: Dict[str, Tuple[int, str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename: str) -> Optional[str]:
+        path = safe_join(self.folder, filename)
+        try:
+            mtime = os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            mtime = None
+        if mtime is None:
+            return None
+        with self._lock:
+            entry = self._hashes.get(filename)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                digest.update(block)
+        value = digest.hexdigest()[:HASH_LENGTH]
+        with self._lock:
+            self._hashes[filename] = (mtime, value)
+        return value
+
+
+def init_assets(app) -> None:
+    """Registra las URLs con hash y las cabeceras de caché de los estáticos."""
+    hashes = AssetHashes(app.static_folder)
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            value = hashes.get(values['filename'])
+            if value is not None:
+                values['v'] = value
+
+    @app.after_request
+    def static_cache_headers(response):
+        if request.endpoint != 'static' or response.status_code not in (200, 304):
+            return response
+        version = request.args.get('v')
+        if version is not None and version == hashes.get(request.view_args['filename']):
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config['STATIC_MAX_AGE']
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+        else:
+            response.cache_control.max_age = None
+            response.cache_control.no_cache = True
+        return response
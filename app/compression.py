@@ -0,0 +1,137 @@
+# app/compression.py
+# -*- coding: utf-8 -*-
+"""
+Compresión gzip/brotli de las respuestas.
+
+Se comprimen las respuestas de texto (JSON, NDJSON, HTML, CSS, JS...) de al menos
+``COMPRESS_MIN_SIZE`` bytes cuando el cliente lo acepta (``Accept-Encoding``):
+brotli si el paquete está instalado y el navegador lo pide, si no gzip.
+
+- Las respuestas en streaming (NDJSON de ``/search``) se comprimen con gzip parte
+  por parte, vaciando el compresor en cada una para que los resultados sigan
+  llegando a medida que se encuentran.
+- Los archivos estáticos comprimidos se guardan en memoria por (ruta, fecha de
+  modificación, codificación): cada worker los comprime una sola vez.
+- El ETag de una respuesta comprimida pasa a ser débil: el contenido es el mismo
+  aunque los bytes no, y así las revalidaciones siguen dando 304.
+"""
+import gzip
+import os
+import threading
+import zlib
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from flask import current_app, request
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # Dependencia opcional: solo gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript', 'text/javascript',
+    'text/html', 'text/css', 'text/plain', 'text/csv', 'image/svg+xml',
+}
+
+
+def choose_encoding(accept_encodings) -> Optional[str]:
+    """Codificación preferida por el cliente entre las disponibles, o None."""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return accept_encodings.best_match(offered)
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'br':
+        # Calidad de brotli (0-11) equivalente al nivel de gzip (1-9).
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def compress_stream(chunks: Iterable, level: int) -> Iterator[bytes]:
+    """Comprime con gzip una respuesta en streaming sin retener ninguna parte."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+
+
+class StaticCompressionCache:
+    """Archivos estáticos ya comprimidos, por ruta, fecha de modificación y codificación."""
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], Tuple[int, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: str, encoding: str, level: int) -> Optional[bytes]:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        with self._lock:
+            entry = self._entries.get((path, encoding))
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+        with open(path, 'rb') as f:
+            data = compress(f.read(), encoding, level)
+        with self._lock:
+            self._entries[(path, encoding)] = (mtime, data)
+        return data
+
+
+def init_compression(app) -> None:
+    """Registra la compresión de respuestas en la aplicación."""
+    static_cache = StaticCompressionCache()
+
+    @app.after_request
+    def compress_response(response):
+        cfg = current_app.config
+        level = cfg['COMPRESS_LEVEL']
+        if (level <= 0 or request.method == 'HEAD' or response.status_code < 200
+                or response.status_code in (204, 206, 304) or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.direct_passthrough:
+            # Archivos enviados con send_file: solo los estáticos, que se comprimen una vez.
+            if request.endpoint != 'static':
+                return response
+            path = safe_join(app.static_folder, request.view_args['filename'])
+            data = static_cache.get(path, encoding, level) if path else None
+            if data is None:
+                return response
+            response.close()
+            response.direct_passthrough = False
+            response.set_data(data)
+        elif response.is_streamed:
+            if request.accept_encodings.best_match(['gzip']) is None:
+                return response
+            encoding = 'gzip'
+            response.response = compress_stream(response.response, level)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < cfg['COMPRESS_MIN_SIZE']:
+                return response
+            compressed = compress(data, encoding, level)
+            if len(compressed) >= len(data):
+                return response
+            response.set_data(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,94 @@
+# app/json_provider.py
+# -*- coding: utf-8 -*-
+"""
+Proveedores JSON de la aplicación (``app.json``).
+
+``StdlibJSONProvider`` es el de Flask (módulo ``json``) y además serializa las
+vistas de registros (``RecordView``). ``OrjsonProvider`` usa orjson, varias veces
+más rápido con respuestas de miles de registros. ``JSON_PROVIDER`` elige uno
+('auto' usa orjson si está instalado).
+
+Los dos ordenan las claves y generan JSON compacto, así que la salida solo cambia
+en los caracteres no ASCII (orjson los deja en UTF-8). ``dumps_bytes`` es lo que
+usa ``FragmentCache`` para codificar cada registro una sola vez.
+"""
+import json
+import logging
+
+from flask.json.provider import DefaultJSONProvider
+
+from .main.records import RecordView
+
+try:
+    import orjson
+except ImportError:  # Dependencia opcional: se usa el módulo json
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+def _default(o):
+    if isinstance(o, RecordView):
+        return o.to_dict()
+    return DefaultJSONProvider.default(o)
+
+
+class StdlibJSONProvider(DefaultJSONProvider):
+    """Proveedor de Flask con el módulo ``json``."""
+
+    default = staticmethod(_default)
+
+    def dumps_bytes(self, obj) -> bytes:
+        """JSON compacto en UTF-8, igual al cuerpo que genera ``jsonify`` fuera de debug."""
+        return json.dumps(obj, default=self.default, ensure_ascii=self.ensure_ascii,
+                          sort_keys=self.sort_keys, separators=(',', ':')).encode('utf-8')
+
+
+class OrjsonProvider(StdlibJSONProvider):
+    """
+    Proveedor con orjson. Las fechas se delegan en ``default`` para mantener el
+    formato HTTP de Flask; lo que orjson no admite (enteros de más de 64 bits,
+    argumentos propios de ``json.dumps``) se codifica con el módulo ``json``.
+    """
+
+    OPTIONS = (orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME) if orjson else 0
+
+    def _orjson(self, obj, option: int = 0) -> bytes:
+        return orjson.dumps(obj, default=self.default, option=self.OPTIONS | option)
+
+    def dumps_bytes(self, obj) -> bytes:
+        try:
+            return self._orjson(obj)
+        except orjson.JSONEncodeError:
+            return super().dumps_bytes(obj)
+
+    def dumps(self, obj, **kwargs) -> str:
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._orjson(obj).decode('utf-8')
+        except orjson.JSONEncodeError:
+            return super().dumps(obj)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(obj)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+
+def create_json_provider(app) -> StdlibJSONProvider:
+    """Proveedor según ``JSON_PROVIDER``: 'auto', 'orjson' o 'stdlib'."""
+    name = app.config.get('JSON_PROVIDER', 'auto')
+    if name not in ('auto', 'orjson', 'stdlib'):
+        raise ValueError(f"Proveedor JSON desconocido: {name}")
+    if name == 'orjson' and orjson is None:
+        logger.warning("JSON_PROVIDER=orjson pero orjson no está instalado; se usa el módulo json.")
+    if name != 'stdlib' and orjson is not None:
+        return OrjsonProvider(app)
+    return StdlibJSONProvider(app)
@@ -0,0 +1,255 @@
+# app/main/cache.py
+# -*- coding: utf-8 -*-
+"""
+Caché LRU de resultados de búsqueda, limitada por bytes.
+
+La clave incluye la generación de los datos (la de los datos internos, que cambia
+con cada ``/update_data``, o el identificador del conjunto subido, que es nuevo en
+cada carga), así una entrada nunca sobrevive a un cambio de datos y no hace falta
+caducarla por tiempo. Cada worker tiene su propia caché.
+
+``CandidateCache`` guarda, por sesión, los candidatos de la última consulta de
+``/search/suggest`` para filtrar en lugar de volver a buscar mientras se escribe,
+``FuzzyIndexCache`` los índices de la búsqueda aproximada de cada fuente y
+``FragmentCache`` el JSON ya codificado de cada registro.
+"""
+import itertools
+import logging
+import threading
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Bytes que se cuentan por entrada además del valor (clave, nodo del diccionario...).
+ENTRY_OVERHEAD = 256
+
+
+class ResultCache:
+    """LRU de valores ``bytes``; cuando se supera ``max_bytes`` se descartan los menos usados."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Hashable, bytes]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(value: bytes) -> int:
+        return len(value) + ENTRY_OVERHEAD
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: bytes) -> None:
+        size = self._size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= self._size(previous)
+            self._entries[key] = value
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= self._size(evicted)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class CandidateCache:
+    """
+    Último conjunto de candidatos de cada sesión para ``/search/suggest``. Si la
+    nueva consulta contiene a la anterior ("024" -> "0245"), sus coincidencias son
+    un subconjunto de las anteriores y basta con filtrarlas. Guarda una entrada por
+    sesión y descarta las sesiones menos recientes.
+    """
+
+    def __init__(self, max_sessions: int):
+        self.max_sessions = max_sessions
+        self._entries: 'OrderedDict[Hashable, Tuple[Hashable, str, array]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_key: Hashable, version: Hashable, query: str) -> Optional[array]:
+        """Candidatos guardados que sirven para ``query``, o None si hay que buscar de nuevo."""
+        with self._lock:
+            entry = self._entries.get(session_key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(session_key)
+        cached_version, cached_query, rows = entry
+        if cached_version != version or cached_query not in query:
+            return None
+        return rows
+
+    def put(self, session_key: Hashable, version: Hashable, query: str, rows: array) -> None:
+        with self._lock:
+            self._entries[session_key] = (version, query, rows)
+            self._entries.move_to_end(session_key)
+            while len(self._entries) > self.max_sessions:
+                self._entries.popitem(last=False)
+
+    def discard(self, session_key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(session_key, None)
+
+
+class FuzzyIndexCache:
+    """
+    Índices de búsqueda aproximada (``FuzzyIndex``) ya construidos, por fuente de
+    datos. Construir uno recorre todos los registros, así que cuando la versión de
+    la fuente cambia se sigue respondiendo con el anterior mientras se reconstruye
+    en segundo plano: las filas no cambian de posición al actualizar, solo pueden
+    quedar unos segundos sin ver los cambios recientes.
+
+    Hay como mucho una construcción por fuente a la vez: los hilos que no
+    encuentran el índice esperan la que ya está en curso. Cada construcción lleva
+    un número de orden y no reemplaza a un índice construido después que ella.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # Por fuente: (versión, índice, número de la construcción que lo generó)
+        self._entries: 'OrderedDict[Hashable, Tuple[Hashable, object, int]]' = OrderedDict()
+        self._building: Dict[Hashable, Future] = {}
+        self._builds = itertools.count()
+        self._lock = threading.Lock()
+
+    def _begin(self, key: Hashable) -> Tuple[Future, int]:
+        # Se llama con ``_lock`` tomado.
+        future = self._building[key] = Future()
+        return future, next(self._builds)
+
+    def _store(self, key: Hashable, version: Hashable, index, number: int) -> None:
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current[2] > number:
+                return
+            self._entries[key] = (version, index, number)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _build(self, key: Hashable, version: Hashable, build: Callable[[], object],
+               future: Future, number: int) -> None:
+        try:
+            index = build()
+            self._store(key, version, index, number)
+            future.set_result((version, index))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._building.pop(key, None)
+
+    def _rebuild(self, key: Hashable, version: Hashable, build: Callable[[], object],
+                 future: Future, number: int) -> None:
+        self._build(key, version, build, future, number)
+        if future.exception() is not None:
+            logger.error(f"Error al reconstruir el índice aproximado {key!r}", exc_info=future.exception())
+
+    def get(self, key: Hashable, version: Hashable, build: Callable[[], object]) -> Tuple[object, bool]:
+        """Índice de ``key`` y si corresponde a ``version`` (False mientras se reconstruye)."""
+        owner = False
+        with self._lock:
+            entry = self._entries.get(key)
+            future = self._building.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if entry[0] != version and future is None:
+                    future, number = self._begin(key)
+                    threading.Thread(target=self._rebuild, args=(key, version, build, future, number),
+                                     daemon=True).start()
+            elif future is None:
+                future, number = self._begin(key)
+                owner = True
+        if entry is not None:
+            return entry[1], entry[0] == version
+        if owner:
+            # Este hilo construye el índice; los demás esperan su resultado.
+            self._build(key, version, build, future, number)
+        built_version, index = future.result()
+        return index, built_version == version
+
+
+class FragmentCache:
+    """
+    JSON de cada registro ya codificado, por (fuente, fila), para armar las
+    respuestas sin volver a codificar registros que no cambiaron. Los almacenes
+    avisan qué filas cambian (``invalidate``); los datos subidos no cambian.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[Hashable, int], bytes]' = OrderedDict()
+        # Invalidaciones por fuente: un fragmento leído antes de una no se guarda después.
+        self._epochs: Dict[Hashable, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, source_key: Hashable, rows: Sequence[int], record_at: Callable[[int], object],
+               dumps: Callable[[object], bytes]) -> List[bytes]:
+        """Fragmentos JSON de ``rows``; se codifican y guardan los que faltan."""
+        with self._lock:
+            epoch = self._epochs.get(source_key, 0)
+            fragments = [self._entries.get((source_key, row_id)) for row_id in rows]
+            for row_id, fragment in zip(rows, fragments):
+                if fragment is not None:
+                    self._entries.move_to_end((source_key, row_id))
+        missing = [i for i, fragment in enumerate(fragments) if fragment is None]
+        for i in missing:
+            fragments[i] = dumps(record_at(rows[i]))
+        with self._lock:
+            self.hits += len(rows) - len(missing)
+            self.misses += len(missing)
+            if missing and self._epochs.get(source_key, 0) == epoch:
+                for i in missing:
+                    self._entries[(source_key, rows[i])] = fragments[i]
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return fragments
+
+    def invalidate(self, source_key: Hashable, rows: Optional[Iterable[int]] = None) -> None:
+        """Descarta los fragmentos de ``rows`` (o de toda la fuente si es None)."""
+        with self._lock:
+            self._epochs[source_key] = self._epochs.get(source_key, 0) + 1
+            if rows is None:
+                for key in [key for key in self._entries if key[0] == source_key]:
+                    del self._entries[key]
+            else:
+                for row_id in rows:
+                    self._entries.pop((source_key, row_id), None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,395 @@
+# app/main/datasets.py
+# -*- coding: utf-8 -*-
+"""
+Almacén en disco de los datos subidos por los usuarios.
+
+En lugar de guardar la hoja de cálculo completa en la cookie de sesión, cada
+carga se escribe en un archivo columnar y la sesión solo guarda su identificador.
+El archivo se abre con ``mmap``, de modo que las páginas las comparte el sistema
+operativo entre los workers y no se decodifica nada hasta que se necesita.
+
+Formato del archivo (``<id>.col``)::
+
+    MAGIC | longitud de la cabecera (uint32) | cabecera JSON
+    por cada columna: desplazamientos (uint32 * (filas + 1)) | textos UTF-8
+
+Los datos se expulsan si no se usan durante el TTL, por uso (LRU según la fecha
+de último acceso del archivo) y por cuota de bytes de cada usuario.
+"""
+import json
+import mmap
+import os
+import re
+import secrets
+import shutil
+import struct
+import tempfile
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from utils import ColumnarFrame
+
+from .index import NGramIndex
+
+MAGIC = b'BDC1'
+_HEADER_LENGTH = struct.Struct('<I')
+_DATASET_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class DatasetQuotaError(Exception):
+    """El conjunto de datos no cabe en la cuota del usuario."""
+
+
+class Dataset:
+    """Vista de solo lectura, mapeada en memoria, de un conjunto de datos columnar."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self._mm.close()
+            raise ValueError(f"Archivo de datos no válido: {path}")
+        start = len(MAGIC) + _HEADER_LENGTH.size
+        (header_length,) = _HEADER_LENGTH.unpack_from(self._mm, len(MAGIC))
+        header = json.loads(self._mm[start:start + header_length].decode('utf-8'))
+
+        self.dataset_id: str = header['id']
+        self.owner: str = header['owner']
+        self.filename: str = header['filename']
+        self.created: float = header['created']
+        self.columns: List[str] = header['columns']
+        self.size: int = len(self._mm)
+        self._rows: int = header['rows']
+        # Por columna: (desplazamientos sin copiar, inicio del bloque de textos).
+        view = memoryview(self._mm)
+        self._offsets = []
+        for offsets_start, data_start in header['blocks']:
+            offsets = view[offsets_start:offsets_start + 4 * (self._rows + 1)].cast('I')
+            self._offsets.append((offsets, data_start))
+        self._index: Optional[NGramIndex] = None
+        self._frame: Optional[ColumnarFrame] = None
+        # Varios hilos pueden pedir a la vez el índice o la vista: se construyen una sola vez.
+        self._build_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._rows
+
+    def field_names(self) -> List[str]:
+        return list(self.columns)
+
+    @property
+    def version(self) -> str:
+        """Un conjunto subido no cambia: su identificador es su versión."""
+        return self.dataset_id
+
+    @property
+    def modified(self) -> float:
+        return self.created
+
+    def value(self, row: int, column: int) -> str:
+        """Valor de una celda."""
+        offsets, data_start = self._offsets[column]
+        return self._mm[data_start + offsets[row]:data_start + offsets[row + 1]].decode('utf-8')
+
+    def row(self, row: int) -> Dict[str, str]:
+        """Registro completo de una fila."""
+        return {name: self.value(row, i) for i, name in enumerate(self.columns)}
+
+    def records(self) -> Iterator[Dict[str, str]]:
+        """Recorre todos los registros en orden."""
+        for row in range(self._rows):
+            yield self.row(row)
+
+    def column(self, name: str) -> List[str]:
+        """Todos los valores de una columna."""
+        column = self.columns.index(name)
+        return [self.value(row, column) for row in range(self._rows)]
+
+    @property
+    def index(self) -> NGramIndex:
+        """Índice de trigramas, construido la primera vez que se busca en el conjunto."""
+        if self._index is None:
+            with self._build_lock:
+                if self._index is None:
+                    self._index = NGramIndex(self.records())
+        return self._index
+
+    @property
+    def frame(self) -> ColumnarFrame:
+        """Vista por columnas para búsquedas vectorizadas (cada columna se carga al usarse)."""
+        if self._frame is None:
+            with self._build_lock:
+                if self._frame is None:
+                    self._frame = ColumnarFrame(self.columns, self._rows, self.column,
+                                                lambda rows: [self.row(row) for row in rows])
+        return self._frame
+
+    def search(self, query: str) -> List[Dict[str, str]]:
+        """Registros donde algún valor contiene ``query`` (ya normalizada)."""
+        return [self.row(row) for row in self.index.search(query)]
+
+    def search_ids(self, query: str, after: int = -1) -> Iterator[int]:
+        """Filas coincidentes posteriores a ``after``, verificadas a medida que se piden."""
+        return self.index.iter_search(query, after)
+
+    def record_at(self, row_id: int) -> Dict[str, str]:
+        return self.row(row_id)
+
+    def row_values(self, row_id: int) -> List[str]:
+        return self.index.values(row_id)
+
+    def close(self) -> None:
+        self._offsets = []
+        self._index = None
+        self._frame = None
+        try:
+            self._mm.close()
+        except BufferError:
+            # Aún hay vistas vivas; el GC cerrará el mapa cuando desaparezcan.
+            pass
+
+
+class DatasetWriter:
+    """
+    Escribe un conjunto de datos fila a fila. Cada columna se acumula en un archivo
+    temporal propio, así que la memoria usada no depende del tamaño de la hoja.
+    Con ``build_index`` el índice de trigramas se construye a medida que llegan
+    las filas y queda listo para buscar al confirmar.
+    """
+
+    def __init__(self, store: 'DatasetStore', owner: str, filename: str, columns: Sequence[str],
+                 build_index: bool = False):
+        self.store = store
+        self.owner = owner
+        self.filename = filename
+        self.columns = [str(c) for c in columns]
+        self.dataset_id = secrets.token_hex(16)
+        self.rows = 0
+        self._tmpdir = tempfile.mkdtemp(prefix='.tmp-', dir=store.folder)
+        self._blobs = [open(os.path.join(self._tmpdir, f"{i}.bin"), 'wb') for i in range(len(self.columns))]
+        self._offsets = [array('I', [0]) for _ in self.columns]
+        self.index: Optional[NGramIndex] = NGramIndex([]) if build_index else None
+
+    def append(self, values: Sequence) -> None:
+        """Agrega una fila (tantos valores como columnas y en el mismo orden)."""
+        values = [str(value) for value in values]
+        for blob, offsets, value in zip(self._blobs, self._offsets, values):
+            encoded = value.encode('utf-8')
+            blob.write(encoded)
+            offsets.append(offsets[-1] + len(encoded))
+        if self.index is not None:
+            self.index.append(dict(zip(self.columns, values)))
+        self.rows += 1
+
+    def extend(self, rows: Iterable[Sequence]) -> None:
+        for values in rows:
+            self.append(values)
+
+    def commit(self) -> str:
+        """Escribe el archivo definitivo de forma atómica y lo registra en el almacén."""
+        for blob in self._blobs:
+            blob.close()
+        try:
+            header = {
+                'id': self.dataset_id, 'owner': self.owner, 'filename': self.filename,
+                'created': time.time(), 'columns': self.columns, 'rows': self.rows,
+            }
+            # La posición de cada bloque depende de la longitud de la cabecera, que a su
+            # vez incluye esas posiciones; se reserva espacio fijo para los números.
+            blocks = [[0, 0] for _ in self.columns]
+            header['blocks'] = [[10 ** 12, 10 ** 12] for _ in self.columns]
+            header_length = len(json.dumps(header).encode('utf-8'))
+            position = len(MAGIC) + _HEADER_LENGTH.size + header_length
+            for i, offsets in enumerate(self._offsets):
+                position += (-position) % 4
+                blocks[i][0] = position
+                position += 4 * len(offsets)
+                blocks[i][1] = position
+                position += offsets[-1]
+            header['blocks'] = blocks
+            encoded = json.dumps(header).encode('utf-8').ljust(header_length)
+
+            path = self.store.path_for(self.dataset_id)
+            tmp_path = os.path.join(self._tmpdir, 'dataset.col')
+            with open(tmp_path, 'wb') as out:
+                out.write(MAGIC)
+                out.write(_HEADER_LENGTH.pack(header_length))
+                out.write(encoded)
+                for i, offsets in enumerate(self._offsets):
+                    out.write(b'\0' * (blocks[i][0] - out.tell()))
+                    offsets.tofile(out)
+                    with open(os.path.join(self._tmpdir, f"{i}.bin"), 'rb') as blob:
+                        shutil.copyfileobj(blob, out)
+            self.store.admit(self.owner, os.path.getsize(tmp_path))
+            os.replace(tmp_path, path)
+            if self.index is not None:
+                dataset = Dataset(path)
+                dataset._index = self.index
+                self.store.register(dataset)
+        finally:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+        return self.dataset_id
+
+    def abort(self) -> None:
+        for blob in self._blobs:
+            blob.close()
+        shutil.rmtree(self._tmpdir, ignore_errors=True)
+
+
+class DatasetStore:
+    """
+    Conjuntos de datos en disco con expiración (TTL desde el último uso), LRU
+    global y cuota por usuario.
+    """
+
+    def __init__(self, folder: str, max_bytes: int, user_quota: int, ttl: float, max_open: int = 8):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.user_quota = user_quota
+        self.ttl = ttl
+        self.max_open = max_open
+        self._open: 'OrderedDict[str, Dataset]' = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def __reduce__(self):
+        # Para enviarlo a un proceso del pool: allí se crea otro con la misma configuración.
+        return DatasetStore, (self.folder, self.max_bytes, self.user_quota, self.ttl, self.max_open)
+
+    def path_for(self, dataset_id: str) -> str:
+        return os.path.join(self.folder, f"{dataset_id}.col")
+
+    def create(self, owner: str, filename: str, columns: Sequence[str], build_index: bool = False) -> DatasetWriter:
+        """Inicia la escritura de un conjunto de datos nuevo."""
+        return DatasetWriter(self, owner, filename, columns, build_index)
+
+    def put(self, owner: str, filename: str, columns: Sequence[str], rows: Iterable[Sequence],
+            build_index: bool = False) -> str:
+        """Guarda un conjunto de datos completo y devuelve su identificador."""
+        writer = self.create(owner, filename, columns, build_index)
+        try:
+            writer.extend(rows)
+        except Exception:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def get(self, dataset_id: Optional[str], owner: str) -> Optional[Dataset]:
+        """Abre un conjunto de datos del usuario, o ``None`` si no existe o expiró."""
+        if not dataset_id or not _DATASET_ID.match(dataset_id):
+            return None
+        path = self.path_for(dataset_id)
+        try:
+            # La fecha de modificación es la del último uso (ver más abajo): el TTL cuenta desde ahí.
+            accessed = os.stat(path).st_mtime
+        except FileNotFoundError:
+            self._forget(dataset_id)
+            return None
+
+        with self._lock:
+            dataset = self._open.get(dataset_id)
+            if dataset is not None:
+                self._open.move_to_end(dataset_id)
+        if dataset is None:
+            dataset = self.register(Dataset(path))
+        if time.time() - accessed > self.ttl:
+            self.delete(dataset_id)
+            return None
+        if dataset.owner != owner:
+            return None
+        # La fecha de acceso del archivo marca el uso para el LRU entre procesos.
+        os.utime(path)
+        return dataset
+
+    def register(self, dataset: Dataset) -> Dataset:
+        """Guarda un conjunto ya abierto en la caché de este proceso."""
+        with self._lock:
+            self._open[dataset.dataset_id] = dataset
+            self._open.move_to_end(dataset.dataset_id)
+            while len(self._open) > self.max_open:
+                # No se cierra el mapa: otro hilo podría estar leyéndolo todavía.
+                self._open.popitem(last=False)
+        return dataset
+
+    def delete(self, dataset_id: Optional[str]) -> None:
+        """Elimina un conjunto de datos (por ejemplo, al limpiar la sesión)."""
+        if not dataset_id or not _DATASET_ID.match(dataset_id):
+            return
+        self._forget(dataset_id)
+        try:
+            os.remove(self.path_for(dataset_id))
+        except FileNotFoundError:
+            pass
+
+    def _forget(self, dataset_id: str) -> None:
+        with self._lock:
+            self._open.pop(dataset_id, None)
+
+    def _entries(self) -> List[Dict]:
+        """Metadatos de todos los conjuntos guardados, del menos al más usado."""
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith('.col'):
+                continue
+            path = os.path.join(self.folder, name)
+            try:
+                stat = os.stat(path)
+                with open(path, 'rb') as f:
+                    f.seek(len(MAGIC))
+                    (header_length,) = _HEADER_LENGTH.unpack(f.read(_HEADER_LENGTH.size))
+                    header = json.loads(f.read(header_length).decode('utf-8'))
+            except (OSError, ValueError):
+                continue
+            entries.append({
+                'id': header['id'], 'owner': header['owner'], 'size': stat.st_size, 'rows': header['rows'],
+                'created': header['created'], 'accessed': stat.st_mtime,
+            })
+        entries.sort(key=lambda e: e['accessed'])
+        return entries
+
+    def stats(self) -> Dict[str, int]:
+        """Conjuntos guardados en disco (de todos los workers), con sus filas y bytes."""
+        entries = self._entries()
+        return {
+            'datasets': len(entries),
+            'rows': sum(e['rows'] for e in entries),
+            'bytes': sum(e['size'] for e in entries),
+        }
+
+    def admit(self, owner: str, size: int) -> None:
+        """
+        Hace sitio para un conjunto nuevo de ``size`` bytes: elimina lo expirado,
+        lo menos usado del usuario si supera su cuota y lo menos usado en general
+        si se supera el límite total.
+        """
+        if size > self.user_quota:
+            raise DatasetQuotaError(
+                f"El archivo ocupa {size // (1024 * 1024)}MB y la cuota por usuario es de "
+                f"{self.user_quota // (1024 * 1024)}MB"
+            )
+        now = time.time()
+        entries = []
+        for entry in self._entries():
+            if now - entry['accessed'] > self.ttl:
+                self.delete(entry['id'])
+            else:
+                entries.append(entry)
+
+        user_bytes = sum(e['size'] for e in entries if e['owner'] == owner)
+        for entry in [e for e in entries if e['owner'] == owner]:
+            if user_bytes + size <= self.user_quota:
+                break
+            self.delete(entry['id'])
+            entries.remove(entry)
+            user_bytes -= entry['size']
+
+        total = sum(e['size'] for e in entries)
+        for entry in list(entries):
+            if total + size <= self.max_bytes:
+                break
+            self.delete(entry['id'])
+            total -= entry['size']
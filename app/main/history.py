@@ -0,0 +1,105 @@
+# app/main/history.py
+# -*- coding: utf-8 -*-
+"""
+Historial acotado de búsquedas y cargas de cada worker.
+
+``RingBuffer`` guarda las últimas ``capacity`` entradas en un arreglo de tamaño
+fijo: agregar una entrada nunca hace crecer la memoria, y los hilos no se
+bloquean entre sí (cada uno toma su posición de un contador atómico). Con un
+``AppendLog`` además se escribe cada entrada en un archivo JSON por línea, así
+lo que sale del buffer no se pierde y se puede analizar después.
+"""
+import itertools
+import json
+import os
+import threading
+from operator import itemgetter
+from typing import Dict, List, Optional
+
+
+class AppendLog:
+    """
+    Archivo de solo agregado (una entrada JSON por línea) compartido por los
+    workers. Al superar ``max_bytes`` se renombra a ``<archivo>.1`` (se pisa el
+    anterior) y se empieza uno nuevo.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._file = None
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def _current(self):
+        # Otro worker pudo haber rotado el archivo: se reabre si ya no es el mismo.
+        if self._file is not None and not self._is_current():
+            self._file.close()
+            self._file = None
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        return self._file
+
+    def _is_current(self) -> bool:
+        try:
+            return os.fstat(self._file.fileno()).st_ino == os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return False
+
+    def write(self, entry: Dict) -> None:
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            f = self._current()
+            # Una sola escritura por línea en modo 'a': las de otros workers no se intercalan.
+            f.write(line)
+            f.flush()
+            if f.tell() >= self.max_bytes:
+                if self._is_current():
+                    os.replace(self.path, self.path + '.1')
+                self._file.close()
+                self._file = None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class RingBuffer:
+    """Últimas ``capacity`` entradas, en orden de llegada."""
+
+    def __init__(self, capacity: int, log: Optional[AppendLog] = None):
+        self.capacity = max(capacity, 1)
+        self.log = log
+        self._slots: List[Optional[tuple]] = [None] * self.capacity
+        # ``next`` sobre itertools.count es atómico con el GIL: cada hilo recibe su propia posición.
+        self._sequence = itertools.count()
+
+    def append(self, entry: Dict) -> None:
+        number = next(self._sequence)
+        self._slots[number % self.capacity] = (number, entry)
+        if self.log is not None:
+            self.log.write(entry)
+
+    def _items(self) -> List[tuple]:
+        items = [item for item in list(self._slots) if item is not None]
+        items.sort(key=itemgetter(0))
+        return items
+
+    def __len__(self) -> int:
+        return sum(1 for item in self._slots if item is not None)
+
+    @property
+    def total(self) -> int:
+        """Entradas agregadas desde que se creó el buffer (también las ya descartadas)."""
+        items = [item for item in list(self._slots) if item is not None]
+        return max(number for number, _ in items) + 1 if items else 0
+
+    def snapshot(self) -> List[Dict]:
+        """Copia de las entradas guardadas, de la más vieja a la más nueva."""
+        return [entry for _, entry in self._items()]
+
+    def recent(self, n: int) -> List[Dict]:
+        """Las ``n`` entradas más nuevas, de la más vieja a la más nueva."""
+        return self.snapshot()[-n:] if n > 0 else []
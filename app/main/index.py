@@ -0,0 +1,174 @@
+# app/main/index.py
+# -*- coding: utf-8 -*-
+"""
+Índice invertido de n-gramas para la búsqueda por subcadena.
+
+Cada registro se normaliza una sola vez (al cargar los datos o al actualizarlo)
+con ``normalize_text``: sin mayúsculas, sin acentos y con los espacios colapsados.
+El índice guarda esos valores normalizados junto a los registros originales y los
+trigramas de cada uno. Una búsqueda intersecta las listas de trigramas de la
+consulta (ya normalizada) para obtener candidatos y luego verifica cada candidato
+con ``query in valor``, sin recorrer todos los registros ni normalizar nada más.
+"""
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Sequence, Set
+
+from utils import normalize_text
+
+NGRAM_SIZE = 3
+
+# Separador entre valores de un mismo registro; no aparece en consultas reales.
+FIELD_SEPARATOR = '\x00'
+
+
+def record_values(record: Dict) -> List[str]:
+    """Devuelve los valores de un registro tal como los compara la búsqueda (normalizados)."""
+    return [normalize_text(str(value)) for value in record.values()]
+
+
+def record_matches(record: Dict, query: str) -> bool:
+    """Misma comprobación que ``NGramIndex.search`` para un registro suelto."""
+    return FIELD_SEPARATOR not in query and query in FIELD_SEPARATOR.join(record_values(record))
+
+
+def value_grams(values: Iterable[str], n: int = NGRAM_SIZE) -> Set[str]:
+    """Trigramas de cada valor por separado (nunca cruzan de un campo a otro)."""
+    grams = set()
+    for value in values:
+        for i in range(len(value) - n + 1):
+            grams.add(value[i:i + n])
+    return grams
+
+
+class NGramIndex:
+    """Índice de trigramas sobre una lista de registros (diccionarios)."""
+
+    # Por debajo de este número de candidatos se pasa directamente a verificar.
+    VERIFY_THRESHOLD = 64
+    # Trigramas presentes en más de esta fracción de filas apenas descartan candidatos.
+    DENSE_RATIO = 0.5
+
+    def __init__(self, records: Iterable[Dict], n: int = NGRAM_SIZE):
+        self.n = n
+        self._texts: Sequence[str] = []
+        self._postings: Dict[str, Sequence[int]] = {}
+        for record in records:
+            self.append(record)
+
+    @classmethod
+    def from_parts(cls, texts: Sequence[str], postings: Dict[str, Sequence[int]], n: int = NGRAM_SIZE) -> 'NGramIndex':
+        """
+        Índice de solo lectura sobre estructuras ya construidas (por ejemplo, vistas
+        de un archivo mapeado en memoria). ``postings`` debe tener listas ordenadas.
+        """
+        index = cls.__new__(cls)
+        index.n = n
+        index._texts = texts
+        index._postings = postings
+        return index
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def _grams(self, values: Iterable[str]) -> Set[str]:
+        return value_grams(values, self.n)
+
+    def append(self, record: Dict) -> int:
+        """Indexa un registro nuevo al final y devuelve su identificador de fila."""
+        row_id = len(self._texts)
+        values = record_values(record)
+        self._texts.append(FIELD_SEPARATOR.join(values))
+        for gram in self._grams(values):
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array('I')
+            # Las filas se agregan en orden creciente, las listas quedan ordenadas.
+            postings.append(row_id)
+        return row_id
+
+    def update(self, row_id: int, record: Dict) -> None:
+        """Reindexa una fila existente tras modificar el registro."""
+        old_grams = self._grams(self._texts[row_id].split(FIELD_SEPARATOR))
+        values = record_values(record)
+        new_grams = self._grams(values)
+        self._texts[row_id] = FIELD_SEPARATOR.join(values)
+
+        for gram in old_grams - new_grams:
+            postings = self._postings[gram]
+            del postings[bisect_left(postings, row_id)]
+            if not postings:
+                del self._postings[gram]
+        for gram in new_grams - old_grams:
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array('I')
+            insort(postings, row_id)
+
+    def candidates(self, query: str) -> List[int]:
+        """Filas que contienen todos los trigramas de la consulta (superconjunto del resultado)."""
+        n = self.n
+        if len(query) < n:
+            return list(range(len(self._texts)))
+
+        grams = {query[i:i + n] for i in range(len(query) - n + 1)}
+        postings_lists = []
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings is None:
+                return []
+            postings_lists.append(postings)
+        postings_lists.sort(key=len)
+
+        # Se parte de la lista más corta y se descarta lo que no está en las demás.
+        # Con pocos candidatos, o si el resto de trigramas aparece en casi todas
+        # las filas, sale más barato verificar que seguir intersectando.
+        dense_limit = len(self._texts) * self.DENSE_RATIO
+        result = postings_lists[0]
+        for postings in postings_lists[1:]:
+            if len(result) <= self.VERIFY_THRESHOLD or len(postings) > dense_limit:
+                break
+            if len(result) * 16 < len(postings):
+                size = len(postings)
+                kept = []
+                for row_id in result:
+                    pos = bisect_left(postings, row_id)
+                    if pos < size and postings[pos] == row_id:
+                        kept.append(row_id)
+                result = kept
+            else:
+                result = sorted(set(result).intersection(postings))
+        return list(result)
+
+    def values(self, row_id: int) -> List[str]:
+        """Valores normalizados de una fila, tal como se indexaron."""
+        return self._texts[row_id].split(FIELD_SEPARATOR)
+
+    def search(self, query: str) -> List[int]:
+        """
+        Devuelve, en orden, los identificadores de las filas donde algún valor
+        contiene ``query`` (ya normalizada con ``normalize_text``).
+        """
+        return list(self.iter_search(query))
+
+    def iter_search(self, query: str, after: int = -1) -> Iterator[int]:
+        """
+        Como ``search``, pero verifica los candidatos a medida que se piden y solo
+        a partir de la fila siguiente a ``after`` (para paginar).
+        """
+        if FIELD_SEPARATOR in query:
+            return
+        texts = self._texts
+        candidates = self.candidates(query)
+        for row_id in islice(candidates, bisect_right(candidates, after), None):
+            if query in texts[row_id]:
+                yield row_id
+
+    def stats(self) -> Dict[str, int]:
+        """Tamaño del índice (filas, trigramas distintos y entradas totales)."""
+        return {
+            'rows': len(self._texts),
+            'grams': len(self._postings),
+            'postings': sum(len(p) for p in self._postings.values()),
+        }
@@ -0,0 +1,293 @@
+# app/main/jobs.py
+# -*- coding: utf-8 -*-
+"""
+Procesamiento en segundo plano de los archivos subidos.
+
+``/upload`` solo guarda el archivo y encola un trabajo; la lectura, limpieza e
+indexado se hacen en un pool de hilos local o, si hay un ``CpuPool``, en un
+proceso aparte (``process_file``) para no ocupar el GIL del worker. El estado de
+cada trabajo se guarda en un pequeño JSON en disco, así cualquier worker de
+gunicorn (o proceso del pool) puede actualizarlo, responder a
+``/upload/status/<job_id>`` o cancelar el trabajo, no solo el que lo ejecuta.
+"""
+import json
+import logging
+import os
+import re
+import secrets
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from utils import FileProcessor
+
+from ..metrics import StageTimer
+from .datasets import Dataset, DatasetStore, DatasetQuotaError
+from .index import NGramIndex
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Fases de un trabajo, en el orden en que se recorren.
+QUEUED, PARSING, INDEXING, DONE, ERROR, CANCELLED = 'queued', 'parsing', 'indexing', 'done', 'error', 'cancelled'
+ACTIVE_PHASES = {QUEUED, PARSING, INDEXING}
+
+# Los estados de trabajos terminados se conservan este tiempo (segundos).
+JOB_TTL = 60 * 60
+
+# Un trabajo activo sin avances durante este tiempo (segundos) se da por muerto,
+# por ejemplo si el worker que lo procesaba se cayó.
+STALL_TIMEOUT = 30 * 60
+
+# Datos del estado que solo usa el servidor (rutas en disco) y no se devuelven al usuario.
+_INTERNAL_KEYS = ('upload_path', 'work_dir')
+
+_JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+logger = logging.getLogger(__name__)
+
+
+class JobLimitError(Exception):
+    """El usuario ya tiene el máximo de cargas en proceso."""
+
+
+class JobCancelled(Exception):
+    """El usuario canceló la carga mientras se procesaba."""
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Pico de memoria residente del proceso en MB (None si el sistema no lo reporta)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo reporta en KB y macOS en bytes
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(peak / divisor, 1)
+
+
+def state_path(folder: str, job_id: str, suffix: str = '.json') -> str:
+    return os.path.join(folder, f"{job_id}{suffix}")
+
+
+def write_state(folder: str, state: Dict) -> None:
+    state['updated'] = time.time()
+    tmp_path = state_path(folder, state['id'], '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, state_path(folder, state['id']))
+
+
+def write_progress(folder: str, state: Dict, rows: int) -> None:
+    elapsed = time.time() - state['started']
+    state['rows'] = rows
+    state['elapsed_seconds'] = round(elapsed, 3)
+    state['rows_per_second'] = round(rows / elapsed) if elapsed else rows
+    total = state['total_rows']
+    if state['phase'] in ACTIVE_PHASES and total and state['rows_per_second']:
+        state['eta_seconds'] = round(max(total - rows, 0) / state['rows_per_second'], 1)
+    write_state(folder, state)
+
+
+def process_file(folder: str, store: DatasetStore, state: Dict, filepath: str,
+                 chunk_rows: int) -> Tuple[Dict, Dict[str, float], Optional[NGramIndex]]:
+    """
+    Lee, limpia e indexa un archivo subido y lo guarda como conjunto de datos,
+    escribiendo el progreso en el estado del trabajo (en ``folder``). Puede correr
+    en un proceso del pool: devuelve el estado final, el tiempo de cada etapa y el
+    índice ya construido, para registrarlo en el worker sin volver a indexar.
+    """
+    cancel_path = state_path(folder, state['id'], '.cancel')
+    stages = StageTimer()
+    writer = index = None
+    try:
+        state['phase'] = PARSING
+        state['total_rows'] = FileProcessor.estimate_rows(filepath)
+        write_state(folder, state)
+
+        with stages.stage('parse'):
+            columns, chunks = FileProcessor.read_chunks(filepath, chunk_rows)
+        writer = store.create(state['owner'], state['filename'], columns, build_index=True)
+        state['work_dir'] = writer._tmpdir
+        while True:
+            if os.path.exists(cancel_path):
+                raise JobCancelled()
+            with stages.stage('parse'):
+                chunk = next(chunks, None)
+            if chunk is None:
+                break
+            with stages.stage('clean'):
+                chunk = FileProcessor.clean_rows(chunk, len(columns))
+            with stages.stage('index'):
+                # Se escriben las columnas y se indexan las filas a la vez.
+                writer.extend(chunk)
+            write_progress(folder, state, writer.rows)
+
+        state['phase'] = INDEXING
+        write_state(folder, state)
+        index = writer.index
+        with stages.stage('index'):
+            state['dataset_id'] = writer.commit()
+        writer = None
+        state['work_dir'] = None
+        state['phase'] = DONE
+        state['total_rows'] = state['rows']
+        state['eta_seconds'] = 0
+        state['peak_rss_mb'] = peak_rss_mb()
+    except JobCancelled:
+        state['phase'] = CANCELLED
+    except DatasetQuotaError as e:
+        logger.warning(f"Cuota excedida para {state['owner']}: {e}")
+        state['phase'] = ERROR
+        state['error'] = str(e)
+    except Exception as e:
+        logger.error(f"Error procesando archivo para {state['owner']}: {e}")
+        state['phase'] = ERROR
+        state['error'] = f'Error al leer el archivo: {str(e)}'
+    finally:
+        if writer is not None:
+            writer.abort()
+        if os.path.exists(filepath):
+            os.remove(filepath)
+        write_progress(folder, state, state['rows'])
+    return state, stages.totals, index if state['phase'] == DONE else None
+
+
+class UploadJobs:
+    """Cola local de trabajos de carga con estado compartido en disco."""
+
+    def __init__(self, folder: str, store: DatasetStore, max_workers: int, max_per_user: int, chunk_rows: int,
+                 stage_histogram=None, pool=None, stall_timeout: float = STALL_TIMEOUT):
+        self.folder = folder
+        self.store = store
+        self.max_per_user = max_per_user
+        self.chunk_rows = chunk_rows
+        self.stall_timeout = stall_timeout
+        # Histograma de Prometheus para el tiempo de cada etapa (None: no se publica)
+        self.stage_histogram = stage_histogram
+        # ``CpuPool`` donde se procesan los archivos (None: en los hilos de este worker)
+        self.pool = pool
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload')
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, job_id: str, suffix: str = '.json') -> str:
+        return state_path(self.folder, job_id, suffix)
+
+    def _write(self, state: Dict) -> None:
+        write_state(self.folder, state)
+
+    def _read(self, job_id: str) -> Optional[Dict]:
+        if not job_id or not _JOB_ID.match(job_id):
+            return None
+        try:
+            with open(self._path(job_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _states(self):
+        for name in os.listdir(self.folder):
+            if name.endswith('.json'):
+                state = self._read(name[:-len('.json')])
+                if state is not None:
+                    yield state
+
+    def _expire(self, state: Dict, now: float) -> None:
+        """
+        Marca como error un trabajo activo sin avances en ``stall_timeout`` (su
+        worker murió sin terminarlo) y borra el archivo subido y los temporales.
+        """
+        if state['phase'] not in ACTIVE_PHASES or now - state['updated'] <= self.stall_timeout:
+            return
+        logger.warning(f"Carga {state['id']} de {state['owner']} sin avances desde hace "
+                       f"{now - state['updated']:.0f}s; se da por terminada")
+        state['phase'] = ERROR
+        state['error'] = 'La carga se interrumpió; vuelve a subir el archivo'
+        self._write(state)
+        if state.get('upload_path') and os.path.exists(state['upload_path']):
+            os.remove(state['upload_path'])
+        if state.get('work_dir'):
+            shutil.rmtree(state['work_dir'], ignore_errors=True)
+        try:
+            os.remove(self._path(state['id'], '.cancel'))
+        except FileNotFoundError:
+            pass
+
+    def _purge(self) -> None:
+        """
+        Da por muertos los trabajos activos sin avances y elimina el estado de los
+        terminados hace más de JOB_TTL.
+        """
+        now = time.time()
+        for state in self._states():
+            self._expire(state, now)
+            if state['phase'] not in ACTIVE_PHASES and now - state['updated'] > JOB_TTL:
+                for suffix in ('.json', '.cancel'):
+                    try:
+                        os.remove(self._path(state['id'], suffix))
+                    except FileNotFoundError:
+                        pass
+
+    def submit(self, owner: str, filename: str, filepath: str) -> str:
+        """Encola el procesamiento de un archivo ya guardado y devuelve el id del trabajo."""
+        self._purge()
+        active = sum(1 for s in self._states() if s['owner'] == owner and s['phase'] in ACTIVE_PHASES)
+        if active >= self.max_per_user:
+            raise JobLimitError(f"Ya hay {active} carga(s) en proceso; espera a que terminen o cancélalas")
+
+        state = {
+            'id': secrets.token_hex(16), 'owner': owner, 'filename': filename, 'phase': QUEUED,
+            'rows': 0, 'total_rows': None, 'started': time.time(), 'elapsed_seconds': 0.0,
+            'rows_per_second': 0, 'eta_seconds': None, 'dataset_id': None, 'error': None,
+            'upload_path': filepath, 'work_dir': None,
+        }
+        self._write(state)
+        self._executor.submit(self._run, state, filepath)
+        return state['id']
+
+    def status(self, job_id: str, owner: str) -> Optional[Dict]:
+        """Estado de un trabajo del usuario, o None si no existe."""
+        state = self._read(job_id)
+        if state is None or state['owner'] != owner:
+            return None
+        self._expire(state, time.time())
+        return {key: value for key, value in state.items() if key not in _INTERNAL_KEYS}
+
+    def cancel(self, job_id: str, owner: str) -> bool:
+        """Pide cancelar un trabajo en curso; se detiene al terminar el bloque actual."""
+        state = self.status(job_id, owner)
+        if state is None or state['phase'] not in ACTIVE_PHASES:
+            return False
+        open(self._path(job_id, '.cancel'), 'w').close()
+        return True
+
+    def _run(self, state: Dict, filepath: str) -> None:
+        # Si esperó en la cola más que ``stall_timeout``, ya se dio por muerto y su archivo se borró.
+        current = self._read(state['id'])
+        if current is None or current['phase'] not in ACTIVE_PHASES:
+            return
+        stages = StageTimer(self.stage_histogram)
+        if self.pool is None:
+            state, totals, _ = process_file(self.folder, self.store, state, filepath, self.chunk_rows)
+        else:
+            try:
+                state, totals, index = self.pool.run(process_file, self.folder, self.store, state, filepath,
+                                                     self.chunk_rows)
+            except BrokenProcessPool:
+                state['phase'] = ERROR
+                state['error'] = 'Error al leer el archivo: el proceso que lo leía terminó de forma inesperada'
+                totals, index = {}, None
+                if os.path.exists(filepath):
+                    os.remove(filepath)
+                self._write(state)
+            if index is not None:
+                # El proceso del pool ya escribió el archivo; el worker lo abre con el índice que construyó.
+                dataset = Dataset(self.store.path_for(state['dataset_id']))
+                dataset._index = index
+                self.store.register(dataset)
+        stages.merge(totals)
+        stages.observe()
@@ -0,0 +1,100 @@
+# app/main/pool.py
+# -*- coding: utf-8 -*-
+"""
+Pool de procesos para el trabajo de CPU de cada worker.
+
+Con varios hilos por worker (gunicorn ``gthread``) el GIL hace que una búsqueda
+que puntúa cientos de miles de filas, o la lectura de una hoja grande, frene a
+todas las demás peticiones del worker. Ese trabajo se envía a procesos aparte y
+el hilo de la petición solo espera el resultado.
+
+Los procesos se crean con ``forkserver`` (o ``spawn``), nunca con ``fork``
+directo desde el worker: un ``fork`` con otros hilos en marcha puede heredar
+bloqueos tomados. El servidor de ``forkserver`` importa una vez los módulos de
+``preload`` (en lugar de ``__main__``) y cada proceso nuevo parte de esa copia.
+Cada proceso abre sus propias fuentes de datos desde disco (``open_source``),
+igual que lo haría otro worker.
+"""
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .datasets import Dataset
+from .storage import open_record_store
+
+logger = logging.getLogger(__name__)
+
+# Fuentes abiertas por cada proceso del pool, de la menos a la más usada.
+MAX_SOURCES = 8
+_sources: 'OrderedDict[Tuple, object]' = OrderedDict()
+
+
+class CpuPool:
+    """
+    Pool de ``processes`` procesos, creado al primer uso (después del fork de
+    gunicorn) y vuelto a crear si uno de sus procesos muere.
+    """
+
+    def __init__(self, processes: int, preload: Sequence[str] = ()):
+        self.processes = processes
+        self.preload = list(preload)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(self.preload)
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._executor = ProcessPoolExecutor(self.processes, mp_context=context)
+            return self._executor
+
+    def run(self, func, *args):
+        """
+        Ejecuta ``func(*args)`` en un proceso y devuelve su resultado (las
+        excepciones de ``func`` se propagan). Si el pool se rompió, lanza
+        ``BrokenProcessPool`` y el siguiente uso crea uno nuevo.
+        """
+        executor = self._get()
+        try:
+            return executor.submit(func, *args).result()
+        except BrokenProcessPool:
+            logger.error("Un proceso del pool de CPU terminó de forma inesperada; se recreará el pool")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            executor.shutdown(wait=False)
+            raise
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def open_source(locator: Tuple[str, str, Optional[str]], default: Optional[List[Dict]] = None):
+    """
+    Fuente de datos de ``locator`` en este proceso: ``('excel', ruta, None)`` para
+    un conjunto subido o ``('internal', ruta de data.json, backend)`` para los
+    datos internos. Se abre una vez y los datos internos se sincronizan en cada uso.
+    """
+    source = _sources.get(locator)
+    if source is None:
+        kind, path, backend = locator
+        source = Dataset(path) if kind == 'excel' else open_record_store(path, backend, default)
+        _sources[locator] = source
+        while len(_sources) > MAX_SOURCES:
+            _sources.popitem(last=False)
+    else:
+        _sources.move_to_end(locator)
+        if not isinstance(source, Dataset):
+            source.sync()
+    return source
@@ -0,0 +1,147 @@
+# app/main/records.py
+# -*- coding: utf-8 -*-
+"""
+Registros compactos para los datos internos en memoria.
+
+Una lista de diccionarios repite en cada registro la tabla de claves del dict
+(unos 180-230 bytes por registro aunque las cadenas de las claves se compartan).
+``RecordTable`` guarda un único esquema con los nombres de columna (internados una
+sola vez) y cada fila como una tupla de valores en el orden del esquema. Los
+valores de texto repetidos (ubicaciones, cajas...) se comparten al cargar.
+
+Las búsquedas devuelven ``RecordView``: una vista de solo lectura (fila + tabla,
+con ``__slots__``) que se comporta como un ``Mapping`` y solo se convierte en
+diccionario al serializarla a JSON (ver ``json_default``).
+"""
+import sys
+from collections.abc import Mapping
+from typing import Dict, Iterable, Iterator, List, Sequence
+
+# Marca de una columna que la fila no tiene (distinta de ``None``, que es un ``null`` de JSON).
+MISSING = object()
+
+
+class RecordTable:
+    """
+    Filas como tuplas sobre un esquema compartido. Un registro con claves nuevas
+    agrega columnas al esquema; las filas anteriores, más cortas, no las tienen.
+    """
+
+    def __init__(self, records: Iterable[Dict] = ()):
+        self.columns: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._rows: List[tuple] = []
+        self.extend(records)
+
+    def _column(self, name: str) -> int:
+        position = self._positions.get(name)
+        if position is None:
+            position = len(self.columns)
+            name = sys.intern(name) if type(name) is str else name
+            self.columns.append(name)
+            self._positions[name] = position
+        return position
+
+    def _pack(self, record: Dict, shared: Dict[str, str]) -> tuple:
+        """Tupla de valores de ``record`` en el orden del esquema."""
+        values = [MISSING] * len(self.columns)
+        for name, value in record.items():
+            position = self._column(name)
+            if position >= len(values):
+                values.extend([MISSING] * (position + 1 - len(values)))
+            if type(value) is str:
+                value = shared.setdefault(value, value)
+            values[position] = value
+        while values and values[-1] is MISSING:
+            values.pop()
+        return tuple(values)
+
+    def extend(self, records: Iterable[Dict]) -> None:
+        """Agrega registros al final."""
+        # Cada texto distinto se guarda una sola vez; el diccionario solo vive durante la carga.
+        shared: Dict[str, str] = {}
+        columns = tuple(self.columns)
+        for record in records:
+            if tuple(record) == columns:
+                # Caso habitual: mismas claves y en el mismo orden que el esquema.
+                self._rows.append(tuple(shared.setdefault(v, v) if type(v) is str else v
+                                        for v in record.values()))
+            else:
+                self._rows.append(self._pack(record, shared))
+                columns = tuple(self.columns)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __iter__(self) -> Iterator[Dict]:
+        """Recorre los registros como diccionarios nuevos (por ejemplo, para escribirlos)."""
+        for row_id in range(len(self._rows)):
+            yield self.record(row_id)
+
+    def record(self, row_id: int) -> Dict:
+        """Diccionario nuevo con los valores de la fila."""
+        return {name: value for name, value in zip(self.columns, self._rows[row_id]) if value is not MISSING}
+
+    def view(self, row_id: int) -> 'RecordView':
+        return RecordView(self, row_id)
+
+    def value(self, row_id: int, name: str, default=None):
+        position = self._positions.get(name)
+        row = self._rows[row_id]
+        if position is None or position >= len(row) or row[position] is MISSING:
+            return default
+        return row[position]
+
+    def update(self, row_id: int, changes: Dict) -> None:
+        """Cambia campos de una fila (las columnas nuevas se agregan al esquema)."""
+        values = list(self._rows[row_id])
+        for name, value in changes.items():
+            position = self._column(name)
+            if position >= len(values):
+                values.extend([MISSING] * (position + 1 - len(values)))
+            values[position] = value
+        self._rows[row_id] = tuple(values)
+
+
+class RecordView(Mapping):
+    """
+    Registro de una ``RecordTable`` visto como ``Mapping`` de solo lectura, sin
+    copiar sus valores. Refleja la fila actual: si la fila cambia, la vista también.
+    """
+
+    __slots__ = ('_table', '_row_id')
+
+    def __init__(self, table: RecordTable, row_id: int):
+        self._table = table
+        self._row_id = row_id
+
+    def __getitem__(self, name: str):
+        value = self._table.value(self._row_id, name, MISSING)
+        if value is MISSING:
+            raise KeyError(name)
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        row: Sequence = self._table._rows[self._row_id]
+        return (name for name, value in zip(self._table.columns, row) if value is not MISSING)
+
+    def __len__(self) -> int:
+        return sum(value is not MISSING for value in self._table._rows[self._row_id])
+
+    def values(self) -> List:
+        return [value for value in self._table._rows[self._row_id] if value is not MISSING]
+
+    def to_dict(self) -> Dict:
+        return self._table.record(self._row_id)
+
+    copy = to_dict
+
+    def __repr__(self) -> str:
+        return f"RecordView({self.to_dict()!r})"
+
+
+def json_default(obj):
+    """``default`` de ``json.dumps``: materializa las vistas de registros como objetos JSON."""
+    if isinstance(obj, RecordView):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -3,66 +3,219 @@
 """
 Define las rutas principales de la aplicación (búsqueda, carga, etc.).
 """
-from flask import render_template, request, jsonify, send_file, session, current_app, make_response
+from flask import render_template, request, jsonify, send_file, session, current_app, make_response, Response, stream_with_context, url_for
 from functools import wraps
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
 from . import main_bp
 from app.auth.routes import login_required
 from app.auth.models import users
+from .storage import open_record_store
+from .datasets import Dataset, DatasetStore
+from .jobs import UploadJobs, JobLimitError, DONE
+from .cache import ResultCache, CandidateCache, FuzzyIndexCache, FragmentCache
+from .pool import CpuPool, open_source
+from .history import AppendLog, RingBuffer
+from app.profiling import get_profile_store, is_profile_admin
+from app.metrics import SEARCH_STAGES, UPLOAD_STAGES, CONTENT_TYPE, StageTimer, track_stages, current_stages, metrics_enabled, render_metrics
+from utils import SearchEngine, SearchAnalytics, AdvancedQuery, QuerySyntaxError, FuzzyIndex, ExportManager, normalize_text
+import numpy as np
 import pandas as pd
 import os
 from werkzeug.utils import secure_filename
+from werkzeug.http import is_resource_modified
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
+import hashlib
 import io
+import secrets
 import csv
-import json # Importar el módulo json
+import heapq
+import threading
+from array import array
 
 # Obtiene el logger configurado en la factory de la aplicación
 logger = logging.getLogger(__name__)
 
 # --- Decoradores Específicos del Módulo ---
-def nocache(view):
-    """Decorador para evitar que una vista se guarde en la caché del navegador."""
+def revalidate(view):
+    """
+    Decorador para páginas que el navegador debe revalidar en cada visita. Se
+    envían con un ETag de su contenido: si no cambiaron, la respuesta es un 304
+    sin cuerpo en lugar de la página completa.
+    """
     @wraps(view)
-    def no_cache(*args, **kwargs):
+    def revalidated(*args, **kwargs):
         response = make_response(view(*args, **kwargs))
-        response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '-1'
-        return response
-    return no_cache
+        return with_validators(response, (hashlib.sha1(response.get_data()).hexdigest()[:20], None))
+    return revalidated
+
+def with_validators(response, validators):
+    """
+    Agrega ETag (débil) y Last-Modified a una respuesta que el navegador puede
+    guardar pero debe revalidar en cada uso (``no-cache``). Si el cliente ya tiene
+    esa versión (GET con If-None-Match / If-Modified-Since) queda en 304.
+    """
+    etag, modified = validators
+    response.set_etag(etag, weak=True)
+    if modified is not None:
+        response.last_modified = modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+def data_validators(source, *params):
+    """
+    ETag y fecha de modificación de una respuesta que depende solo de ``source`` y
+    de ``params``. Usan la versión de los datos (igual en todos los workers), así
+    que se calculan antes de hacer el trabajo.
+    """
+    etag = hashlib.sha1(repr((source.version,) + params).encode('utf-8')).hexdigest()[:20]
+    modified = source.modified
+    return etag, datetime.fromtimestamp(modified, timezone.utc) if modified is not None else None
+
+def not_modified(validators):
+    """True si el cliente ya tiene la versión actual (solo en GET)."""
+    return request.method in ('GET', 'HEAD') and not is_resource_modified(
+        request.environ, etag=validators[0], last_modified=validators[1])
 
 # --- Datos Internos y Variables Globales ---
 # Ruta al archivo JSON de datos internos
 DATA_FILE_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'data.json')
 
-INTERNAL_DATA = []
-try:
-    with open(DATA_FILE_PATH, 'r', encoding='utf-8') as f:
-        INTERNAL_DATA = json.load(f)
-    logger.info(f"Datos internos cargados desde {DATA_FILE_PATH}: {len(INTERNAL_DATA)} registros.")
-except FileNotFoundError:
-    logger.warning(f"Archivo de datos internos no encontrado en {DATA_FILE_PATH}. Usando datos de ejemplo.")
-    # Fallback a datos de ejemplo si el archivo no se encuentra
-    INTERNAL_DATA = [
-        {"nombre": "Contrato de Servicio B", "tipo": "ruc", "id": "DOC002", "contenido": "024 contrato servicio prestación", "fecha": "2024-01-15", "estado": "activo"},
-        {"nombre": "Factura #12345", "tipo": "obligado", "id": "DOC004", "contenido": "024 factura número doce mil", "fecha": "2024-02-10", "estado": "procesado"}
-    ]
-except json.JSONDecodeError as e:
-    logger.error(f"Error al decodificar JSON en {DATA_FILE_PATH}: {e}. Usando datos de ejemplo.")
-    INTERNAL_DATA = [
-        {"nombre": "Contrato de Servicio B", "tipo": "ruc", "id": "DOC002", "contenido": "024 contrato servicio prestación", "fecha": "2024-01-15", "estado": "activo"},
-        {"nombre": "Factura #12345", "tipo": "obligado", "id": "DOC004", "contenido": "024 factura número doce mil", "fecha": "2024-02-10", "estado": "procesado"}
-    ]
-
-# El historial no es específico de la sesión en esta implementación.
-search_history = []
-upload_history = []
+# Datos de ejemplo si el archivo no existe o no se puede decodificar
+SAMPLE_DATA = [
+    {"nombre": "Contrato de Servicio B", "tipo": "ruc", "id": "DOC002", "contenido": "024 contrato servicio prestación", "fecha": "2024-01-15", "estado": "activo"},
+    {"nombre": "Factura #12345", "tipo": "obligado", "id": "DOC004", "contenido": "024 factura número doce mil", "fecha": "2024-02-10", "estado": "procesado"}
+]
+
+# Órdenes de resultados que acepta /search
+SEARCH_MODES = ('ranked', 'ordered', 'advanced', 'fuzzy')
+
+# Formatos de /export: (tipo MIME, extensión)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+    'json': ('application/json', 'json'),
+}
+
+# Historiales de cada worker (no son específicos de la sesión): límite de entradas de cada uno.
+HISTORY_LIMITS = {'search': 'MAX_SEARCH_HISTORY', 'upload': 'MAX_UPLOAD_HISTORY'}
+
+# Creación de los objetos compartidos de cada app (ver ``app_extension``).
+_extensions_lock = threading.RLock()
+
+def app_extension(name, create):
+    """
+    Objeto compartido ``name`` de la aplicación actual, creado con ``create()`` la
+    primera vez. Si varios hilos lo piden a la vez, solo uno lo crea y los demás
+    esperan y reciben el mismo (puede ser None si la función está desactivada).
+    """
+    extensions = current_app.extensions
+    if name not in extensions:
+        with _extensions_lock:
+            if name not in extensions:
+                extensions[name] = create()
+    return extensions[name]
+
+def get_history(kind):
+    """
+    Historial ``kind`` ('search' o 'upload') de este worker: las últimas entradas en
+    un ``RingBuffer`` y, si hay ``HISTORY_LOG_FOLDER``, todas en un registro en disco.
+    """
+    cfg = current_app.config
+
+    def create():
+        folder = cfg['HISTORY_LOG_FOLDER']
+        log = AppendLog(os.path.join(folder, f"{kind}_history.jsonl"), cfg['HISTORY_LOG_MAX_BYTES']) if folder else None
+        return RingBuffer(cfg[HISTORY_LIMITS[kind]], log)
+    return app_extension(f'{kind}_history', create)
+
+def get_search_analytics():
+    """Estadísticas de búsquedas de este worker, actualizadas con cada búsqueda."""
+    return app_extension('search_analytics', lambda: SearchAnalytics(current_app.config['ANALYTICS_MAX_QUERIES']))
+
+def record_search(entry):
+    """Guarda una búsqueda en el historial y la suma a las estadísticas."""
+    get_history('search').append(entry)
+    get_search_analytics().add(entry)
+
+def open_internal_store():
+    """Abre los datos internos con el backend configurado (solo la primera vez, ver ``get_internal_store``)."""
+    store = open_record_store(DATA_FILE_PATH, current_app.config['INTERNAL_BACKEND'], SAMPLE_DATA)
+    logger.info(f"Índice de búsqueda construido: {store.stats()}")
+    fragments = get_fragment_cache()
+    if fragments is not None:
+        store.subscribe(lambda rows: fragments.invalidate('internal', rows))
+    return store
+
+def get_internal_store():
+    """
+    Registros internos de la aplicación actual (índice por EXP BN, trigramas y diario
+    de cambios). Se sincroniza en cada llamada para ver lo que escribieron otros workers.
+    """
+    store = current_app.extensions.get('internal_store')
+    if store is None:
+        return app_extension('internal_store', open_internal_store)
+    store.sync()
+    return store
+
+def get_dataset_store():
+    """Devuelve el almacén de datos subidos de la aplicación actual (se crea al primer uso)."""
+    cfg = current_app.config
+    return app_extension('dataset_store', lambda: DatasetStore(
+        cfg['DATASET_FOLDER'], cfg['DATASET_MAX_BYTES'], cfg['DATASET_USER_QUOTA'], cfg['DATASET_TTL']))
+
+def get_upload_jobs():
+    """Devuelve la cola de cargas en segundo plano de la aplicación actual."""
+    cfg = current_app.config
+    return app_extension('upload_jobs', lambda: UploadJobs(
+        os.path.join(cfg['DATASET_FOLDER'], 'jobs'), get_dataset_store(),
+        cfg['UPLOAD_WORKERS'], cfg['MAX_UPLOAD_JOBS_PER_USER'], cfg['UPLOAD_CHUNK_ROWS'],
+        UPLOAD_STAGES if metrics_enabled() else None, get_cpu_pool(), cfg['UPLOAD_STALL_TIMEOUT']))
+
+def get_cpu_pool():
+    """Pool de procesos de este worker para el trabajo de CPU, o None si ``CPU_WORKERS`` es 0."""
+    processes = current_app.config['CPU_WORKERS']
+    return app_extension('cpu_pool', lambda: CpuPool(processes, preload=[__name__]) if processes > 0 else None)
+
+def get_result_cache():
+    """Caché de resultados de /search de este worker, o None si está desactivada."""
+    max_bytes = current_app.config['SEARCH_CACHE_BYTES']
+    return app_extension('result_cache', lambda: ResultCache(max_bytes) if max_bytes > 0 else None)
+
+def get_candidate_cache():
+    """Candidatos de la última sugerencia de cada sesión en este worker."""
+    return app_extension('candidate_cache', lambda: CandidateCache(current_app.config['SUGGEST_MAX_SESSIONS']))
+
+def get_fragment_cache():
+    """Caché de registros codificados en JSON del worker (None si está desactivada)."""
+    max_entries = current_app.config['JSON_FRAGMENT_CACHE']
+    return app_extension('fragment_cache', lambda: FragmentCache(max_entries) if max_entries > 0 else None)
+
+def source_key(data_source):
+    """Identifica la fuente de datos en las cachés por fila (cada conjunto subido es otra)."""
+    return ('excel', session.get('dataset_id')) if data_source == 'excel' else 'internal'
+
+def get_fuzzy_index(data_source, source):
+    """
+    Índice de búsqueda aproximada de la fuente y si está al día. Los datos internos
+    se reindexan cuando cambia su generación; cada conjunto subido tiene el suyo.
+    """
+    indexes = app_extension('fuzzy_indexes', lambda: FuzzyIndexCache(current_app.config['FUZZY_INDEX_MAX']))
+    version = None if data_source == 'excel' else source.generation
+    return indexes.get(source_key(data_source), version, lambda: FuzzyIndex(
+        (row_id, source.row_values(row_id)) for row_id in range(len(source))))
+
+def get_user_dataset():
+    """Conjunto de datos subido por el usuario actual, o None si no hay (o expiró)."""
+    return get_dataset_store().get(session.get('dataset_id'), session.get('user'))
 
 # --- Rutas Principales ---
 @main_bp.route('/')
 @login_required
-@nocache
+@revalidate
 def index():
     """Renderiza la página principal de la aplicación."""
     username = session.get('user')
@@ -86,7 +239,7 @@ def index():
 
 @main_bp.route('/search_page')
 @login_required
-@nocache
+@revalidate
 def search_page():
     """Renderiza la página de búsqueda de documentos."""
     username = session.get('user')
@@ -97,7 +250,10 @@ def search_page():
 @main_bp.route('/upload', methods=['POST'])
 @login_required
 def upload_file():
-    """Maneja la carga y procesamiento de archivos Excel."""
+    """
+    Recibe un archivo Excel/CSV y encola su procesamiento en segundo plano.
+    El progreso se consulta en /upload/status/<job_id>.
+    """
     if 'file' not in request.files:
         return jsonify({'error': 'No se seleccionó archivo'}), 400
     
@@ -107,76 +263,360 @@ def upload_file():
     
     if file and allowed_file(file.filename):
         filename = secure_filename(file.filename)
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}")
+        # El sufijo aleatorio evita que dos cargas del mismo archivo en el mismo segundo se pisen.
+        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'],
+                                f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(4)}_{filename}")
         
         try:
-            file.save(filepath)
-            df = pd.read_excel(filepath, engine='openpyxl')
-            df = df.dropna(how='all').fillna('')
-            
-            session['excel_data'] = df.to_dict('records')
-            session['current_filename'] = file.filename
-            
-            upload_history.append({
-                'filename': file.filename, 'timestamp': datetime.now().isoformat(),
-                'records': len(session['excel_data']), 'user': session.get('user')
-            })
-            
-            os.remove(filepath)
-            return jsonify({'success': True, 'filename': file.filename, 'records': len(session['excel_data'])})
+            with track_stages(UPLOAD_STAGES).stage('save'):
+                file.save(filepath)
+            job_id = get_upload_jobs().submit(session.get('user'), file.filename, filepath)
+            return jsonify({'success': True, 'filename': file.filename, 'job_id': job_id}), 202
             
+        except JobLimitError as e:
+            if os.path.exists(filepath): os.remove(filepath)
+            return jsonify({'error': str(e)}), 429
         except Exception as e:
-            logger.error(f"Error procesando archivo para {session.get('user')}: {e}")
+            logger.error(f"Error guardando archivo para {session.get('user')}: {e}")
             if os.path.exists(filepath): os.remove(filepath)
-            return jsonify({'error': f'Error al leer el archivo: {str(e)}'}), 400
+            return jsonify({'error': f'Error al guardar el archivo: {str(e)}'}), 400
     
     return jsonify({'error': 'Tipo de archivo no permitido'}), 400
 
-@main_bp.route('/search', methods=['POST'])
+@main_bp.route('/upload/status/<job_id>')
+@login_required
+def upload_status(job_id):
+    """
+    Progreso de una carga (fase, filas leídas, ETA). Al terminar, activa los datos
+    en la sesión, salvo que ya estén activos los de una carga posterior (por
+    ejemplo, si otra pestaña o una consulta tardía pregunta por una carga vieja).
+    """
+    state = get_upload_jobs().status(job_id, session.get('user'))
+    if state is None:
+        return jsonify({'error': 'Carga no encontrada'}), 404
+
+    store = get_dataset_store()
+    if (state['phase'] == DONE and session.get('dataset_id') != state['dataset_id']
+            and state['started'] > session.get('dataset_started', 0)
+            and store.get(state['dataset_id'], session.get('user')) is not None):
+        previous = session.get('dataset_id')
+        session['dataset_id'] = state['dataset_id']
+        session['dataset_started'] = state['started']
+        session['current_filename'] = state['filename']
+        # Los datos anteriores se borran recién cuando la sesión ya apunta a los nuevos.
+        store.delete(previous)
+        get_history('upload').append({
+            'filename': state['filename'], 'timestamp': datetime.now().isoformat(),
+            'records': state['rows'], 'user': session.get('user')
+        })
+    return jsonify(state)
+
+@main_bp.route('/upload/cancel/<job_id>', methods=['POST'])
+@login_required
+def upload_cancel(job_id):
+    """Cancela una carga en proceso."""
+    if not get_upload_jobs().cancel(job_id, session.get('user')):
+        return jsonify({'success': False, 'error': 'La carga no existe o ya terminó'}), 404
+    return jsonify({'success': True})
+
+@main_bp.route('/search', methods=['GET', 'POST'])
 @login_required
 def search():
-    """Ejecuta una búsqueda sobre los datos internos o el archivo cargado."""
-    data = request.get_json()
-    query = data.get('query', '').lower().strip()
+    """
+    Ejecuta una búsqueda sobre los datos internos o el archivo cargado.
+
+    ``mode`` decide el orden: ``ranked`` (por defecto) de mayor a menor relevancia,
+    ``ordered`` en el orden de los datos, ``advanced`` interpreta la consulta como
+    ``campo:valor AND/OR/NOT (...)`` (ver ``AdvancedQuery``) y ``fuzzy`` tolera
+    errores de tipeo (``maxDistance`` por palabra, ver ``FuzzyIndex``). Los resultados se devuelven por páginas:
+    ``limit`` fija el tamaño (con un máximo en el servidor) y ``cursor`` es el
+    ``next_cursor`` de la página anterior. Con ``stream: true`` (o ``Accept:
+    application/x-ndjson``) la respuesta es NDJSON, en el orden de los datos, y
+    cada resultado se envía en cuanto se encuentra.
+
+    Con GET (los mismos parámetros en la URL) la respuesta lleva ETag y
+    Last-Modified según la versión de los datos: si no cambiaron, se responde 304
+    sin buscar.
+    """
+    if request.method == 'GET':
+        data = request.args.to_dict()
+        data['stream'] = data.get('stream') in ('1', 'true')
+    else:
+        data = request.get_json()
+    query = normalize_text(data.get('query', ''))
     data_source = data.get('dataSource', 'internal')
+    mode = data.get('mode', 'ranked')
+    cfg = current_app.config
+
+    if mode not in SEARCH_MODES:
+        return jsonify({'error': f'Modo de búsqueda desconocido: {mode}'}), 400
+    try:
+        limit = min(max(int(data.get('limit') or cfg['SEARCH_PAGE_SIZE']), 1), cfg['SEARCH_MAX_PAGE_SIZE'])
+        cursor = data.get('cursor')
+        position = int(cursor) if cursor is not None else None
+        max_distance = data.get('maxDistance')
+        max_distance = max(int(max_distance), 0) if max_distance is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Parámetros de paginación inválidos'}), 400
 
     if not query:
-        return jsonify({'results': [], 'query': query})
+        return jsonify({'results': [], 'query': query, 'total': 0, 'next_cursor': None})
 
-    search_history.append({
-        'query': query, 'timestamp': datetime.now().isoformat(), 'user': session.get('user')
-    })
+    if cursor is None:
+        record_search({
+            'query': query, 'type': mode, 'timestamp': datetime.now().isoformat(), 'user': session.get('user')
+        })
 
-    data_to_search = session.get('excel_data', []) if data_source == 'excel' else INTERNAL_DATA
-    
-    results = []
-    for item in data_to_search:
-        if any(query in str(value).lower() for value in item.values()):
-            results.append(item)
-            
+    if data_source == 'excel':
+        source = get_user_dataset()
+    else:
+        source = get_internal_store()
+    meta = {'query': query, 'is_excel_data': data_source == 'excel',
+            'total_records': len(source) if source is not None else 0}
+
+    if data.get('stream') or request.accept_mimetypes.best == 'application/x-ndjson':
+        after = position if position is not None else -1
+        return Response(stream_with_context(stream_results(source, source_key(data_source), query, after,
+                                                           cfg['SEARCH_STREAM_MAX'], meta)),
+                        mimetype='application/x-ndjson')
+
+    meta['mode'] = mode
+    meta['limit'] = limit
+    stages = track_stages(SEARCH_STAGES, mode=mode)
+    validators = None
+    if source is not None and request.method == 'GET':
+        validators = data_validators(source, data_source, mode, query, position, limit, max_distance)
+        if not_modified(validators):
+            return with_validators(current_app.response_class(status=304), validators)
+    cache = get_result_cache() if source is not None else None
+    if cache is not None:
+        # La versión de los datos va en la clave: un cambio invalida las entradas viejas.
+        version = session.get('dataset_id') if data_source == 'excel' else source.generation
+        key = (data_source, version, mode, query, position, limit, max_distance)
+        body = cache.get(key)
+        if body is not None:
+            response = current_app.response_class(body, mimetype='application/json')
+            response.headers['X-Cache'] = 'HIT'
+            return with_validators(response, validators) if validators else response
+
+    if source is None:
+        meta.update({'results': [], 'total': 0, 'next_cursor': None})
+    elif mode == 'ranked':
+        meta.update(pool_page(data_source, source, mode, query, position or 0, limit)
+                    or ranked_page(source, query, position or 0, limit))
+    elif mode == 'advanced':
+        try:
+            meta.update(pool_page(data_source, source, mode, query, position or 0, limit)
+                        or advanced_page(source, query, position or 0, limit))
+        except QuerySyntaxError as e:
+            return jsonify({'error': f'Consulta avanzada inválida: {e}'}), 400
+    elif mode == 'fuzzy':
+        with stages.stage('lookup'):
+            index, fresh = get_fuzzy_index(data_source, source)
+        meta.update(fuzzy_page(source, index, query, position or 0, limit, max_distance))
+        if not fresh:
+            # Respuesta de un índice que se está reconstruyendo: no se guarda con la versión nueva.
+            cache = validators = None
+    else:
+        meta.update(ordered_page(source, query, position, limit))
+
+    rows = meta.pop('rows', None)
+    with stages.stage('serialize'):
+        response = jsonify(meta) if rows is None else records_response(meta, 'results', source, source_key(data_source), rows)
+    if cache is not None:
+        cache.put(key, response.get_data())
+        response.headers['X-Cache'] = 'MISS'
+    return with_validators(response, validators) if validators else response
+
+@main_bp.route('/search/cache')
+@login_required
+def search_cache_stats():
+    """Contadores de la caché de resultados de este worker (aciertos, fallos, descartes, bytes)."""
+    cache = get_result_cache()
+    return jsonify(cache.stats() if cache is not None else {'enabled': False})
+
+@main_bp.route('/analytics')
+@login_required
+def analytics():
+    """
+    Estadísticas de las búsquedas (ver ``SearchAnalytics``) y últimas cargas de
+    este worker. Los contadores se actualizan con cada búsqueda: no se recorre el historial.
+    Incluye consultas y usuarios de todos, así que es solo para ``PROFILE_ADMINS``.
+    """
+    if not is_profile_admin():
+        return jsonify({'error': 'No autorizado'}), 403
+    uploads = get_history('upload')
     return jsonify({
-        'results': results, 'query': query,
-        'is_excel_data': data_source == 'excel', 'total_records': len(data_to_search)
+        'searches': get_search_analytics().summary(get_history('search').recent(10)),
+        'uploads': {'total': uploads.total, 'recent': uploads.recent(10)},
     })
 
+@main_bp.route('/search/suggest', methods=['POST'])
+@login_required
+def search_suggest():
+    """
+    Sugerencias mientras se escribe: las mejores ``SUGGEST_LIMIT`` coincidencias
+    por relevancia. Si la consulta extiende la anterior de la misma sesión, solo
+    se filtran sus candidatos en lugar de buscar otra vez en todos los datos.
+    """
+    data = request.get_json(silent=True) or {}
+    query = normalize_text(str(data.get('query', '')))
+    data_source = data.get('dataSource', 'internal')
+    cfg = current_app.config
+    if len(query) < cfg['SUGGEST_MIN_CHARS']:
+        return jsonify({'query': query, 'suggestions': [], 'total': 0})
+
+    source = get_user_dataset() if data_source == 'excel' else get_internal_store()
+    if source is None:
+        return jsonify({'query': query, 'suggestions': [], 'total': 0})
+
+    cache = get_candidate_cache()
+    session_key = (session.get('user'), data_source)
+    version = session.get('dataset_id') if data_source == 'excel' else source.generation
+    previous = cache.get(session_key, version, query)
+    rows = array('I')
+    max_candidates = cfg['SUGGEST_MAX_CANDIDATES']
+
+    def candidates():
+        if previous is not None:
+            matches = ((row_id, source.row_values(row_id)) for row_id in previous)
+            matches = ((row_id, values) for row_id, values in matches if any(query in value for value in values))
+        else:
+            matches = ((row_id, source.row_values(row_id)) for row_id in source.search_ids(query))
+        for row_id, values in matches:
+            if len(rows) <= max_candidates:
+                rows.append(row_id)
+            yield row_id, values
+
+    total, ranked = SearchEngine.top_k(query, candidates(), cfg['SUGGEST_LIMIT'])
+    if total <= max_candidates:
+        cache.put(session_key, version, query, rows)
+    else:
+        # Demasiadas coincidencias para guardarlas: la próxima tecla busca de nuevo.
+        cache.discard(session_key)
+    meta = {'query': query, 'total': total, 'reused': previous is not None}
+    return records_response(meta, 'suggestions', source, source_key(data_source), [row_id for _, row_id in ranked])
+
+@main_bp.route('/export')
+@login_required
+def export():
+    """
+    Descarga todos los resultados de una búsqueda (``query``, ``dataSource``,
+    ``mode`` y ``maxDistance`` como en /search) en ``format`` csv, xlsx o json.
+    La búsqueda se repite en el servidor y el archivo se envía a medida que se
+    recorren los resultados, sin armarlo completo en memoria ni escribirlo en disco.
+    """
+    args = request.args
+    query = normalize_text(args.get('query', ''))
+    data_source = args.get('dataSource', 'internal')
+    mode = args.get('mode', 'ranked')
+    export_format = args.get('format', 'csv')
+    cfg = current_app.config
+
+    if mode not in SEARCH_MODES:
+        return jsonify({'error': f'Modo de búsqueda desconocido: {mode}'}), 400
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Formato de exportación desconocido: {export_format}'}), 400
+    if not query:
+        return jsonify({'error': 'La consulta no puede estar vacía'}), 400
+    try:
+        max_distance = args.get('maxDistance')
+        max_distance = max(int(max_distance), 0) if max_distance is not None else None
+    except ValueError:
+        return jsonify({'error': 'Parámetros inválidos'}), 400
+
+    source = get_user_dataset() if data_source == 'excel' else get_internal_store()
+    if source is None:
+        return jsonify({'error': 'No hay datos cargados'}), 404
+    try:
+        rows = export_rows(source, data_source, mode, query, max_distance)
+    except QuerySyntaxError as e:
+        return jsonify({'error': f'Consulta avanzada inválida: {e}'}), 400
+
+    max_rows = cfg['EXPORT_MAX_ROWS']
+    if export_format == 'xlsx':
+        max_rows = min(max_rows, ExportManager.XLSX_MAX_ROWS)
+    records = (source.record_at(row_id) for row_id in islice(rows, max_rows))
+    columns = [name for name in source.field_names() if not name.startswith('_')]
+    if export_format == 'csv':
+        body = ExportManager.iter_csv(columns, records)
+    elif export_format == 'xlsx':
+        body = ExportManager.iter_xlsx(columns, records)
+    else:
+        body = ExportManager.iter_json(records, current_app.json.dumps_bytes)
+
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    filename = f"resultados_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    logger.info(f"Exportación {export_format} de '{query}' ({data_source}, {mode}) por {session.get('user')}")
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"'})
+
 @main_bp.route('/clear', methods=['POST'])
 @login_required
 def clear_data():
     """Limpia los datos de Excel de la sesión del usuario."""
-    session.pop('excel_data', None)
+    get_dataset_store().delete(session.pop('dataset_id', None))
     session.pop('current_filename', None)
+    # 'dataset_started' se conserva: una carga anterior que termine después no reactiva sus datos.
     return jsonify({'success': True})
 
 @main_bp.route('/status')
 @login_required
 def status():
     """Devuelve el estado actual de los datos del usuario."""
-    return jsonify({
-        'has_excel_data': 'excel_data' in session,
-        'filename': session.get('current_filename', ''),
-        'records': len(session.get('excel_data', [])),
-        'sample_records': len(INTERNAL_DATA) # Usar INTERNAL_DATA aquí
+    dataset = get_user_dataset()
+    response = jsonify({
+        'has_excel_data': dataset is not None,
+        'filename': session.get('current_filename', '') if dataset is not None else '',
+        'records': len(dataset) if dataset is not None else 0,
+        'sample_records': len(get_internal_store())
     })
+    return with_validators(response, (hashlib.sha1(response.get_data()).hexdigest()[:20], None))
+
+@main_bp.route('/metrics')
+def metrics():
+    """
+    Métricas en formato Prometheus (ver app/metrics.py), sin sesión para que las
+    lea el servidor de Prometheus. Las de los datos se calculan en el momento.
+    """
+    if not metrics_enabled():
+        return jsonify({'error': 'Métricas desactivadas'}), 404
+    return Response(render_metrics(data_gauges()), content_type=CONTENT_TYPE)
+
+@main_bp.route('/admin/profiles')
+@login_required
+def profiles():
+    """
+    Peticiones perfiladas (ver app/profiling.py), de la más lenta a la más rápida,
+    con el enlace para descargar cada perfil. Solo para ``PROFILE_ADMINS``.
+    """
+    store = get_profile_store()
+    if store is None:
+        return jsonify({'error': 'Perfilado desactivado'}), 404
+    if not is_profile_admin():
+        return jsonify({'error': 'No autorizado'}), 403
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 1000)
+    except ValueError:
+        return jsonify({'error': 'Parámetros inválidos'}), 400
+    entries = store.slowest(limit)
+    for entry in entries:
+        entry['download'] = url_for('main.profile_file', profile_id=entry['id'])
+    return jsonify({'profiles': entries})
+
+@main_bp.route('/admin/profiles/<profile_id>')
+@login_required
+def profile_file(profile_id):
+    """Descarga un perfil (``.folded`` o ``.prof``)."""
+    store = get_profile_store()
+    if store is None:
+        return jsonify({'error': 'Perfilado desactivado'}), 404
+    if not is_profile_admin():
+        return jsonify({'error': 'No autorizado'}), 403
+    entry = store.get(profile_id)
+    if entry is None:
+        return jsonify({'error': 'Perfil no encontrado'}), 404
+    return send_file(os.path.abspath(os.path.join(store.folder, entry['file'])), as_attachment=True)
 
 
 @main_bp.route('/update_data', methods=['POST'])
@@ -191,27 +631,270 @@ def update_data():
     if not all([exp_bn, field]):
         return jsonify({'success': False, 'error': 'Datos incompletos'}), 400
 
-    global INTERNAL_DATA
-    updated = False
-    for item in INTERNAL_DATA:
-        if item.get('EXP BN') == exp_bn:
-            item[field] = value
-            updated = True
-            break
+    try:
+        updated = get_internal_store().update(exp_bn, {field: value})
+    except Exception as e:
+        logger.error(f"Error al escribir en {DATA_FILE_PATH}: {e}")
+        return jsonify({'success': False, 'error': 'Error al guardar los datos'}), 500
 
     if not updated:
         return jsonify({'success': False, 'error': 'Documento no encontrado'}), 404
 
+    logger.info(f"Dato actualizado en {DATA_FILE_PATH}: EXP BN={exp_bn}, campo={field}")
+    return jsonify({'success': True})
+
+@main_bp.route('/update_data/batch', methods=['POST'])
+@login_required
+def update_data_batch():
+    """
+    Actualiza varios registros en una sola petición, con un solo bloqueo y una
+    sola escritura al diario. Espera {'updates': [{'exp_bn': ..., 'changes': {campo: valor}}]}.
+    """
+    data = request.get_json(silent=True) or {}
+    updates = data.get('updates')
+    if not isinstance(updates, list) or not updates:
+        return jsonify({'success': False, 'error': 'Datos incompletos'}), 400
+
+    results = [None] * len(updates)
+    valid = []
+    for i, entry in enumerate(updates):
+        exp_bn = entry.get('exp_bn') if isinstance(entry, dict) else None
+        changes = entry.get('changes') if isinstance(entry, dict) else None
+        if not exp_bn or not isinstance(changes, dict) or not changes or not all(changes):
+            results[i] = {'exp_bn': exp_bn, 'success': False, 'error': 'Datos incompletos'}
+        else:
+            valid.append((i, exp_bn, changes))
+
     try:
-        with open(DATA_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(INTERNAL_DATA, f, indent=4, ensure_ascii=False)
-        logger.info(f"Dato actualizado en {DATA_FILE_PATH}: EXP BN={exp_bn}, campo={field}")
-        return jsonify({'success': True})
+        found = get_internal_store().update_many([(exp_bn, changes) for _, exp_bn, changes in valid])
     except Exception as e:
         logger.error(f"Error al escribir en {DATA_FILE_PATH}: {e}")
         return jsonify({'success': False, 'error': 'Error al guardar los datos'}), 500
 
+    for (i, exp_bn, _), ok in zip(valid, found):
+        results[i] = {'exp_bn': exp_bn, 'success': True} if ok else \
+            {'exp_bn': exp_bn, 'success': False, 'error': 'Documento no encontrado'}
+
+    logger.info(f"Lote actualizado en {DATA_FILE_PATH}: {sum(found)} de {len(updates)} registros")
+    return jsonify({'success': all(r['success'] for r in results), 'results': results})
+
 # --- Funciones de Utilidad ---
+def encode_records(source, key, rows):
+    """Registros de ``rows`` en JSON, reutilizando los ya codificados (``FragmentCache``)."""
+    dumps = current_app.json.dumps_bytes
+    fragments = get_fragment_cache()
+    if fragments is None:
+        return [dumps(source.record_at(row_id)) for row_id in rows]
+    return fragments.encode(key, rows, source.record_at, dumps)
+
+def records_response(meta, field, source, key, rows):
+    """
+    Respuesta JSON con ``meta`` y, en ``field``, los registros de ``rows``. Los
+    registros se insertan como fragmentos ya codificados, sin pasar por el encoder.
+    """
+    head = current_app.json.dumps_bytes(meta)
+    records = b','.join(encode_records(source, key, rows))
+    body = b'%s%s"%s":[%s]}\n' % (head[:-1], b',' if meta else b'', field.encode(), records)
+    return current_app.response_class(body, mimetype='application/json')
+
+def ranked_page(source, query, offset, limit, stages=None):
+    """
+    Página de resultados por relevancia. Se puntúan todas las coincidencias con los
+    valores ya normalizados del índice, pero solo se guardan las ``offset + limit``
+    mejores en un heap y solo se codifican los registros de la página (``rows``).
+    El cursor es la cantidad de resultados ya entregados.
+    """
+    stages = stages if stages is not None else current_stages()
+    with stages.stage('lookup'):
+        row_ids = array('I', source.search_ids(query))
+    with stages.stage('rank'):
+        candidates = ((row_id, source.row_values(row_id)) for row_id in row_ids)
+        total, ranked = SearchEngine.top_k(query, candidates, offset + limit)
+    page = ranked[offset:offset + limit]
+    return {
+        'rows': [row_id for _, row_id in page],
+        'total': total,
+        'next_cursor': str(offset + limit) if total > offset + limit else None,
+    }
+
+def advanced_matches(source, query, stages=None):
+    """
+    Filas que cumplen una consulta avanzada y la clave para ordenarlas por
+    relevancia, como en ``SearchEngine.advanced_search``. Cada condición obtiene
+    sus candidatos del índice de trigramas y solo verifica el campo pedido en
+    ellos; luego el árbol combina los conjuntos.
+    """
+    plan = AdvancedQuery(query)
+    stages = stages if stages is not None else current_stages()
+
+    def term_rows(term):
+        if isinstance(source, Dataset) and term.field is not None:
+            # Los datos subidos ya están por columnas: máscara vectorizada sobre el campo.
+            return source.frame.contains_rows(term.field, term.value)
+        with stages.stage('lookup'):
+            candidates = array('I', source.search_ids(term.value))
+        if term.field is None:
+            return set(candidates)
+        rows = set()
+        for row_id in candidates:
+            # Valores normalizados del índice, con los nombres de campo del registro
+            shadow = dict(zip(source.record_at(row_id), source.row_values(row_id)))
+            if AdvancedQuery.shadow_matches(term, shadow):
+                rows.add(row_id)
+        return rows
+
+    with stages.stage('filter'):
+        rows, term_sets = plan.evaluate(term_rows, len(source))
+    return rows, lambda row_id: (-plan.relevance(row_id, term_sets), row_id)
+
+def advanced_page(source, query, offset, limit, stages=None):
+    """Página de resultados de una consulta avanzada; el cursor es la cantidad ya entregada."""
+    stages = stages if stages is not None else current_stages()
+    rows, order = advanced_matches(source, query, stages)
+    with stages.stage('rank'):
+        ranked = heapq.nsmallest(offset + limit, rows, key=order)
+    return {
+        'rows': ranked[offset:offset + limit],
+        'total': len(rows),
+        'next_cursor': str(offset + limit) if len(rows) > offset + limit else None,
+    }
+
+def pool_page(data_source, source, mode, query, offset, limit):
+    """
+    Página de ``ranked`` o ``advanced`` calculada en el pool de procesos, para no
+    ocupar el GIL del worker mientras se puntúan muchas filas. None si no hay pool,
+    los datos son chicos (``CPU_OFFLOAD_MIN_ROWS``) o el pool no pudo hacerlo: la
+    página se calcula entonces en este hilo.
+    """
+    pool = get_cpu_pool()
+    if pool is None or len(source) < current_app.config['CPU_OFFLOAD_MIN_ROWS']:
+        return None
+    if isinstance(source, Dataset):
+        locator = ('excel', source.path, None)
+    else:
+        locator = ('internal', DATA_FILE_PATH, current_app.config['INTERNAL_BACKEND'])
+    stages = current_stages()
+    try:
+        with stages.stage('queue'):
+            result = pool.run(search_task, locator, source.version, mode, query, offset, limit)
+    except (BrokenProcessPool, OSError) as e:
+        logger.warning(f"Búsqueda en el pool de procesos fallida ({e}); se hace en el worker")
+        return None
+    if result is None:
+        return None
+    page, totals = result
+    stages.merge(totals, within='queue')
+    return page
+
+def search_task(locator, version, mode, query, offset, limit):
+    """
+    Corre en un proceso del pool: página de ``ranked`` o ``advanced`` sobre la
+    fuente de ``locator`` y el tiempo de cada etapa. None si los datos del proceso
+    no están en la misma ``version`` que los del worker que la pidió.
+    """
+    source = open_source(locator, SAMPLE_DATA)
+    if source.version != version:
+        return None
+    stages = StageTimer()
+    page = (ranked_page if mode == 'ranked' else advanced_page)(source, query, offset, limit, stages)
+    return page, stages.totals
+
+def fuzzy_page(source, index, query, offset, limit, max_distance=None):
+    """
+    Página de la búsqueda aproximada, de menor a mayor distancia total (a igual
+    distancia, en el orden de los datos). Cada resultado lleva su ``_distance``;
+    el cursor es la cantidad ya entregada.
+    """
+    stages = current_stages()
+    with stages.stage('lookup'):
+        rows, distances = index.search(query, max_distance)
+    results = []
+    with stages.stage('serialize'):
+        for row_id, distance in zip(rows[offset:offset + limit].tolist(), distances[offset:offset + limit].tolist()):
+            record = dict(source.record_at(row_id))
+            record['_distance'] = distance
+            results.append(record)
+    return {
+        'results': results,
+        'total': len(rows),
+        'next_cursor': str(offset + limit) if len(rows) > offset + limit else None,
+    }
+
+def ordered_page(source, query, after, limit):
+    """
+    Página de resultados en el orden de los datos. El cursor es la última fila
+    entregada; la primera página incluye ``total``.
+    """
+    with current_stages().stage('lookup'):
+        row_ids = list(islice(source.search_ids(query, after if after is not None else -1), limit + 1))
+        has_more = len(row_ids) > limit
+        row_ids = row_ids[:limit]
+        page = {
+            'rows': row_ids,
+            'next_cursor': str(row_ids[-1]) if has_more else None,
+        }
+        if after is None:
+            # Solo se cuentan identificadores de fila, sin construir los registros.
+            page['total'] = len(row_ids) + (sum(1 for _ in source.search_ids(query, row_ids[-1])) if has_more else 0)
+    return page
+
+def export_rows(source, data_source, mode, query, max_distance=None):
+    """
+    Todas las filas de una búsqueda, en el mismo orden que las páginas de /search.
+    En ``ordered`` se recorren a medida que se piden; los demás modos tienen que
+    ordenarlas todas, pero solo guardan identificadores y puntajes en arreglos.
+    """
+    if mode == 'ordered':
+        return source.search_ids(query)
+    if mode == 'advanced':
+        rows, order = advanced_matches(source, query)
+        return iter(sorted(rows, key=order))
+    if mode == 'fuzzy':
+        index, _ = get_fuzzy_index(data_source, source)
+        return map(int, index.search(query, max_distance)[0])
+    words = query.split()
+    row_ids, scores = array('q'), array('d')
+    for row_id in source.search_ids(query):
+        row_ids.append(row_id)
+        scores.append(SearchEngine.score_values(words, source.row_values(row_id)))
+    # Mayor relevancia primero y, a igual relevancia, en el orden de las filas (como top_k).
+    row_ids = np.frombuffer(row_ids, dtype=np.int64)
+    order = np.lexsort((row_ids, -np.frombuffer(scores, dtype=np.float64)))
+    return map(int, row_ids[order])
+
+def data_gauges():
+    """Filas, bytes e índice de los datos internos y subidos, para /metrics."""
+    store = get_internal_store()
+    yield 'buscador_dataset_rows', 'Filas de cada fuente de datos', {'source': 'internal'}, len(store)
+    for kind, value in store.stats().items():
+        if kind not in ('rows', 'generation', 'overlay'):
+            yield 'buscador_index_size', 'Tamaño del índice de búsqueda', {'source': 'internal', 'kind': kind}, value
+    uploads = get_dataset_store().stats()
+    yield 'buscador_dataset_rows', 'Filas de cada fuente de datos', {'source': 'uploads'}, uploads['rows']
+    yield 'buscador_dataset_bytes', 'Bytes en disco de los datos subidos', {'source': 'uploads'}, uploads['bytes']
+    yield 'buscador_datasets_stored', 'Conjuntos de datos subidos guardados', {}, uploads['datasets']
+
+def stream_results(source, key, query, after, max_results, meta):
+    """
+    Genera la respuesta NDJSON de /search: una línea con los datos de la búsqueda,
+    una por resultado (``{"result": ...}``) y una final con el conteo.
+    """
+    dumps = current_app.json.dumps_bytes
+    yield dumps(meta) + b'\n'
+    count = 0
+    next_cursor = None
+    if source is not None:
+        last = after
+        for row_id in source.search_ids(query, after):
+            if count == max_results:
+                # Quedan más resultados: se pueden pedir desde la última fila enviada.
+                next_cursor = str(last)
+                break
+            yield b'{"result":%s}\n' % encode_records(source, key, [row_id])[0]
+            count += 1
+            last = row_id
+    yield dumps({'done': True, 'count': count, 'next_cursor': next_cursor}) + b'\n'
+
 def allowed_file(filename):
     """Verifica si la extensión del archivo es permitida."""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'xlsx', 'xls', 'csv'}
\ No newline at end of file
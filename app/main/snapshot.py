@@ -0,0 +1,323 @@
+# app/main/snapshot.py
+# -*- coding: utf-8 -*-
+"""
+Snapshot binario de los datos internos, compartido por todos los workers.
+
+``data.json`` sigue siendo la fuente de verdad; a partir de él se genera
+``data.json.snap``, que cada worker abre con ``mmap``. Las páginas las comparte
+el sistema operativo, así que la memoria de cada worker ya no crece con el tamaño
+de los datos: solo guarda el diccionario de trigramas y los registros cambiados
+desde la última compactación.
+
+Secciones del archivo (todas alineadas a 8 bytes)::
+
+    MAGIC | registros (JSON) | textos de búsqueda | claves (JSON) | orden de claves |
+    trigramas | listas de filas | cabecera JSON | (posición, longitud, MAGIC) de la cabecera
+
+Cuando otro worker compacta el diario, reemplaza el snapshot con un rename
+atómico; ``sync()`` detecta el archivo nuevo (inodo/mtime) y cambia de snapshot
+sin reiniciar. Las vistas viejas siguen siendo válidas mientras alguien las use.
+"""
+import heapq
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .index import FIELD_SEPARATOR, NGRAM_SIZE, NGramIndex, record_matches, record_values, value_grams
+from .storage import JournaledStore, file_identity, load_records, write_records
+
+logger = logging.getLogger(__name__)
+
+# La versión cambia si cambia el formato o la normalización de los textos: los
+# snapshots anteriores se consideran no válidos y se regeneran al abrir.
+MAGIC = b'BDS2'
+_TRAILER = struct.Struct('<QI4s')
+
+
+class MappedStrings(Sequence):
+    """Secuencia de textos guardados como desplazamientos + bloque UTF-8 en un mmap."""
+
+    def __init__(self, mm: mmap.mmap, offsets: memoryview, data_start: int):
+        self._mm = mm
+        self._offsets = offsets
+        self._data_start = data_start
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        start = self._data_start
+        return self._mm[start + self._offsets[i]:start + self._offsets[i + 1]].decode('utf-8')
+
+
+class Snapshot:
+    """Vista de solo lectura de un archivo ``.snap``."""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self._mm = mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header_start, header_length, magic = _TRAILER.unpack_from(mm, len(mm) - _TRAILER.size)
+        if mm[:len(MAGIC)] != MAGIC or magic != MAGIC:
+            raise ValueError(f"Snapshot no válido: {path}")
+        header = json.loads(mm[header_start:header_start + header_length].decode('utf-8'))
+        self.generation: int = header['generation']
+        self.source = header['source']
+        self.rows: int = header['rows']
+        view = memoryview(mm)
+
+        def strings(block, count):
+            offsets_start, data_start = block
+            return MappedStrings(mm, view[offsets_start:offsets_start + 8 * (count + 1)].cast('Q'), data_start)
+
+        rows = self.rows
+        self._records = strings(header['records'], rows)
+        self._keys = strings(header['keys'], rows)
+        self._key_order = view[header['key_order']:header['key_order'] + 4 * rows].cast('I')
+
+        grams = strings(header['grams'], header['gram_count'])
+        offsets_start, ids_start = header['postings']
+        posting_offsets = view[offsets_start:offsets_start + 8 * (len(grams) + 1)].cast('Q')
+        ids = view[ids_start:ids_start + 4 * posting_offsets[len(grams)]].cast('I')
+        # El diccionario de trigramas es lo único que se copia a la memoria del worker.
+        postings = {grams[i]: ids[posting_offsets[i]:posting_offsets[i + 1]] for i in range(len(grams))}
+        self.index = NGramIndex.from_parts(strings(header['texts'], rows), postings, header['n'])
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def record(self, row: int) -> Dict:
+        return json.loads(self._records[row])
+
+    def position(self, key) -> Optional[int]:
+        """Primera fila con esa clave (búsqueda binaria sobre las claves ordenadas)."""
+        target = json.dumps(key, ensure_ascii=False)
+        keys, order = self._keys, self._key_order
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if keys[order[mid]] < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and keys[order[lo]] == target:
+            return order[lo]
+        return None
+
+
+def _align(out, boundary: int = 8) -> int:
+    position = out.tell()
+    padding = (-position) % boundary
+    if padding:
+        out.write(b'\0' * padding)
+    return position + padding
+
+
+def _write_strings(out, values: Iterable[bytes]) -> List[int]:
+    """Escribe textos como desplazamientos + bloque; devuelve [inicio desplazamientos, inicio datos]."""
+    offsets = array('Q', [0])
+    blob = bytearray()
+    for value in values:
+        blob += value
+        offsets.append(len(blob))
+    offsets_start = _align(out)
+    offsets.tofile(out)
+    data_start = out.tell()
+    out.write(blob)
+    return [offsets_start, data_start]
+
+
+def _copy_strings(out, offsets: array, blob_path: str) -> List[int]:
+    offsets_start = _align(out)
+    offsets.tofile(out)
+    data_start = out.tell()
+    with open(blob_path, 'rb') as blob:
+        shutil.copyfileobj(blob, out)
+    return [offsets_start, data_start]
+
+
+def write_snapshot(path: str, records: Iterable[Dict], key: str, source, generation: int,
+                   n: int = NGRAM_SIZE) -> None:
+    """
+    Genera un snapshot a partir de los registros y lo instala con un rename atómico.
+    Registros y textos se vuelcan a archivos temporales a medida que llegan.
+    """
+    tmpdir = tempfile.mkdtemp(prefix='.snap-', dir=os.path.dirname(path) or '.')
+    try:
+        record_offsets, text_offsets = array('Q', [0]), array('Q', [0])
+        keys: List[str] = []
+        postings: Dict[str, array] = {}
+        records_path = os.path.join(tmpdir, 'records.bin')
+        texts_path = os.path.join(tmpdir, 'texts.bin')
+        with open(records_path, 'wb') as records_blob, open(texts_path, 'wb') as texts_blob:
+            for row_id, record in enumerate(records):
+                encoded = json.dumps(record, ensure_ascii=False).encode('utf-8')
+                records_blob.write(encoded)
+                record_offsets.append(record_offsets[-1] + len(encoded))
+                values = record_values(record)
+                text = FIELD_SEPARATOR.join(values).encode('utf-8')
+                texts_blob.write(text)
+                text_offsets.append(text_offsets[-1] + len(text))
+                keys.append(json.dumps(record.get(key), ensure_ascii=False))
+                for gram in value_grams(values, n):
+                    row_ids = postings.get(gram)
+                    if row_ids is None:
+                        row_ids = postings[gram] = array('I')
+                    row_ids.append(row_id)
+
+        rows = len(keys)
+        # sorted es estable: con claves repetidas queda primero la fila más baja.
+        key_order = array('I', sorted(range(rows), key=keys.__getitem__))
+        grams = sorted(postings)
+
+        tmp_path = os.path.join(tmpdir, 'data.snap')
+        with open(tmp_path, 'wb') as out:
+            out.write(MAGIC)
+            header = {'generation': generation, 'source': source, 'rows': rows, 'n': n,
+                      'key': key, 'created': time.time(), 'gram_count': len(grams)}
+            header['records'] = _copy_strings(out, record_offsets, records_path)
+            header['texts'] = _copy_strings(out, text_offsets, texts_path)
+            header['keys'] = _write_strings(out, (k.encode('utf-8') for k in keys))
+            header['key_order'] = _align(out)
+            key_order.tofile(out)
+            header['grams'] = _write_strings(out, (g.encode('utf-8') for g in grams))
+            posting_offsets = array('Q', [0])
+            for gram in grams:
+                posting_offsets.append(posting_offsets[-1] + len(postings[gram]))
+            offsets_start = _align(out)
+            posting_offsets.tofile(out)
+            ids_start = _align(out)
+            for gram in grams:
+                postings[gram].tofile(out)
+            header['postings'] = [offsets_start, ids_start]
+
+            encoded = json.dumps(header).encode('utf-8')
+            header_start = out.tell()
+            out.write(encoded)
+            out.write(_TRAILER.pack(header_start, len(encoded), MAGIC))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+class MappedRecordStore(JournaledStore):
+    """
+    Registros internos servidos desde un snapshot mapeado en memoria. Los cambios
+    posteriores al snapshot se guardan aparte (``overlay``) hasta la compactación.
+    """
+
+    def _snapshot_path(self) -> str:
+        return self.path + '.snap'
+
+    def _open_snapshot(self) -> Optional[Snapshot]:
+        try:
+            return Snapshot(self._snapshot_path())
+        except (OSError, ValueError):
+            return None
+
+    def _load_snapshot(self) -> None:
+        snapshot = self._open_snapshot()
+        source = file_identity(self.path)
+        if snapshot is None or snapshot.source != (list(source) if source else None):
+            # Falta el snapshot o data.json cambió por fuera: se regenera una sola vez.
+            with self._locked():
+                snapshot = self._open_snapshot()
+                source = file_identity(self.path)
+                if snapshot is None or snapshot.source != (list(source) if source else None):
+                    generation = snapshot.generation + 1 if snapshot is not None else 1
+                    os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                    write_snapshot(self._snapshot_path(), load_records(self.path, self._default),
+                                   self.key, source, generation)
+                    logger.info(f"Snapshot generado en {self._snapshot_path()} (generación {generation}).")
+                    snapshot = Snapshot(self._snapshot_path())
+        self._snapshot_id = file_identity(self._snapshot_path())
+        # Estado inmutable que se reemplaza completo: (snapshot, filas cambiadas, claves cambiadas).
+        self._state: Tuple[Snapshot, Dict[int, Dict], Dict[object, Optional[int]]] = (snapshot, {}, {})
+
+    def __len__(self) -> int:
+        return len(self._state[0])
+
+    def _position(self, state, key) -> Optional[int]:
+        snapshot, rows, keys = state
+        if key in keys:
+            return keys[key]
+        row_id = snapshot.position(key)
+        # La fila del snapshot ya no tiene esa clave si se cambió después.
+        if row_id is not None and row_id in rows and rows[row_id].get(self.key) != key:
+            return None
+        return row_id
+
+    def position(self, key) -> Optional[int]:
+        return self._position(self._state, key)
+
+    def get(self, key) -> Optional[Dict]:
+        state = self._state
+        row_id = self._position(state, key)
+        if row_id is None:
+            return None
+        snapshot, rows, _ = state
+        return rows[row_id] if row_id in rows else snapshot.record(row_id)
+
+    def records(self) -> Iterator[Dict]:
+        snapshot, rows, _ = self._state
+        for row_id in range(len(snapshot)):
+            yield rows[row_id] if row_id in rows else snapshot.record(row_id)
+
+    def search_ids(self, query: str, after: int = -1) -> Iterator[int]:
+        snapshot, rows, _ = self._state
+        hits = (row_id for row_id in snapshot.index.iter_search(query, after) if row_id not in rows)
+        if not rows:
+            return hits
+        # Las filas cambiadas se verifican aparte y se intercalan en orden.
+        changed = sorted(row_id for row_id, record in rows.items() if row_id > after and record_matches(record, query))
+        return heapq.merge(hits, changed)
+
+    def record_at(self, row_id: int) -> Dict:
+        snapshot, rows, _ = self._state
+        return rows[row_id] if row_id in rows else snapshot.record(row_id)
+
+    def row_values(self, row_id: int) -> List[str]:
+        snapshot, rows, _ = self._state
+        return record_values(rows[row_id]) if row_id in rows else snapshot.index.values(row_id)
+
+    def stats(self) -> Dict[str, int]:
+        snapshot, rows, _ = self._state
+        stats = snapshot.index.stats()
+        stats.update({'generation': snapshot.generation, 'overlay': len(rows)})
+        return stats
+
+    def _apply_changes(self, entries: List[Tuple[object, Dict]]) -> Set[int]:
+        snapshot, rows, keys = self._state
+        rows, keys = dict(rows), dict(keys)
+        state = (snapshot, rows, keys)
+        changed = set()
+        for key, changes in entries:
+            row_id = self._position(state, key)
+            if row_id is None:
+                continue
+            record = dict(rows[row_id]) if row_id in rows else snapshot.record(row_id)
+            record.update(changes)
+            rows[row_id] = record
+            changed.add(row_id)
+            new_key = record.get(self.key)
+            if new_key != key:
+                keys[key] = None
+                if self._position(state, new_key) is None:
+                    keys[new_key] = row_id
+        self._state = state
+        return changed
+
+    def _write_snapshot(self) -> None:
+        snapshot = self._state[0]
+        write_records(self.path, self.records())
+        write_snapshot(self._snapshot_path(), self.records(), self.key,
+                       file_identity(self.path), snapshot.generation + 1)
+        self._state = (Snapshot(self._snapshot_path()), {}, {})
@@ -0,0 +1,359 @@
+# app/main/sqlite_store.py
+# -*- coding: utf-8 -*-
+"""
+Datos internos en SQLite con índice FTS5 de trigramas (``INTERNAL_BACKEND=sqlite``).
+
+Pensado para volúmenes que ya no caben cómodamente en diccionarios de Python:
+los registros viven en disco y cada worker solo mantiene una conexión. No hace
+falta ningún servicio externo; SQLite viene con Python.
+
+- ``records`` guarda cada registro como JSON, su clave (``EXP BN``) indexada y el
+  texto de búsqueda (valores normalizados separados por salto de línea).
+- ``records_fts`` es una tabla FTS5 con el tokenizador ``trigram`` sobre ese texto;
+  da los candidatos de una búsqueda por subcadena y luego se verifica la
+  coincidencia exacta, así los resultados son los mismos que con ``RecordStore``.
+- Las actualizaciones son transacciones por clave primaria; el modo WAL y
+  ``busy_timeout`` coordinan a los workers, y la generación se guarda en ``meta``.
+
+Importación única desde ``data.json``::
+
+    python -m app.main.sqlite_store app/data/data.json
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .index import FIELD_SEPARATOR, NGRAM_SIZE, record_matches, record_values
+from .storage import PRIMARY_KEY, load_records
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos al importar
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Separador de valores en la tabla FTS (el tokenizador corta los textos en '\x00').
+TEXT_SEPARATOR = '\n'
+# Registros por transacción al importar.
+IMPORT_BATCH = 10000
+# Versión de la normalización del texto de búsqueda; si la base de datos tiene otra,
+# se recalcula el texto de todos los registros al abrirla.
+TEXT_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    key TEXT,
+    data TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS records_key ON records (key);
+CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+    text, content='records', content_rowid='id', tokenize='trigram'
+);
+"""
+
+
+def sqlite_path_for(json_path: str) -> str:
+    """Base de datos que corresponde a un ``data.json`` (``data.sqlite3`` en la misma carpeta)."""
+    return os.path.splitext(json_path)[0] + '.sqlite3'
+
+
+def _encode_key(key) -> str:
+    return json.dumps(key, ensure_ascii=False)
+
+
+def _search_text(record: Dict) -> str:
+    return TEXT_SEPARATOR.join(record_values(record))
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def import_records(db_path: str, records: Iterable[Dict], key: str = PRIMARY_KEY) -> int:
+    """
+    Crea la base de datos a partir de los registros, en un archivo temporal que se
+    renombra al terminar. Devuelve el número de registros importados.
+    """
+    directory = os.path.dirname(db_path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{db_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        conn = sqlite3.connect(tmp_path, isolation_level=None)
+        try:
+            conn.executescript(SCHEMA)
+            conn.execute('PRAGMA journal_mode=OFF')
+            rows = 0
+            batch = []
+
+            def flush():
+                conn.execute('BEGIN')
+                conn.executemany('INSERT INTO records (key, data, text) VALUES (?, ?, ?)', batch)
+                conn.execute('COMMIT')
+                batch.clear()
+
+            for record in records:
+                batch.append((_encode_key(record.get(key)), json.dumps(record, ensure_ascii=False), _search_text(record)))
+                rows += 1
+                if len(batch) >= IMPORT_BATCH:
+                    flush()
+            if batch:
+                flush()
+            # Construir el índice de una vez es más rápido que fila a fila.
+            conn.execute("INSERT INTO records_fts (records_fts) VALUES ('rebuild')")
+            conn.executemany('INSERT INTO meta (name, value) VALUES (?, ?)',
+                             [('generation', 1), ('rows', rows), ('imported', int(time.time())),
+                              ('text_version', TEXT_VERSION)])
+        finally:
+            conn.close()
+        os.replace(tmp_path, db_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return rows
+
+
+def import_json(json_path: str, db_path: Optional[str] = None, key: str = PRIMARY_KEY) -> int:
+    """Importación única de ``data.json`` (reemplaza la base de datos si ya existía)."""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        records = json.load(f)
+    return import_records(db_path or sqlite_path_for(json_path), records, key)
+
+
+class SqliteRecordStore:
+    """
+    Registros internos en SQLite. Ofrece la misma interfaz que ``RecordStore``
+    (``search``, ``get``, ``update``, ``update_many``, ``sync``, ``generation``...).
+    """
+
+    def __init__(self, db_path: str, source_path: Optional[str] = None,
+                 default: Optional[List[Dict]] = None, key: str = PRIMARY_KEY):
+        self.path = db_path
+        self.key = key
+        self._local = threading.local()
+        if not os.path.exists(db_path):
+            self._import(source_path, default or [])
+        if self._meta('text_version') != TEXT_VERSION:
+            self._rebuild_text()
+        self.generation = 0
+        self._listeners: List[Callable[[Optional[Set[int]]], None]] = []
+        self.sync()
+
+    def _rebuild_text(self) -> None:
+        """Recalcula el texto de búsqueda con la normalización actual y reconstruye el índice."""
+        conn = self._conn
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Otro worker pudo hacerlo mientras se esperaba el bloqueo.
+            if self._meta('text_version') != TEXT_VERSION:
+                rows = conn.execute('SELECT id, data FROM records').fetchall()
+                conn.executemany('UPDATE records SET text = ? WHERE id = ?',
+                                 ((_search_text(json.loads(data)), row_id) for row_id, data in rows))
+                conn.execute("INSERT INTO records_fts (records_fts) VALUES ('rebuild')")
+                conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('text_version', ?)", (TEXT_VERSION,))
+                conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+                logger.info(f"Texto de búsqueda recalculado en {self.path}: {len(rows)} registros.")
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _import(self, source_path: Optional[str], default: List[Dict]) -> None:
+        """Primera vez: importa ``data.json`` (un solo worker; los demás esperan el bloqueo)."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.lock', 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if not os.path.exists(self.path):
+                records = load_records(source_path, default) if source_path else list(default)
+                rows = import_records(self.path, records, self.key)
+                logger.info(f"Datos internos importados a {self.path}: {rows} registros.")
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        """Una conexión por hilo (sqlite3 no comparte conexiones entre hilos)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def _meta(self, name: str) -> int:
+        row = self._conn.execute('SELECT value FROM meta WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else 0
+
+    # --- Lectura ---
+    def __len__(self) -> int:
+        return self._meta('rows')
+
+    def sync(self) -> None:
+        """Lee la generación actual (otros workers la incrementan al escribir)."""
+        generation = self._meta('generation')
+        if generation != self.generation:
+            # No se sabe qué filas cambió otro worker: se avisa que pudo cambiar cualquiera.
+            self.generation = generation
+            self._notify(None)
+
+    def field_names(self) -> List[str]:
+        """Nombres de campo de todos los registros, en el orden en que aparecen."""
+        version = self.version
+        cached = getattr(self, '_field_names', None)
+        if cached is None or cached[0] != version:
+            cached = self._field_names = (version, list(dict.fromkeys(
+                name for record in self.records() for name in record)))
+        return cached[1]
+
+    @property
+    def version(self) -> str:
+        """Versión de los datos igual en todos los workers: la base de datos y su generación."""
+        return f"{os.stat(self.path).st_ino:x}.{self.generation:x}"
+
+    @property
+    def modified(self) -> Optional[float]:
+        """Fecha (timestamp) del último cambio guardado (la base de datos o su WAL)."""
+        times = []
+        for path in (self.path, self.path + '-wal'):
+            try:
+                times.append(os.stat(path).st_mtime)
+            except FileNotFoundError:
+                pass
+        return max(times, default=None)
+
+    def subscribe(self, listener: Callable[[Optional[Set[int]]], None]) -> None:
+        """Avisa a ``listener`` de las filas que cambian (None si pudo cambiar cualquiera)."""
+        self._listeners.append(listener)
+
+    def _notify(self, rows: Optional[Set[int]]) -> None:
+        for listener in self._listeners:
+            listener(rows)
+
+    def position(self, key) -> Optional[int]:
+        row = self._conn.execute('SELECT min(id) FROM records WHERE key = ?', (_encode_key(key),)).fetchone()
+        return row[0] - 1 if row[0] is not None else None
+
+    def get(self, key) -> Optional[Dict]:
+        row = self._conn.execute('SELECT data FROM records WHERE key = ? ORDER BY id LIMIT 1',
+                                 (_encode_key(key),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def records(self) -> Iterator[Dict]:
+        for (data,) in self._conn.execute('SELECT data FROM records ORDER BY id'):
+            yield json.loads(data)
+
+    def record_at(self, row_id: int) -> Dict:
+        (data,) = self._conn.execute('SELECT data FROM records WHERE id = ?', (row_id + 1,)).fetchone()
+        return json.loads(data)
+
+    def row_values(self, row_id: int) -> List[str]:
+        # El texto de búsqueda no sirve aquí: un valor puede contener el separador.
+        return record_values(self.record_at(row_id))
+
+    def search_ids(self, query: str, after: int = -1) -> Iterator[int]:
+        """
+        Filas (desde 0, como en los demás backends) posteriores a ``after`` donde
+        algún valor contiene ``query``; se leen del cursor a medida que se piden.
+        """
+        if FIELD_SEPARATOR in query:
+            return
+        if len(query) < NGRAM_SIZE:
+            # El tokenizador de trigramas no indexa consultas más cortas.
+            rows = self._conn.execute('SELECT id, text FROM records WHERE id > ? ORDER BY id', (after + 1,))
+        else:
+            phrase = '"' + query.replace('"', '""') + '"'
+            rows = self._conn.execute(
+                'SELECT r.id, r.text FROM records_fts f JOIN records r ON r.id = f.rowid '
+                'WHERE records_fts MATCH ? AND f.rowid > ? ORDER BY f.rowid', (phrase, after + 1))
+
+        for row_id, text in rows:
+            if query not in text:
+                continue
+            # Con un salto de línea en la consulta el texto unido no basta: se revisa campo a campo.
+            if TEXT_SEPARATOR in query and not record_matches(self.record_at(row_id - 1), query):
+                continue
+            yield row_id - 1
+
+    def search(self, query: str) -> List[Dict]:
+        """Registros donde algún valor contiene ``query`` (ya normalizada)."""
+        return [self.record_at(row_id) for row_id in self.search_ids(query)]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'rows': len(self),
+            'generation': self.generation,
+            'bytes': os.path.getsize(self.path),
+        }
+
+    # --- Escritura ---
+    def update(self, key, changes: Dict) -> bool:
+        """Actualiza campos de un registro. Devuelve False si la clave no existe."""
+        return self.update_many([(key, changes)])[0]
+
+    def update_many(self, entries: Iterable[Tuple[object, Dict]]) -> List[bool]:
+        """Aplica varios cambios en una sola transacción. Devuelve si cada registro existía."""
+        conn = self._conn
+        found = []
+        changed = set()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            previous = self._meta('generation')
+            for key, changes in entries:
+                row = conn.execute('SELECT id, data, text FROM records WHERE key = ? ORDER BY id LIMIT 1',
+                                   (_encode_key(key),)).fetchone()
+                found.append(row is not None)
+                if row is None:
+                    continue
+                row_id, data, old_text = row
+                record = json.loads(data)
+                record.update(changes)
+                text = _search_text(record)
+                conn.execute('UPDATE records SET key = ?, data = ?, text = ? WHERE id = ?',
+                             (_encode_key(record.get(self.key)), json.dumps(record, ensure_ascii=False), text, row_id))
+                # Tabla FTS de contenido externo: se quita el texto viejo y se indexa el nuevo.
+                conn.execute("INSERT INTO records_fts (records_fts, rowid, text) VALUES ('delete', ?, ?)",
+                             (row_id, old_text))
+                conn.execute('INSERT INTO records_fts (rowid, text) VALUES (?, ?)', (row_id, text))
+                changed.add(row_id - 1)
+            if any(found):
+                conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if changed and previous == self.generation:
+            # Nadie más escribió desde la última lectura: solo cambiaron estas filas.
+            self.generation = previous + 1
+            self._notify(changed)
+        else:
+            self.sync()
+        return found
+
+    def compact(self) -> None:
+        """Fusiona los segmentos del índice FTS y vuelca el WAL a la base de datos."""
+        conn = self._conn
+        conn.execute("INSERT INTO records_fts (records_fts) VALUES ('optimize')")
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Importa data.json a SQLite (INTERNAL_BACKEND=sqlite).')
+    parser.add_argument('json_path')
+    parser.add_argument('--db', help='Ruta de la base de datos (por defecto, junto a data.json)')
+    args = parser.parse_args()
+    db_path = args.db or sqlite_path_for(args.json_path)
+    start = time.perf_counter()
+    rows = import_json(args.json_path, db_path)
+    print(f"{rows} registros importados a {db_path} en {time.perf_counter() - start:.1f}s")
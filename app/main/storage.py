@@ -0,0 +1,430 @@
+# app/main/storage.py
+# -*- coding: utf-8 -*-
+"""
+Persistencia de los datos internos con índice por clave y diario de cambios.
+
+Cada cambio se agrega como una línea JSON al diario (``data.json.journal``) en
+lugar de reescribir todo ``data.json``, así guardar cuesta O(cambio). Cada cierto
+número de cambios el diario se compacta: se escribe un snapshot nuevo en un
+archivo temporal, se renombra de forma atómica y se vacía el diario.
+
+Los workers de gunicorn se coordinan con un bloqueo de archivo (``data.json.lock``).
+Antes de escribir, cada proceso aplica lo que otros agregaron al diario (o recarga
+el snapshot si otro lo compactó), de modo que no se pierden actualizaciones. Con
+``sync()`` al inicio de cada petición, los cambios hechos en otro worker también
+se ven al leer, sin reiniciar.
+
+Hay dos representaciones del snapshot:
+
+- ``RecordStore``: tabla compacta de tuplas (``app/main/records.py``) en la
+  memoria de cada worker (por defecto).
+- ``MappedRecordStore`` (``app/main/snapshot.py``): snapshot binario compartido
+  por todos los workers mediante ``mmap``.
+
+Para volúmenes mayores está ``SqliteRecordStore`` (``app/main/sqlite_store.py``),
+que no usa este diario: SQLite se encarga de la durabilidad y la concurrencia.
+"""
+import copy
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from .index import NGramIndex
+from .records import RecordTable
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo se sincronizan los hilos de un mismo proceso
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_KEY = 'EXP BN'
+
+
+def file_identity(path: str) -> Optional[Tuple[int, int]]:
+    """Identifica una versión de un archivo (cambia al reemplazarlo o modificarlo)."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+
+def load_records(path: str, default: List[Dict]) -> List[Dict]:
+    """Lee ``data.json``; si no existe o está dañado, devuelve una copia de ``default``."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        logger.info(f"Datos internos cargados desde {path}: {len(records)} registros.")
+        return records
+    except FileNotFoundError:
+        logger.warning(f"Archivo de datos internos no encontrado en {path}. Usando datos de ejemplo.")
+    except json.JSONDecodeError as e:
+        logger.error(f"Error al decodificar JSON en {path}: {e}. Usando datos de ejemplo.")
+    return copy.deepcopy(default)
+
+
+def write_records(path: str, records: Iterable[Dict]) -> None:
+    """
+    Escribe los registros en ``path`` de forma atómica (archivo temporal + rename),
+    con el mismo formato que ``json.dump(records, indent=4)`` pero registro a registro.
+    """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(prefix='.data-', suffix='.json', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write('[')
+            separator = '\n'
+            for record in records:
+                encoded = json.dumps(record, indent=4, ensure_ascii=False)
+                f.write(separator + '\n'.join('    ' + line for line in encoded.split('\n')))
+                separator = ',\n'
+            f.write('\n]' if separator != '\n' else ']')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class JournaledStore:
+    """
+    Base común: diario de cambios, bloqueo entre procesos, sincronización y
+    compactación. Las subclases deciden cómo se guardan y buscan los registros.
+    """
+
+    # Cambios acumulados en el diario antes de compactarlo en el snapshot.
+    COMPACT_EVERY = 500
+
+    def __init__(self, path: str, default: Optional[List[Dict]] = None, key: str = PRIMARY_KEY):
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.lock_path = path + '.lock'
+        self.key = key
+        self._default = default or []
+        self._thread_lock = threading.RLock()
+        self._lock_depth = 0
+        self._snapshot_id: Optional[Tuple[int, int]] = None
+        self._journal_pos = 0
+        self._journal_entries = 0
+        # Generación de los datos: cambia con cada actualización o recarga.
+        self.generation = 0
+        self._listeners: List[Callable[[Optional[Set[int]]], None]] = []
+        with self._thread_lock:
+            self._load()
+
+    # --- Operaciones que implementa cada representación ---
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def _load_snapshot(self) -> None:
+        """Carga el snapshot y deja en ``_snapshot_id`` la identidad del archivo que lo marca."""
+        raise NotImplementedError
+
+    def _snapshot_path(self) -> str:
+        """Archivo cuyo reemplazo indica que otro proceso compactó el diario."""
+        return self.path
+
+    def position(self, key) -> Optional[int]:
+        """Fila del registro con esa clave, o None."""
+        raise NotImplementedError
+
+    def _apply_changes(self, entries: List[Tuple[object, Dict]]) -> Set[int]:
+        """
+        Aplica cambios (ya validados o leídos del diario), actualiza los índices y
+        devuelve las filas modificadas.
+        """
+        raise NotImplementedError
+
+    def _write_snapshot(self) -> None:
+        """Vuelca el estado actual en el snapshot (bajo el bloqueo)."""
+        raise NotImplementedError
+
+    def records(self) -> Iterator[Dict]:
+        """Recorre todos los registros en orden."""
+        raise NotImplementedError
+
+    def get(self, key) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def search_ids(self, query: str, after: int = -1) -> Iterator[int]:
+        """Filas, en orden y posteriores a ``after``, donde algún valor contiene ``query``."""
+        raise NotImplementedError
+
+    def record_at(self, row_id: int) -> Dict:
+        raise NotImplementedError
+
+    def row_values(self, row_id: int) -> List[str]:
+        """Valores normalizados de la fila (para calcular relevancia sin tocar el registro)."""
+        raise NotImplementedError
+
+    def search(self, query: str) -> List[Dict]:
+        """Registros donde algún valor contiene ``query`` (ya normalizada)."""
+        return [self.record_at(row_id) for row_id in self.search_ids(query)]
+
+    def stats(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    def field_names(self) -> List[str]:
+        """Nombres de campo de todos los registros, en el orden en que aparecen."""
+        version = self.version
+        cached = getattr(self, '_field_names', None)
+        if cached is None or cached[0] != version:
+            cached = self._field_names = (version, list(dict.fromkeys(
+                name for record in self.records() for name in record)))
+        return cached[1]
+
+    @property
+    def version(self) -> str:
+        """
+        Versión de los datos igual en todos los workers (``generation`` cuenta las
+        recargas de cada proceso): el archivo del snapshot y la posición en el diario.
+        """
+        with self._thread_lock:
+            inode, mtime = self._snapshot_id or (0, 0)
+            return f"{inode:x}.{mtime:x}.{self._journal_pos:x}"
+
+    @property
+    def modified(self) -> Optional[float]:
+        """Fecha (timestamp) del último cambio guardado en disco, snapshot o diario."""
+        times = []
+        for path in (self._snapshot_path(), self.journal_path):
+            try:
+                times.append(os.stat(path).st_mtime)
+            except FileNotFoundError:
+                pass
+        return max(times, default=None)
+
+    # --- Carga y sincronización ---
+    def subscribe(self, listener: Callable[[Optional[Set[int]]], None]) -> None:
+        """Avisa a ``listener`` de las filas que cambian (None si se recargó todo)."""
+        self._listeners.append(listener)
+
+    def _notify(self, rows: Optional[Set[int]]) -> None:
+        for listener in self._listeners:
+            listener(rows)
+
+    def _load(self) -> None:
+        """Lee el snapshot y aplica el diario completo."""
+        self._load_snapshot()
+        self._journal_pos = 0
+        self._journal_entries = 0
+        self._replay()
+        self.generation += 1
+        self._notify(None)
+
+    def _replay(self) -> None:
+        """Aplica las entradas del diario posteriores a la última leída."""
+        try:
+            with open(self.journal_path, 'rb') as f:
+                f.seek(self._journal_pos)
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        entries = []
+        consumed = 0
+        for line in data.splitlines(keepends=True):
+            # Una línea sin salto final es una escritura interrumpida: se ignora.
+            if not line.endswith(b'\n'):
+                break
+            consumed += len(line)
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logger.error(f"Entrada inválida en {self.journal_path}, se ignora.")
+                continue
+            entries.append((entry['key'], entry['changes']))
+        self._journal_pos += consumed
+        self._journal_entries += len(entries)
+        if entries:
+            changed = self._apply_changes(entries)
+            self.generation += 1
+            self._notify(changed)
+
+    def sync(self) -> None:
+        """Incorpora lo que otros procesos escribieron desde la última sincronización."""
+        with self._thread_lock:
+            snapshot_id = file_identity(self._snapshot_path())
+            try:
+                journal_size = os.path.getsize(self.journal_path)
+            except FileNotFoundError:
+                journal_size = 0
+
+            if snapshot_id != self._snapshot_id or journal_size < self._journal_pos:
+                # Otro proceso compactó el diario: se parte del snapshot nuevo.
+                self._load()
+            elif journal_size > self._journal_pos:
+                self._replay()
+
+    @contextmanager
+    def _locked(self):
+        """Bloqueo exclusivo entre hilos y entre procesos (reentrante en el mismo hilo)."""
+        with self._thread_lock:
+            if fcntl is None or self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # --- Escritura ---
+    def update(self, key, changes: Dict) -> bool:
+        """Actualiza campos de un registro. Devuelve False si la clave no existe."""
+        return self.update_many([(key, changes)])[0]
+
+    def update_many(self, entries: Iterable[Tuple[object, Dict]]) -> List[bool]:
+        """
+        Aplica varios cambios bajo un solo bloqueo y una sola escritura al diario.
+        Devuelve, para cada entrada, si el registro existía.
+        """
+        entries = list(entries)
+        with self._locked():
+            self.sync()
+            found = [False] * len(entries)
+            accepted = []
+            lines = []
+            # Las claves pueden cambiar dentro del mismo lote; se siguen en orden
+            # sin copiar el índice completo.
+            renamed = {}
+            for i, (key, changes) in enumerate(entries):
+                row_id = renamed[key] if key in renamed else self.position(key)
+                found[i] = row_id is not None
+                if row_id is None:
+                    continue
+                new_key = changes.get(self.key, key)
+                if new_key != key:
+                    renamed[key] = None
+                    if (renamed[new_key] if new_key in renamed else self.position(new_key)) is None:
+                        renamed[new_key] = row_id
+                accepted.append((key, changes))
+                lines.append(json.dumps({'key': key, 'changes': changes}, ensure_ascii=False) + '\n')
+            if not lines:
+                return found
+
+            payload = ''.join(lines).encode('utf-8')
+            with open(self.journal_path, 'ab') as journal:
+                journal.write(payload)
+                journal.flush()
+                os.fsync(journal.fileno())
+            self._journal_pos += len(payload)
+            self._journal_entries += len(lines)
+            changed = self._apply_changes(accepted)
+            self.generation += 1
+            self._notify(changed)
+
+            if self._journal_entries >= self.COMPACT_EVERY:
+                self._compact()
+            return found
+
+    def compact(self) -> None:
+        """Vuelca el estado actual en el snapshot y vacía el diario."""
+        with self._locked():
+            self.sync()
+            self._compact()
+
+    def _compact(self) -> None:
+        self._write_snapshot()
+        # Si el proceso muere aquí, reaplicar el diario sobre el snapshot nuevo es inofensivo.
+        open(self.journal_path, 'w').close()
+        self._snapshot_id = file_identity(self._snapshot_path())
+        self._journal_pos = 0
+        self._journal_entries = 0
+        logger.info(f"Diario compactado en {self.path}: {len(self)} registros.")
+
+
+class RecordStore(JournaledStore):
+    """
+    Registros internos en la memoria de cada worker, como filas de una
+    ``RecordTable``. Las lecturas devuelven vistas (``RecordView``) de la fila.
+    """
+
+    def _load_snapshot(self) -> None:
+        self._snapshot_id = file_identity(self.path)
+        records = load_records(self.path, self._default)
+        positions = {}
+        for row_id, record in enumerate(records):
+            positions.setdefault(record.get(self.key), row_id)
+        # Los diccionarios de la carga se descartan al salir: solo queda la tabla.
+        table = RecordTable(records)
+        # El índice guarda los valores en el orden del esquema, el mismo en que ``record_at``
+        # lista los campos (las consultas ``campo:valor`` emparejan ambos por posición).
+        self._records, self._positions = table, positions
+        self.index = NGramIndex(table.view(row_id) for row_id in range(len(table)))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def records(self) -> Iterator[Dict]:
+        return iter(self._records)
+
+    def position(self, key) -> Optional[int]:
+        return self._positions.get(key)
+
+    def field_names(self) -> List[str]:
+        # El esquema de la tabla ya tiene todas las columnas (incluso las agregadas al actualizar).
+        return list(self._records.columns)
+
+    def get(self, key) -> Optional[Dict]:
+        row_id = self._positions.get(key)
+        return self._records.view(row_id) if row_id is not None else None
+
+    def search_ids(self, query: str, after: int = -1) -> Iterator[int]:
+        return self.index.iter_search(query, after)
+
+    def record_at(self, row_id: int) -> Dict:
+        return self._records.view(row_id)
+
+    def row_values(self, row_id: int) -> List[str]:
+        return self.index.values(row_id)
+
+    def stats(self) -> Dict[str, int]:
+        return self.index.stats()
+
+    def _apply_changes(self, entries: List[Tuple[object, Dict]]) -> Set[int]:
+        changed = set()
+        for key, changes in entries:
+            row_id = self._positions.get(key)
+            if row_id is None:
+                continue
+            self._records.update(row_id, changes)
+            new_key = self._records.value(row_id, self.key)
+            if new_key != key:
+                del self._positions[key]
+                self._positions.setdefault(new_key, row_id)
+            changed.add(row_id)
+        for row_id in changed:
+            self.index.update(row_id, self._records.view(row_id))
+        return changed
+
+    def _write_snapshot(self) -> None:
+        write_records(self.path, self._records)
+
+
+def open_record_store(path: str, backend: str = 'memory', default: Optional[List[Dict]] = None):
+    """Crea el almacén de datos internos con la representación configurada."""
+    if backend == 'memory':
+        return RecordStore(path, default=default)
+    if backend == 'mapped':
+        from .snapshot import MappedRecordStore
+        return MappedRecordStore(path, default=default)
+    if backend == 'sqlite':
+        from .sqlite_store import SqliteRecordStore, sqlite_path_for
+        return SqliteRecordStore(sqlite_path_for(path), source_path=path, default=default)
+    raise ValueError(f"Backend de datos internos desconocido: {backend}")
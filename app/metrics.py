@@ -0,0 +1,227 @@
+# app/metrics.py
+# -*- coding: utf-8 -*-
+"""
+Métricas de Prometheus (``/metrics``).
+
+- ``buscador_request_seconds``: latencia de cada ruta (endpoint, método y estado),
+  medida hasta que se envió el último byte, también en las respuestas en streaming.
+- ``buscador_search_stage_seconds`` y ``buscador_upload_stage_seconds``: tiempo
+  de cada etapa de ``/search`` (lookup, filter, rank, serialize y queue, la espera
+  del pool de procesos) y de las cargas (save, parse, clean, index). Ver ``StageTimer``.
+- ``buscador_session_bytes``: tamaño de la cookie de sesión que envía el navegador.
+- ``buscador_cache_lookups``: aciertos y fallos de las cachés de cada worker; al
+  exponer las métricas se agrega ``buscador_cache_hit_ratio``.
+- Filas, bytes y tamaño del índice de los datos: se calculan al pedir ``/metrics``
+  (ver ``render_metrics``), con lo que ve el worker que responde.
+
+Con varios workers de gunicorn, ``PROMETHEUS_MULTIPROC_DIR`` debe apuntar a un
+directorio vacío antes de arrancar: cada proceso escribe ahí sus valores y
+``/metrics`` los suma, responda el worker que responda. Al terminar un worker hay
+que llamar a ``multiprocess.mark_process_dead``. gunicorn.conf.py hace ambas
+cosas (define y vacía el directorio, hook ``child_exit``).
+
+``prometheus_client`` es opcional (está en ``requirements-prod.txt``): sin él,
+o con ``METRICS_ENABLED`` desactivado, los temporizadores no hacen nada y
+``/metrics`` responde 404.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from flask import current_app, g, request
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Gauge, Histogram, multiprocess
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # Dependencia opcional: sin métricas
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+STAGE_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+UPLOAD_BUCKETS = (.01, .05, .1, .5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+SESSION_BUCKETS = (64, 128, 256, 512, 1024, 2048, 3072, 4096)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Cachés de ``current_app.extensions`` con contadores ``hits``/``misses`` en ``stats()``.
+TRACKED_CACHES = {'search': 'result_cache', 'fragments': 'fragment_cache'}
+
+if prometheus_client is not None:
+    REQUEST_LATENCY = Histogram('buscador_request_seconds', 'Latencia de las peticiones por ruta',
+                                ['endpoint', 'method', 'status'])
+    SEARCH_STAGES = Histogram('buscador_search_stage_seconds', 'Tiempo de cada etapa de /search',
+                              ['mode', 'stage'], buckets=STAGE_BUCKETS)
+    UPLOAD_STAGES = Histogram('buscador_upload_stage_seconds', 'Tiempo de cada etapa de las cargas',
+                              ['stage'], buckets=UPLOAD_BUCKETS)
+    SESSION_BYTES = Histogram('buscador_session_bytes', 'Bytes de la cookie de sesión recibida',
+                              buckets=SESSION_BUCKETS)
+    CACHE_LOOKUPS = Gauge('buscador_cache_lookups', 'Consultas a las cachés desde que arrancó cada worker',
+                          ['cache', 'result'], multiprocess_mode='livesum')
+else:
+    REQUEST_LATENCY = SEARCH_STAGES = UPLOAD_STAGES = SESSION_BYTES = CACHE_LOOKUPS = None
+
+
+def multiprocess_dir() -> Optional[str]:
+    """Directorio compartido entre workers, o None si cada proceso expone lo suyo."""
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR') or os.environ.get('prometheus_multiproc_dir')
+
+
+class StageTimer:
+    """
+    Tiempo de cada etapa de una operación. Las etapas pueden anidarse: mientras
+    corre una interna, la externa no suma, así que los tiempos no se solapan y
+    su suma es el total medido. ``observe`` los publica en el histograma.
+    """
+
+    def __init__(self, histogram=None, **labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.totals: Dict[str, float] = {}
+        self._stack: List[str] = []
+        self._since = 0.0
+
+    def _switch(self) -> None:
+        now = time.perf_counter()
+        if self._stack:
+            name = self._stack[-1]
+            self.totals[name] = self.totals.get(name, 0.0) + now - self._since
+        self._since = now
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        self._switch()
+        self._stack.append(name)
+        try:
+            yield
+        finally:
+            self._switch()
+            self._stack.pop()
+
+    def merge(self, totals: Dict[str, float], within: Optional[str] = None) -> None:
+        """
+        Suma los tiempos de etapas medidos en otro proceso. Si se esperaron dentro
+        de la etapa ``within``, se descuentan de ella para que no cuenten dos veces.
+        """
+        for name, seconds in totals.items():
+            self.totals[name] = self.totals.get(name, 0.0) + seconds
+        if within is not None and within in self.totals:
+            self.totals[within] = max(self.totals[within] - sum(totals.values()), 0.0)
+
+    def observe(self) -> None:
+        if self.histogram is None:
+            return
+        for name, seconds in self.totals.items():
+            self.histogram.labels(stage=name, **self.labels).observe(seconds)
+        self.totals = {}
+
+
+def track_stages(histogram, **labels) -> StageTimer:
+    """Temporizador de etapas de la petición actual; se publica al terminar la respuesta."""
+    timer = StageTimer(histogram if metrics_enabled() else None, **labels)
+    g.stage_timer = timer
+    return timer
+
+
+def current_stages() -> StageTimer:
+    """Temporizador de la petición actual (uno que no publica nada si no hay)."""
+    timer = g.get('stage_timer') if g else None
+    return timer if timer is not None else StageTimer()
+
+
+def metrics_enabled() -> bool:
+    return prometheus_client is not None and current_app.config['METRICS_ENABLED']
+
+
+def _cache_hit_ratios(families) -> Iterator['GaugeMetricFamily']:
+    counts: Dict[str, Dict[str, float]] = {}
+    for family in families:
+        if family.name == 'buscador_cache_lookups':
+            for sample in family.samples:
+                cache = counts.setdefault(sample.labels['cache'], {})
+                cache[sample.labels['result']] = cache.get(sample.labels['result'], 0.0) + sample.value
+    ratio = GaugeMetricFamily('buscador_cache_hit_ratio', 'Aciertos / consultas de cada caché', labels=['cache'])
+    for cache, values in sorted(counts.items()):
+        lookups = values.get('hit', 0.0) + values.get('miss', 0.0)
+        ratio.add_metric([cache], values.get('hit', 0.0) / lookups if lookups else 0.0)
+    yield ratio
+
+
+class _Families:
+    """Colector con una lista ya armada de métricas (lo que espera ``generate_latest``)."""
+
+    def __init__(self, families):
+        self.families = families
+
+    def collect(self):
+        return self.families
+
+
+def render_metrics(gauges: Iterable[Tuple[str, str, Dict[str, str], float]]) -> bytes:
+    """
+    Texto para Prometheus: las métricas de todos los workers (o de este, sin
+    ``PROMETHEUS_MULTIPROC_DIR``), la tasa de aciertos de las cachés y ``gauges``,
+    tuplas (nombre, descripción, etiquetas, valor) calculadas en el momento.
+    """
+    if multiprocess_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    families = list(registry.collect())
+    families.extend(_cache_hit_ratios(families))
+
+    current: Dict[str, GaugeMetricFamily] = {}
+    for name, documentation, labels, value in gauges:
+        family = current.get(name)
+        if family is None:
+            family = current[name] = GaugeMetricFamily(name, documentation, labels=list(labels))
+            families.append(family)
+        family.add_metric([str(v) for v in labels.values()], value)
+    return prometheus_client.generate_latest(_Families(families))
+
+
+def _publish_caches() -> None:
+    for name, key in TRACKED_CACHES.items():
+        cache = current_app.extensions.get(key)
+        if cache is not None:
+            stats = cache.stats()
+            CACHE_LOOKUPS.labels(cache=name, result='hit').set(stats['hits'])
+            CACHE_LOOKUPS.labels(cache=name, result='miss').set(stats['misses'])
+
+
+def init_metrics(app) -> None:
+    """Registra la medición de latencia por ruta y de la sesión en la aplicación."""
+    if not app.config['METRICS_ENABLED']:
+        return
+    if prometheus_client is None:
+        logger.info("prometheus_client no está instalado: /metrics desactivado.")
+        return
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('request_start', None)
+        if start is None:
+            return response
+        timer = g.pop('stage_timer', None)
+        labels = {'endpoint': request.endpoint or 'none', 'method': request.method,
+                  'status': str(response.status_code)}
+        cookie = request.cookies.get(app.config['SESSION_COOKIE_NAME'])
+        if cookie is not None:
+            SESSION_BYTES.observe(len(cookie))
+        _publish_caches()
+
+        def finished():
+            # Al cerrar la respuesta: en streaming, cuando se envió la última parte.
+            REQUEST_LATENCY.labels(**labels).observe(time.perf_counter() - start)
+            if timer is not None:
+                timer.observe()
+        response.call_on_close(finished)
+        return response
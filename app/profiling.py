@@ -0,0 +1,260 @@
+# app/profiling.py
+# -*- coding: utf-8 -*-
+"""
+Perfiles de peticiones bajo demanda.
+
+Con ``PROFILE_ENABLED`` se envuelven las vistas de ``app/main/routes.py`` y se
+perfila una petición cuando:
+
+- un usuario de ``PROFILE_ADMINS`` envía la cabecera ``X-Profile`` (``1``,
+  ``sample`` o ``cprofile``), o
+- la petición cae en la fracción ``PROFILE_SAMPLE_RATE`` elegida al azar.
+
+Modos:
+
+- ``sample``: un hilo toma la pila del hilo de la petición cada 5 ms y escribe
+  las pilas colapsadas (``.folded``), listas para ``flamegraph.pl`` o speedscope.
+- ``cprofile``: ``cProfile`` con todas las llamadas, en formato ``pstats``
+  (``.prof``, para ``python -m pstats``, snakeviz, gprof2dot...).
+
+En las respuestas en streaming se perfila también la generación del cuerpo. Cada
+perfil se guarda en ``PROFILE_FOLDER`` junto a un ``.json`` con la petición y su
+duración; se conservan los ``PROFILE_MAX_FILES`` más recientes. La respuesta
+lleva ``X-Profile-Id`` y ``/admin/profiles`` lista los más lentos.
+
+Desactivado, las vistas no se envuelven: no hay ningún costo por petición.
+"""
+import cProfile
+import json
+import logging
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from functools import wraps
+from typing import Dict, List, Optional
+
+from flask import current_app, make_response, request, session
+
+PROFILE_MODES = ('sample', 'cprofile')
+PROFILE_HEADER = 'X-Profile'
+
+# Vistas que no se perfilan (las del propio perfilado y las métricas).
+UNPROFILED_ENDPOINTS = {'main.profiles', 'main.profile_file', 'main.metrics'}
+
+logger = logging.getLogger(__name__)
+
+
+class CallProfiler(cProfile.Profile):
+    """cProfile con la misma interfaz que ``StackSampler``."""
+
+    extension = 'prof'
+
+    def close(self) -> None:
+        pass
+
+    def save(self, path: str) -> None:
+        self.dump_stats(path)
+
+
+class StackSampler:
+    """
+    Muestreo de la pila de un hilo. Solo se cuentan las muestras tomadas entre
+    ``enable`` y ``disable``; ``close`` detiene el hilo de muestreo.
+    """
+
+    extension = 'folded'
+    INTERVAL = 0.005
+
+    def __init__(self, thread_id: Optional[int] = None):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.counts: Counter = Counter()
+        self.active = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def enable(self) -> None:
+        self.active = True
+
+    def disable(self) -> None:
+        self.active = False
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    @staticmethod
+    def _label(code) -> str:
+        path = code.co_filename.replace(os.sep, '/').rsplit('/', 2)
+        return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.INTERVAL):
+            if not self.active:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.counts[';'.join(reversed(stack))] += 1
+
+    def save(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class ProfileStore:
+    """Carpeta de perfiles con rotación: al superar ``max_profiles`` se borran los más viejos."""
+
+    def __init__(self, folder: str, max_profiles: int):
+        self.folder = folder
+        self.max_profiles = max_profiles
+        os.makedirs(folder, exist_ok=True)
+
+    def _entries(self) -> List[Dict]:
+        entries = []
+        for name in os.listdir(self.folder):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.folder, name), encoding='utf-8') as f:
+                    entries.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return entries
+
+    def save(self, meta: Dict, profiler) -> None:
+        filename = f"{meta['id']}.{profiler.extension}"
+        profiler.save(os.path.join(self.folder, filename))
+        meta['file'] = filename
+        tmp_path = os.path.join(self.folder, f".{meta['id']}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        # El .json se escribe al final: un perfil listado siempre tiene su archivo.
+        os.replace(tmp_path, os.path.join(self.folder, f"{meta['id']}.json"))
+        self._rotate()
+
+    def _rotate(self) -> None:
+        entries = sorted(self._entries(), key=lambda e: e['created'])
+        for entry in entries[:max(len(entries) - self.max_profiles, 0)]:
+            for name in (f"{entry['id']}.json", entry['file']):
+                try:
+                    os.remove(os.path.join(self.folder, name))
+                except FileNotFoundError:
+                    pass  # Otro worker ya lo borró
+
+    def slowest(self, limit: int) -> List[Dict]:
+        """Perfiles guardados, del más lento al más rápido."""
+        return sorted(self._entries(), key=lambda e: e['duration_ms'], reverse=True)[:limit]
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        for entry in self._entries():
+            if entry['id'] == profile_id:
+                return entry
+        return None
+
+
+def is_profile_admin() -> bool:
+    """True si el usuario de la sesión puede pedir y consultar perfiles."""
+    return session.get('user') in current_app.config['PROFILE_ADMINS']
+
+
+def get_profile_store() -> Optional[ProfileStore]:
+    """Carpeta de perfiles de la aplicación, o None si el perfilado está desactivado."""
+    return current_app.extensions.get('profile_store')
+
+
+def requested_mode() -> Optional[str]:
+    """Modo en que se perfila la petición actual, o None si no se perfila."""
+    cfg = current_app.config
+    header = request.headers.get(PROFILE_HEADER)
+    if header is not None and is_profile_admin():
+        return header if header in PROFILE_MODES else cfg['PROFILE_MODE']
+    rate = cfg['PROFILE_SAMPLE_RATE']
+    if rate > 0 and random.random() < rate:
+        return cfg['PROFILE_MODE']
+    return None
+
+
+def profiled(view, store: ProfileStore):
+    """Envuelve una vista para perfilar las peticiones que indique ``requested_mode``."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        mode = requested_mode()
+        if mode is None:
+            return view(*args, **kwargs)
+
+        meta = {
+            'id': f"{time.strftime('%Y%m%d-%H%M%S')}-{secrets.token_hex(4)}",
+            'mode': mode, 'endpoint': request.endpoint, 'method': request.method,
+            'path': request.full_path.rstrip('?'), 'user': session.get('user'), 'created': time.time(),
+        }
+        profiler = CallProfiler() if mode == 'cprofile' else StackSampler()
+        start = time.perf_counter()
+
+        def finish(status: int) -> None:
+            profiler.close()
+            meta['status'] = status
+            meta['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            try:
+                store.save(meta, profiler)
+            except OSError as e:
+                logger.warning(f"No se pudo guardar el perfil {meta['id']}: {e}")
+
+        profiler.enable()
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            profiler.disable()
+            finish(500)
+            raise
+        profiler.disable()
+
+        response.headers['X-Profile-Id'] = meta['id']
+        if response.is_streamed:
+            response.response = profiled_body(response.response, profiler, lambda: finish(response.status_code))
+        else:
+            finish(response.status_code)
+        return response
+    return wrapper
+
+
+def profiled_body(chunks, profiler, finish):
+    """Cuerpo en streaming que se perfila solo mientras se genera cada parte."""
+    iterator = iter(chunks)
+    try:
+        while True:
+            profiler.enable()
+            try:
+                chunk = next(iterator, None)
+            finally:
+                profiler.disable()
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            close()
+        finish()
+
+
+def init_profiling(app) -> None:
+    """Envuelve las vistas del blueprint principal si ``PROFILE_ENABLED`` está activo."""
+    if not app.config['PROFILE_ENABLED']:
+        return
+    if app.config['PROFILE_MODE'] not in PROFILE_MODES:
+        raise ValueError(f"Modo de perfilado desconocido: {app.config['PROFILE_MODE']}")
+    store = ProfileStore(app.config['PROFILE_FOLDER'], app.config['PROFILE_MAX_FILES'])
+    app.extensions['profile_store'] = store
+    for endpoint, view in list(app.view_functions.items()):
+        if endpoint.startswith('main.') and endpoint not in UNPROFILED_ENDPOINTS:
+            app.view_functions[endpoint] = profiled(view, store)
+    logger.info(f"Perfilado de peticiones activo en {store.folder} (muestreo: {app.config['PROFILE_SAMPLE_RATE']})")
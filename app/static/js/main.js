@@ -80,6 +80,12 @@ document.addEventListener('DOMContentLoaded', () => {
     // --- Lógica Principal de la Aplicación ---
     let isDarkMode = true;
     let activeTab = 'internal';
+    const SEARCH_PAGE_SIZE = 100; // Resultados por página en /search
+    const SUGGEST_DEBOUNCE_MS = 150; // Espera tras la última tecla antes de pedir sugerencias
+    const SUGGEST_MIN_CHARS = 2;
+    let currentSearch = null;
+    let suggestTimer = null;
+    let suggestController = null;
     const body = document.getElementById('body');
     const themeToggle = document.getElementById('themeToggle');
     const tabButtons = document.querySelectorAll('.tab');
@@ -91,6 +97,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const statusText = document.getElementById('statusText');
     const searchInput = document.getElementById('searchInput');
     const searchBtn = document.getElementById('searchBtn');
+    const suggestionsList = document.getElementById('suggestions');
     const loading = document.getElementById('loading');
     const resultsContainer = document.getElementById('resultsContainer');
     const noResults = document.getElementById('noResults');
@@ -98,6 +105,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const tableView = document.getElementById('tableView');
     const tableHead = document.getElementById('tableHead');
     const tableBody = document.getElementById('tableBody');
+    const tableContainer = document.querySelector('.table-view-container');
     const downloadBtn = document.getElementById('downloadBtn');
     const printBtn = document.getElementById('printBtn');
 
@@ -145,6 +153,7 @@ document.addEventListener('DOMContentLoaded', () => {
 
     const showLoading = (show) => { if (loading) loading.style.display = show ? 'block' : 'none'; };
     const clearResults = () => { 
+        currentSearch = null;
         if (resultsContainer) resultsContainer.innerHTML = ''; 
         if (noResults) noResults.style.display = 'none'; 
         if (tableBody) tableBody.innerHTML = '';
@@ -179,6 +188,34 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
+    // --- Carga en segundo plano ---
+    const UPLOAD_POLL_INTERVAL = 500; // Milisegundos entre consultas de progreso
+    const UPLOAD_PHASES = { queued: 'En cola', parsing: 'Leyendo', indexing: 'Indexando' };
+    let currentUploadJob = null;
+
+    const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+    const showUploadProgress = (state) => {
+        if (!statusText) return;
+        const phase = UPLOAD_PHASES[state.phase] || state.phase;
+        let text = `${phase} ${state.filename}: ${state.rows} filas`;
+        if (state.total_rows) text += ` de ~${state.total_rows}`;
+        if (state.eta_seconds) text += ` (faltan ~${Math.ceil(state.eta_seconds)} s)`;
+        statusText.textContent = text;
+    };
+
+    const waitForUpload = async (jobId) => {
+        while (currentUploadJob === jobId) {
+            const response = await fetch(`/upload/status/${jobId}`);
+            const state = await response.json();
+            if (state.error) throw new Error(state.error);
+            if (state.phase === 'done' || state.phase === 'cancelled') return state;
+            showUploadProgress(state);
+            await sleep(UPLOAD_POLL_INTERVAL);
+        }
+        return null;
+    };
+
     const handleFileUpload = async () => {
         if (!fileInput) return;
         const file = fileInput.files[0];
@@ -190,16 +227,29 @@ document.addEventListener('DOMContentLoaded', () => {
             const response = await fetch('/upload', { method: 'POST', body: formData });
             const result = await response.json();
             if (result.error) throw new Error(result.error);
-            if (result.success) switchTab('excel');
+            currentUploadJob = result.job_id;
+            const state = await waitForUpload(result.job_id);
+            if (state && state.phase === 'done') switchTab('excel');
         } catch (error) {
             alert(`Error al subir el archivo: ${error.message}`);
         } finally {
+            currentUploadJob = null;
             showLoading(false);
             fileInput.value = '';
         }
     };
 
+    const cancelUpload = async () => {
+        const jobId = currentUploadJob;
+        if (!jobId) return;
+        currentUploadJob = null;
+        try {
+            await fetch(`/upload/cancel/${jobId}`, { method: 'POST' });
+        } catch (error) { console.error('Error al cancelar la carga:', error); }
+    };
+
     const handleClearFile = async () => {
+        await cancelUpload();
         showLoading(true);
         try {
             await fetch('/clear', { method: 'POST' });
@@ -208,21 +258,107 @@ document.addEventListener('DOMContentLoaded', () => {
         finally { showLoading(false); }
     };
 
+    // Los resultados llegan por páginas; las siguientes se piden al hacer scroll en la tabla.
+    // Con GET el navegador guarda cada página y la revalida con su ETag: si los datos
+    // no cambiaron, el servidor responde 304 sin volver a enviarla.
+    const fetchSearchPage = async (search) => {
+        const params = new URLSearchParams({
+            query: search.query, dataSource: search.dataSource, limit: SEARCH_PAGE_SIZE
+        });
+        if (search.nextCursor !== null) params.set('cursor', search.nextCursor);
+        const response = await fetch(`/search?${params}`);
+        const data = await response.json();
+        if (data.error) throw new Error(data.error);
+        return data;
+    };
+
+    const appendPage = (search, data) => {
+        search.nextCursor = data.next_cursor;
+        displayResults(data, search.shown);
+        search.shown += data.results.length;
+        // Si la página no llena la tabla no habrá scroll: se pide la siguiente.
+        if (tableContainer && tableContainer.scrollHeight <= tableContainer.clientHeight) {
+            setTimeout(loadMoreResults, 0);
+        }
+    };
+
+    // --- Sugerencias mientras se escribe ---
+    // Cada tecla cancela la petición anterior: una respuesta vieja nunca se dibuja.
+    const hideSuggestions = () => {
+        clearTimeout(suggestTimer);
+        if (suggestController) suggestController.abort();
+        suggestController = null;
+        if (suggestionsList) {
+            suggestionsList.innerHTML = '';
+            suggestionsList.style.display = 'none';
+        }
+    };
+
+    const renderSuggestions = (suggestions) => {
+        if (!suggestionsList) return;
+        suggestionsList.innerHTML = '';
+        if (suggestions.length === 0) {
+            suggestionsList.style.display = 'none';
+            return;
+        }
+        const fragment = document.createDocumentFragment();
+        suggestions.forEach(item => {
+            const li = document.createElement('li');
+            const label = ['EXP BN', 'OBLIGADO', 'UBICADO'].map(key => item[key]).filter(Boolean);
+            li.textContent = label.length ? label.join(' · ') : Object.values(item).slice(0, 3).join(' · ');
+            li.addEventListener('mousedown', (event) => {
+                event.preventDefault(); // Que el input no pierda el foco antes del clic
+                hideSuggestions();
+                showDetailsModal(item);
+            });
+            fragment.appendChild(li);
+        });
+        suggestionsList.appendChild(fragment);
+        suggestionsList.style.display = 'block';
+    };
+
+    const fetchSuggestions = async (query) => {
+        if (suggestController) suggestController.abort();
+        const controller = new AbortController();
+        suggestController = controller;
+        try {
+            const response = await fetch('/search/suggest', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ query, dataSource: activeTab }),
+                signal: controller.signal
+            });
+            const data = await response.json();
+            if (suggestController === controller) renderSuggestions(data.suggestions || []);
+        } catch (error) {
+            if (error.name !== 'AbortError') console.error('Error en las sugerencias:', error);
+        }
+    };
+
+    const handleSearchInput = () => {
+        clearTimeout(suggestTimer);
+        const query = searchInput.value.trim();
+        if (query.length < SUGGEST_MIN_CHARS) {
+            hideSuggestions();
+            return;
+        }
+        suggestTimer = setTimeout(() => fetchSuggestions(query), SUGGEST_DEBOUNCE_MS);
+    };
+
     const handleSearch = async () => {
         if (!searchInput) return;
+        hideSuggestions();
         const query = searchInput.value.trim();
         if (!query) { clearResults(); return; }
         clearResults();
+        const search = { query, dataSource: activeTab, nextCursor: null, shown: 0, total: 0, loading: true };
+        currentSearch = search;
         showLoading(true);
         try {
-            const response = await fetch('/search', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ query: query, dataSource: activeTab })
-            });
-            const data = await response.json();
-            if (data.error) throw new Error(data.error);
-            displayResults(data);
+            const data = await fetchSearchPage(search);
+            if (currentSearch !== search) return;
+            search.total = data.total;
+            appendPage(search, data);
         } catch (error) {
             console.error('Error en la búsqueda:', error);
             if (noResults) {
@@ -230,29 +366,55 @@ document.addEventListener('DOMContentLoaded', () => {
                 noResults.style.display = 'block';
             }
         } finally {
+            search.loading = false;
             showLoading(false);
         }
     };
 
-    const renderTableView = (results) => {
-        if (!tableBody || !tableHead) return;
-        tableHead.innerHTML = '';
-        tableBody.innerHTML = '';
+    const loadMoreResults = async () => {
+        const search = currentSearch;
+        if (!search || search.loading || !search.nextCursor) return;
+        search.loading = true;
+        showLoading(true);
+        try {
+            const data = await fetchSearchPage(search);
+            if (currentSearch === search) appendPage(search, data);
+        } catch (error) {
+            console.error('Error al cargar más resultados:', error);
+        } finally {
+            search.loading = false;
+            showLoading(false);
+        }
+    };
 
-        if (results.length === 0) return;
+    const handleTableScroll = () => {
+        if (tableContainer.scrollTop + tableContainer.clientHeight >= tableContainer.scrollHeight - 200) {
+            loadMoreResults();
+        }
+    };
 
+    // offset: número de filas ya mostradas (0 para la primera página)
+    const renderTableView = (results, offset = 0) => {
+        if (!tableBody || !tableHead) return;
         const headersToShow = ['N°', 'CUSTODIA', 'EXP BN', 'EEM', 'OBLIGADO', 'UBICADO', 'Actions'];
-        const headerRow = document.createElement('tr');
-        headersToShow.forEach(header => {
-            const th = document.createElement('th');
-            th.textContent = header;
-            if (header === 'OBLIGADO') {
-                th.classList.add('obligado-column');
-            }
-            headerRow.appendChild(th);
-        });
-        tableHead.appendChild(headerRow);
+        if (offset === 0) {
+            tableHead.innerHTML = '';
+            tableBody.innerHTML = '';
+            if (results.length === 0) return;
+
+            const headerRow = document.createElement('tr');
+            headersToShow.forEach(header => {
+                const th = document.createElement('th');
+                th.textContent = header;
+                if (header === 'OBLIGADO') {
+                    th.classList.add('obligado-column');
+                }
+                headerRow.appendChild(th);
+            });
+            tableHead.appendChild(headerRow);
+        }
 
+        const fragment = document.createDocumentFragment();
         results.forEach((item, index) => {
             const row = document.createElement('tr');
             row.setAttribute('data-exp-bn', item['EXP BN']);
@@ -263,7 +425,7 @@ document.addEventListener('DOMContentLoaded', () => {
                     td.classList.add('obligado-column');
                 }
                 if (header === 'N°') {
-                    td.textContent = index + 1;
+                    td.textContent = offset + index + 1;
                 } else if (header === 'Actions') {
                     const editButton = document.createElement('button');
                     editButton.innerHTML = '<i class="fas fa-pencil-alt"></i>';
@@ -291,102 +453,108 @@ document.addEventListener('DOMContentLoaded', () => {
                 }
                 row.appendChild(td);
             });
-            tableBody.appendChild(row);
+            fragment.appendChild(row);
         });
+        tableBody.appendChild(fragment);
+    };
 
-        tableBody.addEventListener('click', (e) => {
-            if (e.target.closest('.edit-btn-icon')) {
-                if (confirm('¿Desea editar este registro?')) {
-                    const row = e.target.closest('tr');
-                    row.querySelectorAll('input').forEach(input => input.readOnly = false);
-                    row.querySelector('.edit-btn-icon').style.display = 'none';
-                    row.querySelector('.save-btn-icon').style.display = 'inline-flex';
-                    row.querySelector('.cancel-btn-icon').style.display = 'inline-flex';
-                }
-            }
-
-            if (e.target.closest('.save-btn-icon')) {
+    // Un solo listener para todas las filas, también las de páginas posteriores
+    const handleTableClick = (e) => {
+        if (e.target.closest('.edit-btn-icon')) {
+            if (confirm('¿Desea editar este registro?')) {
                 const row = e.target.closest('tr');
-                const expBn = row.getAttribute('data-exp-bn');
-                row.querySelectorAll('input').forEach(input => {
-                    const field = input.getAttribute('data-field');
-                    const value = input.value;
-                    updateData(expBn, field, value);
-                });
-                row.querySelectorAll('input').forEach(input => input.readOnly = true);
-                row.querySelector('.edit-btn-icon').style.display = 'inline-flex';
-                row.querySelector('.save-btn-icon').style.display = 'none';
-                row.querySelector('.cancel-btn-icon').style.display = 'none';
+                row.querySelectorAll('input').forEach(input => input.readOnly = false);
+                row.querySelector('.edit-btn-icon').style.display = 'none';
+                row.querySelector('.save-btn-icon').style.display = 'inline-flex';
+                row.querySelector('.cancel-btn-icon').style.display = 'inline-flex';
             }
+        }
 
-            if (e.target.closest('.cancel-btn-icon')) {
-                const row = e.target.closest('tr');
-                // This is a simple cancel, it does not revert to original values yet.
-                // A more complex implementation would store the original values before editing.
-                row.querySelectorAll('input').forEach(input => input.readOnly = true);
-                row.querySelector('.edit-btn-icon').style.display = 'inline-flex';
-                row.querySelector('.save-btn-icon').style.display = 'none';
-                row.querySelector('.cancel-btn-icon').style.display = 'none';
-            }
-        });
+        if (e.target.closest('.save-btn-icon')) {
+            const row = e.target.closest('tr');
+            const expBn = row.getAttribute('data-exp-bn');
+            // Toda la fila se guarda en una sola petición
+            const changes = {};
+            row.querySelectorAll('input').forEach(input => {
+                changes[input.getAttribute('data-field')] = input.value;
+            });
+            updateRows([{ exp_bn: expBn, changes }]).then(ok => {
+                if (ok && changes['EXP BN']) row.setAttribute('data-exp-bn', changes['EXP BN']);
+            });
+            row.querySelectorAll('input').forEach(input => input.readOnly = true);
+            row.querySelector('.edit-btn-icon').style.display = 'inline-flex';
+            row.querySelector('.save-btn-icon').style.display = 'none';
+            row.querySelector('.cancel-btn-icon').style.display = 'none';
+        }
+
+        if (e.target.closest('.cancel-btn-icon')) {
+            const row = e.target.closest('tr');
+            // This is a simple cancel, it does not revert to original values yet.
+            // A more complex implementation would store the original values before editing.
+            row.querySelectorAll('input').forEach(input => input.readOnly = true);
+            row.querySelector('.edit-btn-icon').style.display = 'inline-flex';
+            row.querySelector('.save-btn-icon').style.display = 'none';
+            row.querySelector('.cancel-btn-icon').style.display = 'none';
+        }
     };
 
-    const displayResults = (data) => {
+    const displayResults = (data, offset = 0) => {
         if (!resultsContainer || !noResults || !tableBody) return;
         const { results } = data;
-        resultsContainer.innerHTML = '';
-        tableBody.innerHTML = '';
-
-        if (results.length === 0) {
-            noResults.style.display = 'block';
-            return;
+        if (offset === 0) {
+            resultsContainer.innerHTML = '';
+            tableBody.innerHTML = '';
+            if (results.length === 0) {
+                noResults.style.display = 'block';
+                return;
+            }
         }
 
         noResults.style.display = 'none';
-        renderTableView(results);
+        renderTableView(results, offset);
     };
 
-    const updateData = async (exp_bn, field, value) => {
+    // updates: [{ exp_bn, changes: { campo: valor } }]; devuelve true si todo se guardó
+    const updateRows = async (updates) => {
         try {
-            const response = await fetch('/update_data', {
+            const response = await fetch('/update_data/batch', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify({ exp_bn, field, value })
+                body: JSON.stringify({ updates })
             });
             const result = await response.json();
             if (!result.success) {
-                throw new Error(result.error || 'Error desconocido al actualizar');
+                const failed = (result.results || []).filter(r => !r.success);
+                const detail = failed.map(r => `${r.exp_bn}: ${r.error}`).join('\n');
+                throw new Error(detail || result.error || 'Error desconocido al actualizar');
             }
+            return true;
         } catch (error) {
             console.error('Error al actualizar los datos:', error);
             alert(`Error al actualizar: ${error.message}`);
+            return false;
         }
     };
 
+    // La descarga la genera el servidor con todos los resultados de la búsqueda actual,
+    // no solo con las filas que ya se muestran en la tabla.
     const downloadTable = () => {
-        const table = document.querySelector(".table-view");
-        let csv = [];
-        for (let i = 0; i < table.rows.length; i++) {
-            let row = [], cols = table.rows[i].querySelectorAll("td, th");
-            for (let j = 0; j < cols.length -1; j++) {
-                // Get the value from the input field if it exists, otherwise get the text content
-                let cell = cols[j].querySelector('input[type="text"]');
-                let text = cell ? cell.value : cols[j].innerText;
-                row.push('"' + text.replace(/"/g, '""') + '"');
-            }
-            csv.push(row.join(","));
+        if (!currentSearch) {
+            alert('Realiza una búsqueda antes de descargar.');
+            return;
         }
-        let csvContent = "data:text/csv;charset=utf-8," + csv.join("\n");
-        let encodedUri = encodeURI(csvContent);
-        let link = document.createElement("a");
-        link.setAttribute("href", encodedUri);
-        link.setAttribute("download", "tabla_resultados.csv");
+        const params = new URLSearchParams({
+            query: currentSearch.query, dataSource: currentSearch.dataSource, format: 'csv'
+        });
+        const link = document.createElement('a');
+        link.setAttribute('href', `/export?${params}`);
+        link.setAttribute('download', '');
         document.body.appendChild(link);
         link.click();
         document.body.removeChild(link);
-    }
+    };
 
     const printTable = () => {
         window.print();
@@ -397,7 +565,12 @@ document.addEventListener('DOMContentLoaded', () => {
     if (fileInput) fileInput.addEventListener('change', handleFileUpload);
     if (clearFile) clearFile.addEventListener('click', handleClearFile);
     if (searchBtn) searchBtn.addEventListener('click', handleSearch);
+    if (tableBody) tableBody.addEventListener('click', handleTableClick);
+    if (tableContainer) tableContainer.addEventListener('scroll', handleTableScroll);
     if (searchInput) searchInput.addEventListener('keypress', (e) => { if (e.key === 'Enter') handleSearch(); });
+    if (searchInput) searchInput.addEventListener('input', handleSearchInput);
+    if (searchInput) searchInput.addEventListener('keydown', (e) => { if (e.key === 'Escape') hideSuggestions(); });
+    if (searchInput) searchInput.addEventListener('blur', hideSuggestions);
     if (downloadBtn) downloadBtn.addEventListener('click', downloadTable);
     if (printBtn) printBtn.addEventListener('click', printTable);
 
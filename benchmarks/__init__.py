@@ -0,0 +1,15 @@
+# benchmarks/__init__.py
+# -*- coding: utf-8 -*-
+"""
+Benchmarks de la aplicación. Se ejecutan como módulos desde la raíz del proyecto
+(``python -m benchmarks.<módulo> --help``).
+
+- ``datagen``: datos sintéticos (data.json, xlsx, csv) con el esquema real.
+- ``bench_micro``: cada método de ``SearchEngine``, lectores de ``FileProcessor``
+  y escritores de ``ExportManager``.
+- ``load``: carga de punta a punta sobre /search, /upload y /update_data, en
+  proceso o contra un servidor (gunicorn local).
+- ``compare``: compara dos resultados JSON de ``bench_micro`` o ``load``.
+- ``bench_*``: comparaciones puntuales de cada optimización (índice, backends,
+  registros, JSON...).
+"""
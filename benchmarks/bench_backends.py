@@ -0,0 +1,114 @@
+# benchmarks/bench_backends.py
+# -*- coding: utf-8 -*-
+"""
+Verifica que todos los backends de datos internos (``memory``, ``mapped`` y
+``sqlite``) den exactamente los mismos resultados que la búsqueda lineal original,
+antes y después de aplicar las mismas actualizaciones, y compara sus tiempos.
+
+Uso (desde la raíz del proyecto):
+
+    python -m benchmarks.bench_backends --records 100000
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from app.main.routes import advanced_matches
+from app.main.storage import open_record_store
+from benchmarks.bench_search_index import QUERIES, generate_records, linear_search, timed
+from utils import AdvancedQuery, normalize_text
+
+BACKENDS = ['memory', 'mapped', 'sqlite']
+
+# Casos borde: acentos, mayúsculas, valores no texto, saltos de línea, claves repetidas
+# y registros con las claves en otro orden o con campos de menos.
+EDGE_RECORDS = [
+    {'CUSTODIA': 'Caja 1', 'EXP BN': '024-EDGE-1', 'EEM': 12.5, 'OBLIGADO': 'Ñúñez\nPeña', 'UBICADO': None},
+    {'CUSTODIA': 'Caja "2"', 'EXP BN': '024-EDGE-2', 'EEM': 0, 'OBLIGADO': 'ÁVILA  Straße', 'UBICADO': 'Lima'},
+    {'CUSTODIA': 'Caja 3', 'EXP BN': '024-EDGE-2', 'EEM': True, 'OBLIGADO': 'Duplicado', 'UBICADO': 'Cusco'},
+    {'nombre': 'Contrato de Servicio B', 'tipo': 'ruc', 'id': 'DOC002', 'contenido': '024 contrato servicio prestación'},
+    {'UBICADO': 'Tacna', 'OBLIGADO': 'Zeta Ruiz', 'EXP BN': '024-EDGE-3', 'EEM': 7, 'CUSTODIA': 'Caja 4'},
+    {'OBLIGADO': 'Zeta Campos', 'EXP BN': '024-EDGE-4', 'UBICADO': 'Tacna'},
+]
+EDGE_QUERIES = ['ñúñez', 'nunez', 'z\npe', 'peña', 'ávila', 'AVILA', 'ss', 'caja "2"', '12.5', 'none', 'true', 'ón', 'a', '"', 'servicio b']
+
+# Consultas avanzadas por campo: dependen de emparejar cada nombre de campo con su valor.
+FIELD_QUERIES = ['UBICADO:tacna', 'OBLIGADO:zeta', 'OBLIGADO:zeta AND UBICADO:tacna', 'CUSTODIA:"caja 4" OR EEM:12.5',
+                 'UBICADO:lima AND NOT OBLIGADO:avila', 'EXP BN:edge AND NOT CUSTODIA:caja', 'tipo:ruc', 'UBICADO:pucallpa']
+
+
+def updates_for(records):
+    """Cambios de prueba: campos normales, cambio de clave y una clave inexistente."""
+    keys = [r['EXP BN'] for r in records[:50] if 'EXP BN' in r]
+    entries = [(key, {'UBICADO': f"Pucallpa {i}", 'OBLIGADO': f"Revisado {i}"}) for i, key in enumerate(keys)]
+    entries += [(keys[0], {'EXP BN': 'NUEVO-001'}), ('NUEVO-001', {'CUSTODIA': 'Caja renombrada'}),
+                ('024-EDGE-2', {'UBICADO': 'Tacna'}), ('no-existe', {'UBICADO': 'x'})]
+    return entries
+
+
+def apply_linear(records, entries):
+    """Misma semántica que los backends: primera fila con la clave."""
+    found = []
+    for key, changes in entries:
+        record = next((r for r in records if r.get('EXP BN') == key), None)
+        found.append(record is not None)
+        if record is not None:
+            record.update(changes)
+    return found
+
+
+def check(name, store, records, queries):
+    timings = {}
+    for query in queries:
+        elapsed, results = timed(store.search, normalize_text(query))
+        expected = linear_search(query, records)
+        assert results == expected, f"{name}: resultados distintos para {query!r}"
+        timings[query] = elapsed
+    for query in FIELD_QUERIES:
+        query = normalize_text(query)
+        rows, _ = advanced_matches(store, query)
+        expected, _ = AdvancedQuery(query).evaluate(lambda term: AdvancedQuery.scan(term, records), len(records))
+        assert rows == expected, f"{name}: resultados distintos para la consulta avanzada {query!r}"
+    return timings
+
+
+def run(num_records):
+    records = generate_records(num_records) + EDGE_RECORDS
+    queries = QUERIES + EDGE_QUERIES + ['revisado', 'pucallpa 1', 'nuevo-001', 'tacna']
+    entries = updates_for(records)
+    expected_records = [dict(r) for r in records]
+    expected_found = apply_linear(expected_records, entries)
+
+    print(f"{len(records):,} registros, {len(queries)} consultas")
+    print(f"{'backend':<10}{'apertura (s)':>14}{'búsqueda total (ms)':>22}{'actualización (ms)':>20}")
+    for backend in BACKENDS:
+        workdir = tempfile.mkdtemp()
+        try:
+            data_path = os.path.join(workdir, 'data.json')
+            with open(data_path, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False)
+            start = time.perf_counter()
+            store = open_record_store(data_path, backend)
+            opened = time.perf_counter() - start
+
+            check(backend, store, records, queries)
+            start = time.perf_counter()
+            found = store.update_many(entries)
+            updated = time.perf_counter() - start
+            assert found == expected_found, f"{backend}: claves encontradas distintas"
+            timings = check(backend, store, expected_records, queries)
+            assert store.get('NUEVO-001') == next(r for r in expected_records if r.get('EXP BN') == 'NUEVO-001')
+            assert list(store.records()) == expected_records, f"{backend}: registros distintos"
+            print(f"{backend:<10}{opened:>14.2f}{sum(timings.values()) * 1000:>22.2f}{updated * 1000:>20.2f}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print("Todos los backends dan los mismos resultados que la búsqueda lineal.")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=100_000)
+    run(parser.parse_args().records)
@@ -0,0 +1,59 @@
+# benchmarks/bench_columnar.py
+# -*- coding: utf-8 -*-
+"""
+Compara ``SearchEngine`` (recorrido de diccionarios) con ``ColumnarFrame``
+(máscaras vectorizadas por columna) en ``simple_search``, ``exact_search`` y
+``field_search``, verificando que ambos den exactamente los mismos resultados.
+
+Uso (desde la raíz del proyecto):
+
+    python -m benchmarks.bench_columnar --sizes 100000 500000
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks.bench_search_index import generate_records, timed
+from utils import ColumnarFrame, SearchEngine
+
+# (etiqueta, búsqueda con SearchEngine sobre la lista, misma búsqueda sobre ColumnarFrame)
+CASES = [
+    ('simple lima', lambda data: SearchEngine.simple_search('lima', data), lambda f: f.simple_search('lima')),
+    ('simple caja 12', lambda data: SearchEngine.simple_search('caja 12', data), lambda f: f.simple_search('caja 12')),
+    ('simple sánchez prestación', lambda data: SearchEngine.simple_search('sánchez prestación', data),
+     lambda f: f.simple_search('sánchez prestación')),
+    ('exact cusco', lambda data: SearchEngine.exact_search('cusco', data), lambda f: f.exact_search('cusco')),
+    ('field OBLIGADO:quispe', lambda data: SearchEngine.field_search('OBLIGADO', 'quispe', data),
+     lambda f: f.field_search('OBLIGADO', 'quispe')),
+    ('field UBICADO:a', lambda data: SearchEngine.field_search('UBICADO', 'a', data),
+     lambda f: f.field_search('UBICADO', 'a')),
+    ('field EXP BN:024', lambda data: SearchEngine.field_search('EXP BN', '024', data),
+     lambda f: f.field_search('EXP BN', '024')),
+]
+
+
+def run(sizes):
+    for size in sizes:
+        records = generate_records(size)
+        # Las filas se materializan desde la misma lista: solo se compara cómo se encuentran y ordenan
+        frame = ColumnarFrame.from_records(records)
+        start = time.perf_counter()
+        for column in frame.columns:
+            frame.normalized(column)
+        build = time.perf_counter() - start
+        categorical = [c for c in frame.columns if isinstance(frame.normalized(c).dtype, pd.CategoricalDtype)]
+        print(f"\n{size:,} registros | columnas normalizadas: {build:.2f}s | categóricas: {', '.join(categorical)}")
+        print(f"{'búsqueda':<30}{'resultados':>12}{'dicts (ms)':>14}{'columnas (ms)':>16}{'aceleración':>14}")
+        for label, loop_search, vector_search in CASES:
+            loop_time, expected = timed(loop_search, records)
+            vector_time, results = timed(vector_search, frame)
+            assert results == expected, f"Resultados distintos para {label!r}"
+            speedup = loop_time / vector_time if vector_time else float('inf')
+            print(f"{label:<30}{len(expected):>12}{loop_time * 1000:>14.1f}{vector_time * 1000:>16.1f}{speedup:>13.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 500_000])
+    run(parser.parse_args().sizes)
@@ -0,0 +1,66 @@
+# benchmarks/bench_json.py
+# -*- coding: utf-8 -*-
+"""
+Tiempo de codificar la respuesta de ``/search`` con 1k/10k/50k resultados:
+
+- ``json``: proveedor con el módulo ``json`` (lo que hacía ``jsonify``).
+- ``orjson``: ``OrjsonProvider`` (si orjson está instalado).
+- ``fragmentos``: ``records_response`` con la ``FragmentCache`` ya llena, es
+  decir, registros que no cambiaron desde la última vez que se enviaron.
+
+Los registros son vistas de una ``RecordTable``, como los que devuelve el
+almacén en memoria. Se verifica que todas las variantes den el mismo JSON.
+
+Uso (desde la raíz del proyecto):
+
+    python -m benchmarks.bench_json --sizes 1000 10000 50000
+"""
+import argparse
+import json
+
+from flask import Flask
+
+from app.json_provider import OrjsonProvider, StdlibJSONProvider, orjson
+from app.main.cache import FragmentCache
+from app.main.records import RecordTable
+from benchmarks.bench_search_index import generate_records, timed
+
+
+def run(sizes):
+    app = Flask(__name__)
+    providers = [('json', StdlibJSONProvider(app))]
+    if orjson is not None:
+        providers.append(('orjson', OrjsonProvider(app)))
+    table = RecordTable(generate_records(max(sizes)))
+
+    print(f"{'resultados':>12}{'variante':>14}{'ms':>10}{'MB/s':>10}")
+    for size in sizes:
+        rows = list(range(size))
+        meta = {'query': 'lima', 'total': size, 'next_cursor': None}
+        expected = None
+        for name, provider in providers:
+            def encode():
+                return provider.dumps_bytes(dict(meta, results=[table.view(row_id) for row_id in rows]))
+            elapsed, body = timed(encode)
+            expected = expected or json.loads(body)
+            assert json.loads(body) == expected, f"JSON distinto con {name}"
+            print(f"{size:>12,}{name:>14}{elapsed * 1000:>10.1f}{len(body) / elapsed / 2**20:>10.0f}")
+
+        provider = providers[-1][1]
+        fragments = FragmentCache(size)
+        fragments.encode('internal', rows, table.view, provider.dumps_bytes)
+
+        def splice():
+            # Mismo armado que records_response en app/main/routes.py
+            head = provider.dumps_bytes(meta)
+            records = b','.join(fragments.encode('internal', rows, table.view, provider.dumps_bytes))
+            return b'%s,"results":[%s]}' % (head[:-1], records)
+        elapsed, body = timed(splice)
+        assert json.loads(body) == expected, "JSON distinto con fragmentos"
+        print(f"{size:>12,}{'fragmentos':>14}{elapsed * 1000:>10.1f}{len(body) / elapsed / 2**20:>10.0f}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 50_000])
+    run(parser.parse_args().sizes)
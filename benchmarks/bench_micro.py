@@ -0,0 +1,151 @@
+# benchmarks/bench_micro.py
+# -*- coding: utf-8 -*-
+"""
+Microbenchmarks de cada método de ``SearchEngine``, de los lectores de
+``FileProcessor`` y de los escritores de ``ExportManager``, con datos de
+``benchmarks.datagen``. Cada caso se repite ``--repeat`` veces; se informa el
+mejor tiempo y la mediana, y con ``--json`` se guardan para ``benchmarks.compare``.
+
+Uso (desde la raíz del proyecto):
+
+    python -m benchmarks.bench_micro --rows 50000 --file-rows 10000 --json micro.json
+    python -m benchmarks.bench_micro --only search   # solo los casos que contienen 'search'
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.bench_search_index import generate_records
+from benchmarks.datagen import COLUMNS, write_csv, write_xlsx
+from benchmarks.report import write_results
+from utils import ExportManager, FileProcessor, FuzzyIndex, SearchEngine, normalize_text
+
+ADVANCED_QUERY = 'OBLIGADO:quispe AND (UBICADO:lima OR UBICADO:cusco) AND NOT CUSTODIA:"caja 1"'
+
+
+@contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def search_cases(records) -> List[Tuple[str, int, Callable[[], object]]]:
+    """(nombre, llamadas por ejecución, función) de ``SearchEngine``."""
+    values = [[normalize_text(str(value)) for value in record.values()] for record in records]
+    index = FuzzyIndex(enumerate(values))
+    matching = [row for row, row_values in enumerate(values) if any('caja' in value for value in row_values)]
+    words = ['caja', '12']
+    n = len(records)
+    return [
+        ('SearchEngine.simple_search', 1, lambda: SearchEngine.simple_search('caja 12', records)),
+        ('SearchEngine.simple_search limit=100', 1, lambda: SearchEngine.simple_search('caja 12', records, limit=100)),
+        ('SearchEngine.exact_search', 1, lambda: SearchEngine.exact_search('cusco', records)),
+        ('SearchEngine.fuzzy_search', 1, lambda: SearchEngine.fuzzy_search('qispe lma', records)),
+        ('SearchEngine.fuzzy_search índice previo', 1,
+         lambda: SearchEngine.fuzzy_search('qispe lma', records, index=index)),
+        ('SearchEngine.field_search', 1, lambda: SearchEngine.field_search('OBLIGADO', 'quispe', records)),
+        ('SearchEngine.field_search limit=100', 1,
+         lambda: SearchEngine.field_search('OBLIGADO', 'quispe', records, limit=100)),
+        ('SearchEngine.advanced_search', 1, lambda: SearchEngine.advanced_search(ADVANCED_QUERY, records)),
+        ('SearchEngine.top_k k=100', 1,
+         lambda: SearchEngine.top_k('caja 12', ((row, values[row]) for row in matching), 100)),
+        ('SearchEngine.score_values', n, lambda: [SearchEngine.score_values(words, v) for v in values]),
+        ('SearchEngine.calculate_relevance', n,
+         lambda: [SearchEngine.calculate_relevance('caja 12', record) for record in records]),
+        ('SearchEngine.calculate_field_relevance', n,
+         lambda: [SearchEngine.calculate_field_relevance('quispe', record['OBLIGADO']) for record in records]),
+        ('SearchEngine.calculate_advanced_relevance', n,
+         lambda: [SearchEngine.calculate_advanced_relevance(ADVANCED_QUERY, record) for record in records]),
+        ('SearchEngine.evaluate_advanced_query', n,
+         lambda: [SearchEngine.evaluate_advanced_query(ADVANCED_QUERY, record) for record in records]),
+    ]
+
+
+def consume(chunks) -> int:
+    return sum(len(chunk) for chunk in chunks)
+
+
+def file_cases(records, workdir) -> List[Tuple[str, int, Callable[[], object]]]:
+    """Lectores de ``FileProcessor`` y escritores de ``ExportManager`` sobre archivos en ``workdir``."""
+    csv_path = os.path.join(workdir, 'carga.csv')
+    xlsx_path = os.path.join(workdir, 'carga.xlsx')
+    write_csv(csv_path, records, dirty=0.05)
+    write_xlsx(xlsx_path, records, dirty=0.05)
+    os.makedirs(os.path.join(workdir, 'exports'), exist_ok=True)
+
+    def stream(path):
+        _, chunks = FileProcessor.stream_file(path)
+        return sum(len(chunk) for chunk in chunks)
+
+    def dumps(obj):
+        return json.dumps(obj, ensure_ascii=False).encode('utf-8')
+
+    return [
+        ('FileProcessor.detect_csv_format', 1, lambda: FileProcessor.detect_csv_format(csv_path)),
+        ('FileProcessor.estimate_rows csv', 1, lambda: FileProcessor.estimate_rows(csv_path)),
+        ('FileProcessor.estimate_rows xlsx', 1, lambda: FileProcessor.estimate_rows(xlsx_path)),
+        ('FileProcessor.read_csv_file', 1, lambda: FileProcessor.read_csv_file(csv_path)),
+        ('FileProcessor.read_excel_file', 1, lambda: FileProcessor.read_excel_file(xlsx_path)),
+        ('FileProcessor.stream_file csv', 1, lambda: stream(csv_path)),
+        ('FileProcessor.stream_file xlsx', 1, lambda: stream(xlsx_path)),
+        ('ExportManager.to_csv', 1, lambda: ExportManager.to_csv(records, 'micro.csv')),
+        ('ExportManager.to_excel', 1, lambda: ExportManager.to_excel(records, 'micro.xlsx')),
+        ('ExportManager.to_json', 1, lambda: ExportManager.to_json(records, 'micro.json')),
+        ('ExportManager.iter_csv', 1, lambda: consume(ExportManager.iter_csv(COLUMNS, records))),
+        ('ExportManager.iter_json', 1, lambda: consume(ExportManager.iter_json(records, dumps))),
+        ('ExportManager.iter_xlsx', 1, lambda: consume(ExportManager.iter_xlsx(COLUMNS, records))),
+    ]
+
+
+def measure(func: Callable[[], object], repeat: int) -> List[float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run(rows: int, file_rows: int, repeat: int, only: str = None, output: str = None) -> Dict:
+    workdir = tempfile.mkdtemp(prefix='bench-micro-')
+    results = {}
+    try:
+        groups = [(rows, lambda: search_cases(generate_records(rows))),
+                  (file_rows, lambda: file_cases(generate_records(file_rows), workdir))]
+        print(f"{'caso':<46}{'filas':>9}{'mejor (ms)':>12}{'mediana (ms)':>14}{'µs/llamada':>12}")
+        with working_directory(workdir):
+            for size, build in groups:
+                for name, calls, func in build():
+                    if only and only.lower() not in name.lower():
+                        continue
+                    times = measure(func, repeat)
+                    best, median = min(times), statistics.median(times)
+                    results[name] = {'rows': size, 'calls': calls, 'repeat': repeat,
+                                     'best_ms': round(best * 1000, 3), 'median_ms': round(median * 1000, 3)}
+                    per_call = f"{best / calls * 1e6:.2f}" if calls > 1 else ''
+                    print(f"{name:<46}{size:>9,}{best * 1000:>12.1f}{median * 1000:>14.1f}{per_call:>12}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return write_results(output, 'micro', {'rows': rows, 'file_rows': file_rows, 'repeat': repeat, 'only': only},
+                         results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=50_000, help='registros para SearchEngine')
+    parser.add_argument('--file-rows', type=int, default=10_000, help='filas de los archivos leídos y exportados')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', help='solo los casos cuyo nombre contiene este texto')
+    parser.add_argument('--json', dest='output', help='archivo donde guardar los resultados')
+    args = parser.parse_args()
+    run(args.rows, args.file_rows, args.repeat, args.only, args.output)
@@ -0,0 +1,76 @@
+# benchmarks/bench_records.py
+# -*- coding: utf-8 -*-
+"""
+Memoria por registro de los datos internos: lista de diccionarios (``json.load``)
+frente a ``RecordTable`` (esquema compartido + tuplas). Mide con ``tracemalloc``
+solo los registros, sin el índice de trigramas, y verifica que la tabla devuelva
+los mismos registros.
+
+Uso (desde la raíz del proyecto):
+
+    python -m benchmarks.bench_records --sizes 100000 500000
+    python -m benchmarks.bench_records --data app/data/data.json
+"""
+import argparse
+import gc
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.main.records import RecordTable
+from benchmarks.bench_search_index import generate_records
+
+
+def measure(build):
+    """Memoria que queda asignada tras ``build()`` (bytes) y el objeto construido."""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, elapsed, result
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def report(path):
+    dict_bytes, dict_time, records = measure(lambda: load(path))
+    # La tabla se mide por separado: se construye desde el archivo y los dicts de la carga se liberan.
+    table_bytes, table_time, table = measure(lambda: RecordTable(load(path)))
+    assert len(table) == len(records) and all(table.record(i) == record for i, record in enumerate(records)), \
+        "La tabla no reproduce los registros"
+    n = len(records) or 1
+    print(f"\n{path} | {len(records):,} registros | columnas: {', '.join(table.columns)}")
+    print(f"{'representación':<22}{'MB':>10}{'bytes/registro':>18}{'carga (s)*':>12}")
+    print(f"{'lista de dicts':<22}{dict_bytes / 2**20:>10.1f}{dict_bytes / n:>18.0f}{dict_time:>12.2f}")
+    print(f"{'RecordTable':<22}{table_bytes / 2**20:>10.1f}{table_bytes / n:>18.0f}{table_time:>12.2f}")
+    print(f"ahorro: {(1 - table_bytes / dict_bytes) * 100:.0f}%" if dict_bytes else '')
+    print("* tiempos bajo tracemalloc, solo comparables entre sí")
+
+
+def run(sizes, data):
+    if data:
+        report(data)
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, 'data.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(generate_records(size), f, indent=4, ensure_ascii=False)
+            report(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 500_000])
+    parser.add_argument('--data', help='data.json real a medir (en lugar de datos sintéticos)')
+    args = parser.parse_args()
+    run(args.sizes, args.data)
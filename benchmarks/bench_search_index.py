@@ -0,0 +1,73 @@
+# benchmarks/bench_search_index.py
+# -*- coding: utf-8 -*-
+"""
+Compara el recorrido lineal original de ``/search`` con el índice de trigramas.
+
+Uso (desde la raíz del proyecto):
+
+    python -m benchmarks.bench_search_index --sizes 10000 100000 1000000
+"""
+import argparse
+import random
+import time
+
+from app.main.index import NGramIndex
+from utils import normalize_text
+
+QUERIES = ['024', '0245', 'lima', 'prestacion', 'sanchez', 'caja 12', 'zzz-no-existe', '7']
+
+APELLIDOS = ['Quispe', 'Mamani', 'Flores', 'Sánchez', 'García', 'Rodríguez', 'Huamán', 'Chávez', 'Ramírez', 'Torres']
+UBICACIONES = ['Lima', 'Arequipa', 'Cusco', 'Trujillo', 'Piura', 'Chiclayo', 'Huancayo', 'Iquitos']
+
+
+def generate_records(size, seed=42):
+    """Genera registros sintéticos con el esquema de data.json."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(size):
+        records.append({
+            'CUSTODIA': f"Caja {rng.randint(1, 500)}",
+            'EXP BN': f"{rng.randint(0, 999):03d}-{i:07d}",
+            'EEM': f"EEM-{rng.randint(2015, 2025)}-{rng.randint(0, 99999):05d}",
+            'OBLIGADO': f"{rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}, prestación {rng.randint(1, 99)}",
+            'UBICADO': rng.choice(UBICACIONES),
+        })
+    return records
+
+
+def linear_search(query, records):
+    """Recorrido lineal de referencia: normaliza todos los valores en cada consulta."""
+    query = normalize_text(query)
+    return [item for item in records if any(query in normalize_text(str(value)) for value in item.values())]
+
+
+def timed(func, *args, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(sizes):
+    for size in sizes:
+        records = generate_records(size)
+        start = time.perf_counter()
+        index = NGramIndex(records)
+        build = time.perf_counter() - start
+        print(f"\n{size:,} registros | construcción del índice: {build:.2f}s | {index.stats()}")
+        print(f"{'consulta':<16}{'resultados':>12}{'lineal (ms)':>14}{'índice (ms)':>14}{'aceleración':>14}")
+        for query in QUERIES:
+            linear_time, expected = timed(linear_search, query, records)
+            index_time, row_ids = timed(index.search, query)
+            assert [records[i] for i in row_ids] == expected, f"Resultados distintos para {query!r}"
+            speedup = linear_time / index_time if index_time else float('inf')
+            print(f"{query:<16}{len(expected):>12}{linear_time * 1000:>14.2f}{index_time * 1000:>14.2f}{speedup:>13.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    run(parser.parse_args().sizes)
@@ -0,0 +1,95 @@
+# benchmarks/bench_update_batch.py
+# -*- coding: utf-8 -*-
+"""
+Compara guardar filas campo a campo (``/update_data``) contra una sola petición
+por fila (``/update_data/batch``): peticiones por segundo y bytes escritos a disco.
+
+Uso (desde la raíz del proyecto):
+
+    python -m benchmarks.bench_update_batch --records 50000 --rows 200 [--backend mapped]
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from app import create_app
+from app.main.storage import open_record_store
+from benchmarks.bench_search_index import generate_records
+
+FIELDS = ['CUSTODIA', 'EXP BN', 'EEM', 'OBLIGADO', 'UBICADO']
+
+
+def written_bytes():
+    """Bytes enviados a write() por este proceso (Linux), o None si no está disponible."""
+    try:
+        with open('/proc/self/io') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def make_client(data_path, backend='memory'):
+    app = create_app('testing')
+    app.extensions['internal_store'] = open_record_store(data_path, backend)
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user'] = 'benchmark'
+    return client
+
+
+def per_field(client, records, rows):
+    requests = 0
+    for i, record in enumerate(records[:rows]):
+        for field in FIELDS:
+            value = f"{record[field]}" if field == 'EXP BN' else f"{record[field]} v{i}"
+            response = client.post('/update_data', json={'exp_bn': record['EXP BN'], 'field': field, 'value': value})
+            assert response.status_code == 200, response.get_json()
+            requests += 1
+    return requests
+
+
+def batch(client, records, rows):
+    requests = 0
+    for i, record in enumerate(records[:rows]):
+        changes = {field: record[field] if field == 'EXP BN' else f"{record[field]} v{i}" for field in FIELDS}
+        response = client.post('/update_data/batch', json={'updates': [{'exp_bn': record['EXP BN'], 'changes': changes}]})
+        assert response.get_json()['success'], response.get_json()
+        requests += 1
+    return requests
+
+
+def run(num_records, rows, backend='memory'):
+    records = generate_records(num_records)
+    print(f"{num_records:,} registros ({backend}), {rows} filas guardadas ({len(FIELDS)} campos por fila)")
+    print(f"{'modo':<12}{'peticiones':>12}{'seg.':>10}{'pet./s':>10}{'filas/s':>10}{'MB escritos':>14}")
+    for name, func in (('por campo', per_field), ('lote', batch)):
+        workdir = tempfile.mkdtemp()
+        try:
+            data_path = os.path.join(workdir, 'data.json')
+            with open(data_path, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False)
+            client = make_client(data_path, backend)
+            before = written_bytes()
+            start = time.perf_counter()
+            requests = func(client, records, rows)
+            elapsed = time.perf_counter() - start
+            after = written_bytes()
+            written = f"{(after - before) / 1e6:.2f}" if before is not None else 'n/d'
+            print(f"{name:<12}{requests:>12}{elapsed:>10.2f}{requests / elapsed:>10.0f}{rows / elapsed:>10.0f}{written:>14}")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=50_000)
+    parser.add_argument('--rows', type=int, default=200)
+    parser.add_argument('--backend', choices=['memory', 'mapped'], default='memory')
+    args = parser.parse_args()
+    run(args.records, args.rows, args.backend)
@@ -0,0 +1,78 @@
+# benchmarks/compare.py
+# -*- coding: utf-8 -*-
+"""
+Compara dos resultados JSON de ``bench_micro`` o ``load`` (por ejemplo, de dos
+commits) y marca las regresiones mayores que ``--threshold`` por ciento. Sale
+con código 1 si hay alguna, para usarlo en CI.
+
+Uso (desde la raíz del proyecto):
+
+    python -m benchmarks.compare antes.json despues.json --threshold 10
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Tuple
+
+# Métrica -> (valor, True si más alto es mejor)
+Metrics = Dict[str, Tuple[float, bool]]
+
+
+def metrics(document: Dict) -> Metrics:
+    results = document['results']
+    if document['benchmark'] == 'micro':
+        return {name: (case['best_ms'], False) for name, case in results.items()}
+    flat = {}
+    for scenario, result in results.items():
+        flat[f"{scenario} pet./s"] = (result['throughput_rps'], True)
+        for group in ('latency_ms', 'completion_ms'):
+            for key in ('p50', 'p95', 'p99'):
+                if group in result:
+                    label = 'ms' if group == 'latency_ms' else 'fin ms'
+                    flat[f"{scenario} {key} {label}"] = (result[group][key], False)
+    return flat
+
+
+def describe(document: Dict) -> str:
+    git = document['environment'].get('git') or {}
+    commit = git.get('commit', '?') + ('+cambios' if git.get('dirty') else '')
+    return f"{commit} ({document['environment']['timestamp']})"
+
+
+def compare(before: Dict, after: Dict, threshold: float) -> int:
+    if before['benchmark'] != after['benchmark']:
+        raise SystemExit(f"No se pueden comparar '{before['benchmark']}' y '{after['benchmark']}'")
+    if before['config'] != after['config']:
+        print("Aviso: los resultados se midieron con parámetros distintos.")
+    print(f"antes:   {describe(before)}\ndespués: {describe(after)}\n")
+    old, new = metrics(before), metrics(after)
+    regressions = 0
+    print(f"{'métrica':<48}{'antes':>12}{'después':>12}{'cambio':>10}")
+    for name in old:
+        if name not in new:
+            continue
+        (value_before, higher_is_better), (value_after, _) = old[name], new[name]
+        change = (value_after - value_before) / value_before * 100 if value_before else 0.0
+        worse = -change if higher_is_better else change
+        flag = ''
+        if worse > threshold:
+            flag = '  REGRESIÓN'
+            regressions += 1
+        elif worse < -threshold:
+            flag = '  mejora'
+        print(f"{name:<48}{value_before:>12.2f}{value_after:>12.2f}{change:>+9.1f}%{flag}")
+    print(f"\n{regressions} regresión(es) de más de {threshold:g}%")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=10.0, help='porcentaje a partir del cual se marca')
+    args = parser.parse_args()
+    with open(args.before, encoding='utf-8') as f:
+        before = json.load(f)
+    with open(args.after, encoding='utf-8') as f:
+        after = json.load(f)
+    sys.exit(compare(before, after, args.threshold))
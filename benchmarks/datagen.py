@@ -0,0 +1,98 @@
+# benchmarks/datagen.py
+# -*- coding: utf-8 -*-
+"""
+Genera datos sintéticos con el esquema real (CUSTODIA, EXP BN, EEM, OBLIGADO,
+UBICADO), reproducibles con ``--seed``:
+
+- ``data.json``: datos internos, con el mismo formato que ``app/data/data.json``.
+- ``.xlsx`` y ``.csv``: archivos para ``/upload``. Con ``--dirty`` una fracción
+  de las filas trae lo que suelen traer las hojas reales: espacios de más,
+  celdas vacías, números en lugar de texto y filas en blanco.
+
+Uso (desde la raíz del proyecto):
+
+    python -m benchmarks.datagen --rows 100000 --formats json xlsx csv --out /tmp/bench
+"""
+import argparse
+import csv
+import json
+import os
+import random
+from typing import Dict, Iterator, List, Sequence
+
+from benchmarks.bench_search_index import generate_records
+
+COLUMNS = ['CUSTODIA', 'EXP BN', 'EEM', 'OBLIGADO', 'UBICADO']
+
+
+def sheet_rows(records: Sequence[Dict], dirty: float = 0.0, seed: int = 42) -> Iterator[List]:
+    """Filas de una hoja de carga (sin encabezado), con ``dirty`` de filas desprolijas."""
+    rng = random.Random(seed)
+    for record in records:
+        row = [record[column] for column in COLUMNS]
+        if dirty and rng.random() < dirty:
+            kind = rng.randrange(4)
+            if kind == 0:
+                row = [f"  {value} " for value in row]
+            elif kind == 1:
+                row[rng.randrange(len(row))] = None
+            elif kind == 2:
+                row[2] = rng.randint(1, 99999)
+            else:
+                yield [None] * len(row)
+        yield row
+
+
+def write_json(path: str, records: Sequence[Dict]) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(records, f, indent=4, ensure_ascii=False)
+
+
+def write_xlsx(path: str, records: Sequence[Dict], dirty: float = 0.0, seed: int = 42) -> None:
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Datos')
+    sheet.append(COLUMNS)
+    for row in sheet_rows(records, dirty, seed):
+        sheet.append(row)
+    workbook.save(path)
+
+
+def write_csv(path: str, records: Sequence[Dict], dirty: float = 0.0, seed: int = 42, separator: str = ',') -> None:
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f, delimiter=separator)
+        writer.writerow(COLUMNS)
+        for row in sheet_rows(records, dirty, seed):
+            writer.writerow(['' if value is None else value for value in row])
+
+
+WRITERS = {
+    'json': lambda path, records, dirty, seed: write_json(path, records),
+    'xlsx': write_xlsx,
+    'csv': write_csv,
+}
+
+
+def generate(rows: int, formats: Sequence[str], out: str, dirty: float = 0.0, seed: int = 42) -> Dict[str, str]:
+    """Escribe un archivo por formato en ``out`` y devuelve sus rutas."""
+    os.makedirs(out, exist_ok=True)
+    records = generate_records(rows, seed)
+    paths = {}
+    for name in formats:
+        path = os.path.join(out, 'data.json' if name == 'json' else f"datos_{rows}.{name}")
+        WRITERS[name](path, records, dirty, seed)
+        paths[name] = path
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--formats', nargs='+', choices=sorted(WRITERS), default=['json', 'xlsx'])
+    parser.add_argument('--out', default='bench_data')
+    parser.add_argument('--dirty', type=float, default=0.0, help='fracción de filas desprolijas en xlsx/csv')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    for name, path in generate(args.rows, args.formats, args.out, args.dirty, args.seed).items():
+        print(f"{name:<6}{os.path.getsize(path) / 2**20:>10.1f} MB  {path}")
@@ -0,0 +1,327 @@
+# benchmarks/load.py
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga de punta a punta sobre ``/search``, ``/upload`` y ``/update_data``
+con ``--concurrency`` clientes a la vez. Por escenario informa p50/p95/p99, media
+y máximo de la latencia, peticiones por segundo y códigos de estado; con
+``--json`` se guardan para comparar con ``benchmarks.compare``.
+
+Destinos:
+
+- Por defecto, la aplicación en este mismo proceso con el cliente de pruebas de
+  Flask, sobre datos de ``benchmarks.datagen`` (``--records``, ``--backend``) en
+  un directorio temporal. Cada cliente tiene su propia sesión.
+- ``--url``: un servidor ya levantado, por ejemplo gunicorn local::
+
+      gunicorn -w 4 -b 127.0.0.1:8000 run:app
+      python -m benchmarks.load --url http://127.0.0.1:8000 --user Elflaquis --password ...
+
+  Todos los clientes inician sesión con el mismo usuario, así que parte de las
+  cargas puede quedar rechazada por ``MAX_UPLOAD_JOBS_PER_USER`` (429). Ojo:
+  ``/update_data`` modifica los datos del servidor; usar una copia.
+
+En ``/upload`` se mide la respuesta de la petición y, aparte (``completion_ms``),
+el tiempo hasta que el trabajo en segundo plano termina (``/upload/status``).
+
+Uso (desde la raíz del proyecto):
+
+    python -m benchmarks.load --records 100000 --concurrency 8 --json load.json
+"""
+import argparse
+import http.client
+import io
+import itertools
+import json
+import os
+import random
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import urlencode, urlsplit
+
+from benchmarks.bench_search_index import APELLIDOS, UBICACIONES, generate_records
+from benchmarks.datagen import write_csv, write_json, write_xlsx
+from benchmarks.report import latency_summary, write_results
+
+SCENARIOS = ['search', 'update', 'upload']
+
+# (método, ruta, cuerpo JSON o None, archivo (nombre, bytes) o None) -> (estado, cabeceras, cuerpo)
+Request = Callable[..., Tuple[int, Dict[str, str], bytes]]
+
+
+def search_queries(rng: random.Random) -> Callable[[], str]:
+    """Consultas variadas con el vocabulario de los datos (muchas no se repiten)."""
+    makers = [
+        lambda: rng.choice(APELLIDOS),
+        lambda: f"{rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}",
+        lambda: f"caja {rng.randint(1, 500)}",
+        lambda: f"{rng.randint(0, 999):03d}",
+        lambda: f"eem-{rng.randint(2015, 2025)}",
+        lambda: rng.choice(UBICACIONES),
+        lambda: f"prestacion {rng.randint(1, 99)}",
+    ]
+    return lambda: rng.choice(makers)()
+
+
+class InProcessTarget:
+    """La aplicación en este proceso, con el cliente de pruebas de Flask."""
+
+    def __init__(self, records: int, backend: str, cache: bool):
+        from app import create_app
+        import app.main.routes as routes
+
+        self.workdir = tempfile.mkdtemp(prefix='bench-load-')
+        data_path = os.path.join(self.workdir, 'data.json')
+        write_json(data_path, generate_records(records))
+        # La ruta de los datos internos es fija en el módulo de rutas.
+        routes.DATA_FILE_PATH = data_path
+
+        self.app = create_app('testing')
+        self.app.config.update(
+            INTERNAL_BACKEND=backend,
+            DATASET_FOLDER=os.path.join(self.workdir, 'datasets'),
+            UPLOAD_FOLDER=os.path.join(self.workdir, 'uploads'),
+        )
+        if not cache:
+            self.app.config['SEARCH_CACHE_BYTES'] = 0
+        os.makedirs(self.app.config['UPLOAD_FOLDER'])
+
+    def client(self) -> Request:
+        client = self.app.test_client()
+        with client.session_transaction() as session:
+            session['user'] = f"bench-{secrets.token_hex(4)}"
+
+        def request(method, path, body=None, upload=None):
+            if upload is not None:
+                response = client.open(path, method=method, content_type='multipart/form-data',
+                                       data={'file': (io.BytesIO(upload[1]), upload[0])})
+            else:
+                response = client.open(path, method=method, json=body)
+            data = response.get_data()
+            response.close()
+            return response.status_code, dict(response.headers), data
+        return request
+
+    def close(self) -> None:
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class HttpTarget:
+    """Un servidor ya levantado; cada cliente usa su propia conexión persistente."""
+
+    def __init__(self, url: str, user: str, password: str):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.user, self.password = user, password
+
+    def client(self) -> Request:
+        connection = http.client.HTTPConnection(self.host, self.port, timeout=300)
+        cookies: Dict[str, str] = {}
+
+        def request(method, path, body=None, upload=None, form=None):
+            headers = {'X-Requested-With': 'XMLHttpRequest'}
+            if cookies:
+                headers['Cookie'] = '; '.join(f"{k}={v}" for k, v in cookies.items())
+            data = None
+            if form is not None:
+                data = urlencode(form).encode()
+                headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            elif upload is not None:
+                boundary = secrets.token_hex(16)
+                data = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{upload[0]}"\r\n'
+                        f'Content-Type: application/octet-stream\r\n\r\n').encode() + upload[1] + \
+                    f'\r\n--{boundary}--\r\n'.encode()
+                headers['Content-Type'] = f'multipart/form-data; boundary={boundary}'
+            elif body is not None:
+                data = json.dumps(body).encode()
+                headers['Content-Type'] = 'application/json'
+            connection.request(method, self.prefix + path, body=data, headers=headers)
+            response = connection.getresponse()
+            content = response.read()
+            for header in response.headers.get_all('Set-Cookie') or []:
+                name, _, rest = header.partition('=')
+                cookies[name.strip()] = rest.split(';', 1)[0]
+            return response.status, dict(response.headers), content
+
+        status, _, content = request('POST', '/auth/login', form={'username': self.user, 'password': self.password})
+        if status != 200:
+            raise SystemExit(f"No se pudo iniciar sesión en {self.host}:{self.port} ({status}): {content[:200]!r}")
+        return request
+
+    def close(self) -> None:
+        pass
+
+
+def discover_keys(request: Request, query: str) -> List[str]:
+    """EXP BN existentes, tomados de una búsqueda, para las actualizaciones."""
+    status, _, body = request('GET', '/search?' + urlencode({'query': query, 'mode': 'ordered', 'limit': 1000}))
+    if status != 200:
+        return []
+    return [record['EXP BN'] for record in json.loads(body)['results'] if record.get('EXP BN')]
+
+
+def run_scenario(target, name: str, total: int, concurrency: int, make_call, seed: int) -> Dict:
+    """Ejecuta ``total`` peticiones repartidas entre ``concurrency`` hilos."""
+    counter = itertools.count()
+    lock = threading.Lock()
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    extra: Dict[str, List[float]] = {}
+
+    def worker(index: int):
+        request = target.client()
+        call = make_call(request, random.Random(seed + index))
+        while True:
+            with lock:
+                if next(counter) >= total:
+                    return
+            start = time.perf_counter()
+            status, details = call()
+            elapsed = time.perf_counter() - start
+            if details and 'latency_s' in details:
+                # La llamada incluye más que la petición medida (p. ej. esperar a que termine una carga).
+                elapsed = details.pop('latency_s')
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+                for key, value in (details or {}).items():
+                    extra.setdefault(key, []).append(value)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+
+    result = {
+        'requests': len(latencies),
+        'errors': sum(count for status, count in statuses.items() if status >= 400),
+        'status': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'latency_ms': latency_summary(latencies),
+    }
+    for key, values in extra.items():
+        if key.endswith('_s'):
+            result[key[:-2] + '_ms'] = latency_summary(values)
+        else:
+            result[key] = sum(values)
+    lat = result['latency_ms']
+    print(f"{name:<10}{result['requests']:>8}{result['errors']:>8}{result['throughput_rps']:>10.1f}"
+          f"{lat['p50']:>10.1f}{lat['p95']:>10.1f}{lat['p99']:>10.1f}{lat['max']:>10.1f}")
+    return result
+
+
+def search_call(modes: List[str]):
+    def make(request: Request, rng: random.Random):
+        next_query = search_queries(rng)
+
+        def call():
+            params = {'query': next_query(), 'mode': rng.choice(modes), 'dataSource': 'internal'}
+            status, headers, _ = request('GET', '/search?' + urlencode(params))
+            return status, {'cache_hits': int(headers.get('X-Cache') == 'HIT')}
+        return call
+    return make
+
+
+def update_call(keys: List[str]):
+    def make(request: Request, rng: random.Random):
+        def call():
+            body = {'exp_bn': rng.choice(keys), 'field': 'UBICADO', 'value': rng.choice(UBICACIONES)}
+            status, _, _ = request('POST', '/update_data', body=body)
+            return status, None
+        return call
+    return make
+
+
+def upload_call(upload: Tuple[str, bytes]):
+    def make(request: Request, rng: random.Random):
+        def call():
+            start = time.perf_counter()
+            status, _, body = request('POST', '/upload', upload=upload)
+            latency = time.perf_counter() - start
+            if status != 202:
+                return status, {'latency_s': latency}
+            job_id = json.loads(body)['job_id']
+            while True:
+                _, _, body = request('GET', f'/upload/status/{job_id}')
+                state = json.loads(body)
+                if state.get('phase') in ('done', 'error', 'cancelled', None):
+                    break
+                time.sleep(0.05)
+            return status, {'latency_s': latency, 'completion_s': time.perf_counter() - start,
+                            'completed': int(state.get('phase') == 'done')}
+        return call
+    return make
+
+
+def upload_file(rows: int, file_format: str) -> Tuple[str, bytes]:
+    """Archivo de carga generado una sola vez (con un 5% de filas desprolijas)."""
+    workdir = tempfile.mkdtemp(prefix='bench-upload-')
+    try:
+        path = os.path.join(workdir, f"carga.{file_format}")
+        writer = write_xlsx if file_format == 'xlsx' else write_csv
+        writer(path, generate_records(rows, seed=7), dirty=0.05)
+        with open(path, 'rb') as f:
+            return os.path.basename(path), f.read()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def run(args) -> Dict:
+    if args.url:
+        target = HttpTarget(args.url, args.user, args.password)
+    else:
+        target = InProcessTarget(args.records, args.backend, not args.no_cache)
+    results = {}
+    try:
+        probe = target.client()
+        # Primera petición: carga los datos e índices antes de medir.
+        probe('GET', '/status')
+        print(f"{'escenario':<10}{'pet.':>8}{'errores':>8}{'pet./s':>10}{'p50 ms':>10}{'p95 ms':>10}"
+              f"{'p99 ms':>10}{'máx ms':>10}")
+        for name in args.scenarios:
+            if name == 'search':
+                make, total = search_call(args.modes), args.search_requests
+            elif name == 'update':
+                keys = discover_keys(probe, args.key_query)
+                if not keys:
+                    print(f"update: sin EXP BN para la consulta {args.key_query!r}, se omite")
+                    continue
+                make, total = update_call(keys), args.update_requests
+            else:
+                make, total = upload_call(upload_file(args.upload_rows, args.upload_format)), args.upload_requests
+            results[name] = run_scenario(target, name, total, args.concurrency, make, args.seed)
+    finally:
+        target.close()
+    config = {key: value for key, value in vars(args).items() if key not in ('password', 'output')}
+    return write_results(args.output, 'load', config, results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='servidor a probar (por defecto, la aplicación en este proceso)')
+    parser.add_argument('--user', default='Elflaquis')
+    parser.add_argument('--password', default=os.environ.get('BENCH_PASSWORD', ''))
+    parser.add_argument('--records', type=int, default=100_000, help='datos internos generados (en proceso)')
+    parser.add_argument('--backend', choices=['memory', 'mapped', 'sqlite'], default='memory')
+    parser.add_argument('--no-cache', action='store_true', help='desactiva la caché de resultados (en proceso)')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--modes', nargs='+', default=['ranked', 'ordered'],
+                        choices=['ranked', 'ordered', 'advanced', 'fuzzy'])
+    parser.add_argument('--search-requests', type=int, default=500)
+    parser.add_argument('--update-requests', type=int, default=200)
+    parser.add_argument('--upload-requests', type=int, default=8)
+    parser.add_argument('--upload-rows', type=int, default=5_000)
+    parser.add_argument('--upload-format', choices=['xlsx', 'csv'], default='xlsx')
+    parser.add_argument('--key-query', default='-', help='consulta para obtener EXP BN a actualizar')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', dest='output', help='archivo donde guardar los resultados')
+    run(parser.parse_args())
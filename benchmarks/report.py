@@ -0,0 +1,76 @@
+# benchmarks/report.py
+# -*- coding: utf-8 -*-
+"""
+Resultados en JSON de ``bench_micro`` y ``load``, para comparar entre commits
+con ``benchmarks.compare``. Cada archivo lleva el entorno en que se midió
+(commit, Python, CPU y versiones de las dependencias).
+"""
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from importlib import metadata
+from typing import Dict, List, Optional, Sequence
+
+PACKAGES = ['Flask', 'Werkzeug', 'pandas', 'numpy', 'openpyxl', 'orjson', 'gunicorn']
+
+
+def git_commit() -> Optional[Dict[str, object]]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=root, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {'commit': commit, 'dirty': bool(dirty)}
+
+
+def environment() -> Dict[str, object]:
+    versions = {}
+    for name in PACKAGES:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return {
+        'git': git_commit(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'packages': versions,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def percentile(ordered: Sequence[float], q: float) -> float:
+    """Percentil ``q`` (0-100) de valores ya ordenados, interpolando entre vecinos."""
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def latency_summary(seconds: List[float]) -> Dict[str, float]:
+    """p50/p95/p99, media y máximo en milisegundos."""
+    ordered = sorted(seconds)
+    summary = {f"p{q}": percentile(ordered, q) * 1000 for q in (50, 95, 99)}
+    summary['mean'] = statistics.fmean(ordered) * 1000 if ordered else 0.0
+    summary['max'] = ordered[-1] * 1000 if ordered else 0.0
+    return {key: round(value, 3) for key, value in summary.items()}
+
+
+def write_results(path: Optional[str], kind: str, config: Dict, results: Dict) -> Dict:
+    """Arma el documento de resultados y lo guarda en ``path`` (si se indica)."""
+    document = {'benchmark': kind, 'environment': environment(), 'config': config, 'results': results}
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+        print(f"\nResultados en {path}")
+    return document
@@ -12,6 +12,23 @@ class Config:
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER') or 'uploads'
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 32 * 1024 * 1024))  # 32MB
     ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv'}
+
+    # Almacén en disco de los datos subidos (la sesión solo guarda su identificador)
+    DATASET_FOLDER = os.environ.get('DATASET_FOLDER') or 'datasets'
+    DATASET_MAX_BYTES = int(os.environ.get('DATASET_MAX_BYTES', 1024 * 1024 * 1024))  # 1GB en total
+    DATASET_USER_QUOTA = int(os.environ.get('DATASET_USER_QUOTA', 128 * 1024 * 1024))  # 128MB por usuario
+    DATASET_TTL = int(os.environ.get('DATASET_TTL', 24 * 60 * 60))  # segundos sin uso tras los que se borra un conjunto subido
+    UPLOAD_CHUNK_ROWS = int(os.environ.get('UPLOAD_CHUNK_ROWS', 5000))  # filas por bloque al leer cargas
+    UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 2))  # hilos que procesan cargas en segundo plano
+    MAX_UPLOAD_JOBS_PER_USER = int(os.environ.get('MAX_UPLOAD_JOBS_PER_USER', 2))
+    UPLOAD_STALL_TIMEOUT = int(os.environ.get('UPLOAD_STALL_TIMEOUT', 30 * 60))  # segundos sin avances tras los que una carga se da por muerta
+
+    # Pool de procesos por worker para el trabajo de CPU (app/main/pool.py); 0 lo hace todo en los hilos
+    CPU_WORKERS = int(os.environ.get('CPU_WORKERS', 0))
+    CPU_OFFLOAD_MIN_ROWS = int(os.environ.get('CPU_OFFLOAD_MIN_ROWS', 20000))  # filas mínimas para buscar en el pool
+
+    # Datos internos: 'memory' (copia por worker), 'mapped' (snapshot compartido) o 'sqlite' (FTS5 en disco)
+    INTERNAL_BACKEND = os.environ.get('INTERNAL_BACKEND') or 'memory'
     
     # Configuración de logging
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
@@ -23,8 +40,35 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True
     
     # Límites de la aplicación
-    MAX_SEARCH_HISTORY = int(os.environ.get('MAX_SEARCH_HISTORY', 100))
-    MAX_UPLOAD_HISTORY = int(os.environ.get('MAX_UPLOAD_HISTORY', 20))
+    MAX_SEARCH_HISTORY = int(os.environ.get('MAX_SEARCH_HISTORY', 100))  # búsquedas recientes guardadas por worker
+    MAX_UPLOAD_HISTORY = int(os.environ.get('MAX_UPLOAD_HISTORY', 20))  # cargas recientes guardadas por worker
+    HISTORY_LOG_FOLDER = os.environ.get('HISTORY_LOG_FOLDER', '')  # registro en disco de todo el historial ('' lo desactiva)
+    HISTORY_LOG_MAX_BYTES = int(os.environ.get('HISTORY_LOG_MAX_BYTES', 64 * 1024 * 1024))  # tamaño al que se rota cada registro
+    ANALYTICS_MAX_QUERIES = int(os.environ.get('ANALYTICS_MAX_QUERIES', 10000))  # consultas distintas contadas en /analytics
+    SEARCH_PAGE_SIZE = int(os.environ.get('SEARCH_PAGE_SIZE', 100))  # resultados por página en /search
+    SEARCH_MAX_PAGE_SIZE = int(os.environ.get('SEARCH_MAX_PAGE_SIZE', 1000))  # máximo 'limit' aceptado
+    SEARCH_STREAM_MAX = int(os.environ.get('SEARCH_STREAM_MAX', 50000))  # máximo de resultados en modo NDJSON
+    SEARCH_CACHE_BYTES = int(os.environ.get('SEARCH_CACHE_BYTES', 64 * 1024 * 1024))  # caché de resultados por worker (0 la desactiva)
+    SUGGEST_LIMIT = int(os.environ.get('SUGGEST_LIMIT', 8))  # sugerencias por consulta en /search/suggest
+    SUGGEST_MIN_CHARS = int(os.environ.get('SUGGEST_MIN_CHARS', 2))  # caracteres mínimos para sugerir
+    SUGGEST_MAX_CANDIDATES = int(os.environ.get('SUGGEST_MAX_CANDIDATES', 20000))  # candidatos guardados por sesión
+    SUGGEST_MAX_SESSIONS = int(os.environ.get('SUGGEST_MAX_SESSIONS', 1000))  # sesiones con candidatos por worker
+    FUZZY_INDEX_MAX = int(os.environ.get('FUZZY_INDEX_MAX', 4))  # índices de búsqueda aproximada por worker
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')  # 'auto' (orjson si está instalado), 'orjson' o 'stdlib'
+    JSON_FRAGMENT_CACHE = int(os.environ.get('JSON_FRAGMENT_CACHE', 200000))  # registros ya codificados en JSON por worker (0 la desactiva)
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))  # nivel de gzip/brotli de las respuestas (0 desactiva la compresión)
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # bytes mínimos para comprimir una respuesta
+    STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 365 * 24 * 3600))  # caché del navegador para estáticos con hash (segundos)
+    EXPORT_MAX_ROWS = int(os.environ.get('EXPORT_MAX_ROWS', 1000000))  # filas máximas por descarga de /export
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'  # /metrics de Prometheus (requiere prometheus_client)
+
+    # Perfilado de peticiones (app/profiling.py); desactivado no tiene costo
+    PROFILE_ENABLED = os.environ.get('PROFILE_ENABLED', '0') != '0'
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))  # fracción de peticiones perfiladas al azar
+    PROFILE_MODE = os.environ.get('PROFILE_MODE', 'sample')  # 'sample' (pilas para flamegraph) o 'cprofile' (pstats)
+    PROFILE_ADMINS = set(filter(None, os.environ.get('PROFILE_ADMINS', '').split(',')))  # usuarios que pueden usar X-Profile y /admin/profiles
+    PROFILE_FOLDER = os.environ.get('PROFILE_FOLDER') or 'profiles'
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))  # perfiles conservados (se borran los más viejos)
     
     # Configuración de seguridad
     WTF_CSRF_ENABLED = True
@@ -45,6 +89,12 @@ class ProductionConfig(Config):
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
+
+    # Con varios workers, un solo snapshot mapeado en memoria para todos
+    INTERNAL_BACKEND = os.environ.get('INTERNAL_BACKEND') or 'mapped'
+
+    # Con gunicorn gthread (gunicorn.conf.py), las búsquedas grandes y las cargas van a procesos aparte
+    CPU_WORKERS = int(os.environ.get('CPU_WORKERS', 2))
     
     # Logging más detallado
     LOG_LEVEL = 'WARNING'
@@ -0,0 +1,67 @@
+# gunicorn.conf.py
+# -*- coding: utf-8 -*-
+"""
+Configuración de gunicorn para producción. Se lee sola al arrancar desde la raíz
+del proyecto:
+
+    FLASK_CONFIG=production gunicorn run:app
+
+Cada worker atiende varias peticiones a la vez con hilos (``gthread``): una carga
+o una búsqueda lenta ocupa un hilo, no el worker entero. Las búsquedas grandes y
+la lectura de los archivos subidos van además al pool de procesos de cada worker
+(``CPU_WORKERS``, ver app/main/pool.py), así el GIL queda libre para los demás hilos.
+
+Para que ``/metrics`` sume los valores de todos los workers, cada uno los escribe
+en ``PROMETHEUS_MULTIPROC_DIR`` (ver app/metrics.py). Si no está definido se usa
+un directorio temporal nuevo; en ambos casos se vacía al arrancar.
+
+Todo se puede ajustar con variables de entorno (``WEB_CONCURRENCY``,
+``GUNICORN_THREADS``, ``GUNICORN_TIMEOUT``...) o con opciones en la línea de comandos.
+"""
+import glob
+import multiprocessing
+import os
+import tempfile
+
+bind = os.environ.get('GUNICORN_BIND') or f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', 8))  # peticiones simultáneas por worker
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))  # segundos sin responder antes de reiniciar un worker
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))  # reinicia cada worker tras N peticiones (0: nunca)
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG')  # '-' para la salida estándar
+
+# prometheus_client elige el modo multiproceso al importarse, así que la variable
+# se define aquí, antes de cargar la aplicación (también con ``--preload``).
+if not (os.environ.get('PROMETHEUS_MULTIPROC_DIR') or os.environ.get('prometheus_multiproc_dir')):
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='buscador-metrics-')
+
+try:
+    from prometheus_client import multiprocess
+except ImportError:  # Dependencia opcional: sin métricas
+    multiprocess = None
+
+
+def on_starting(server):
+    """Crea el directorio de métricas y borra los valores de una ejecución anterior."""
+    folder = os.environ.get('PROMETHEUS_MULTIPROC_DIR') or os.environ.get('prometheus_multiproc_dir')
+    os.makedirs(folder, exist_ok=True)
+    for path in glob.glob(os.path.join(folder, '*.db')):
+        os.remove(path)
+
+
+def worker_exit(server, worker):
+    """Detiene el pool de procesos del worker que termina."""
+    app = getattr(worker, 'wsgi', None)
+    pool = app.extensions.get('cpu_pool') if hasattr(app, 'extensions') else None
+    if pool is not None:
+        pool.shutdown()
+
+
+def child_exit(server, worker):
+    """Descarta las métricas ``live*`` del worker que terminó (ver app/metrics.py)."""
+    if multiprocess is not None:
+        multiprocess.mark_process_dead(worker.pid)
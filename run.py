@@ -5,6 +5,11 @@ Script principal para ejecutar la aplicación.
 
 Este script importa la factory 'create_app' desde el paquete 'app'
 y la utiliza para crear y ejecutar la instancia de la aplicación Flask.
+
+El servidor de Flask es solo para desarrollo. En producción se usa gunicorn con
+la configuración de gunicorn.conf.py (workers con hilos y pool de procesos):
+
+    FLASK_CONFIG=production gunicorn run:app
 """
 import os
 from app import create_app
@@ -0,0 +1,77 @@
+# tests/test_backends.py
+# -*- coding: utf-8 -*-
+"""
+Equivalencia de los backends de datos internos (``memory``, ``mapped`` y
+``sqlite``) con la búsqueda lineal original: búsqueda simple, consultas
+avanzadas por campo y ``update_many`` (incluido el cambio de clave).
+
+Usa los mismos datos y casos borde que ``benchmarks/bench_backends.py``.
+
+    python -m pytest -q tests
+"""
+import json
+
+import pytest
+
+from app.main.routes import advanced_matches
+from app.main.storage import open_record_store
+from benchmarks.bench_backends import BACKENDS, EDGE_QUERIES, EDGE_RECORDS, FIELD_QUERIES, apply_linear, updates_for
+from benchmarks.bench_search_index import QUERIES, generate_records, linear_search
+from utils import AdvancedQuery, normalize_text
+
+NUM_RECORDS = 2000
+AFTER_UPDATE_QUERIES = ['revisado', 'pucallpa 1', 'nuevo-001', 'tacna']
+
+
+@pytest.fixture
+def records():
+    return generate_records(NUM_RECORDS) + [dict(r) for r in EDGE_RECORDS]
+
+
+@pytest.fixture(params=BACKENDS)
+def store(request, tmp_path, records):
+    data_path = tmp_path / 'data.json'
+    data_path.write_text(json.dumps(records, ensure_ascii=False), encoding='utf-8')
+    return open_record_store(str(data_path), request.param)
+
+
+def expected_field_rows(query, records):
+    rows, _ = AdvancedQuery(query).evaluate(lambda term: AdvancedQuery.scan(term, records), len(records))
+    return rows
+
+
+@pytest.mark.parametrize('query', QUERIES + EDGE_QUERIES)
+def test_search_matches_linear(store, records, query):
+    assert store.search(normalize_text(query)) == linear_search(query, records)
+
+
+@pytest.mark.parametrize('query', FIELD_QUERIES)
+def test_field_queries_match_scan(store, records, query):
+    query = normalize_text(query)
+    rows, _ = advanced_matches(store, query)
+    assert rows == expected_field_rows(query, records)
+
+
+def test_update_many_matches_linear(store, records):
+    entries = updates_for(records)
+    expected = [dict(r) for r in records]
+    expected_found = apply_linear(expected, entries)
+
+    assert store.update_many(entries) == expected_found
+    assert list(store.records()) == expected
+    for query in QUERIES + EDGE_QUERIES + AFTER_UPDATE_QUERIES:
+        assert store.search(normalize_text(query)) == linear_search(query, expected), query
+    for query in FIELD_QUERIES:
+        query = normalize_text(query)
+        rows, _ = advanced_matches(store, query)
+        assert rows == expected_field_rows(query, expected), query
+
+
+def test_update_many_renames_key(store, records):
+    old_key = next(r['EXP BN'] for r in records if 'EXP BN' in r)
+    found = store.update_many([(old_key, {'EXP BN': 'NUEVO-001'}), ('NUEVO-001', {'CUSTODIA': 'Caja renombrada'})])
+
+    assert found == [True, True]
+    assert store.get(old_key) is None
+    assert store.get('NUEVO-001')['CUSTODIA'] == 'Caja renombrada'
+    assert store.search(normalize_text('nuevo-001')) == [store.get('NUEVO-001')]
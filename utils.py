@@ -1,19 +1,47 @@
 # utils.py - Funciones de utilidad para la aplicación
+import csv
+import heapq
+import io
 import os
+import queue
+import threading
+from array import array
+from collections import Counter
+import numpy as np
 import pandas as pd
 import re
 from datetime import datetime
 from werkzeug.utils import secure_filename
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Iterator, Iterable, Sequence, NamedTuple, Callable, Set, Union
 import logging
+import unicodedata
+
+try:
+    import pyarrow  # noqa: F401  (columnas de texto en Arrow: str.contains más rápido)
+    STRING_DTYPE = 'string[pyarrow]'
+except ImportError:  # sin pyarrow: columnas de objetos de Python
+    STRING_DTYPE = object
 
 logger = logging.getLogger(__name__)
 
+def normalize_text(text: str) -> str:
+    """
+    Forma en que la búsqueda compara los textos: sin mayúsculas (casefold), sin
+    acentos (NFKD) y con los espacios colapsados ('  Prestación  DE' -> 'prestacion de').
+    """
+    text = text.casefold()
+    if not text.isascii():
+        text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return ' '.join(text.split())
+
 class FileProcessor:
     """Clase para procesar diferentes tipos de archivos"""
     
     ALLOWED_EXTENSIONS = {'xlsx', 'xls', 'csv'}
     
+    # Filas por bloque en la lectura incremental
+    CHUNK_ROWS = 5000
+    
     @staticmethod
     def allowed_file(filename: str) -> bool:
         """Verificar si el archivo tiene una extensión permitida"""
@@ -45,36 +73,42 @@ class FileProcessor:
                 logger.error(f"Error leyendo archivo con ambos engines: openpyxl={e1}, xlrd={e2}")
                 raise Exception(f"No se pudo leer el archivo Excel: {e2}")
     
+    @staticmethod
+    def detect_csv_format(filepath: str) -> Tuple[str, str]:
+        """Detectar encoding y separador de un CSV a partir de sus primeros bytes"""
+        with open(filepath, 'rb') as f:
+            raw_data = f.read(10000)  # Leer primeros 10KB
+            
+        # Detectar encoding
+        encoding = 'utf-8'
+        for enc in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
+            try:
+                raw_data.decode(enc)
+                encoding = enc
+                break
+            except UnicodeDecodeError:
+                continue
+        
+        # Detectar separador
+        sample_text = raw_data.decode(encoding, errors='ignore')
+        separators = [',', ';', '\t', '|']
+        separator = ','
+        max_columns = 0
+        
+        for sep in separators:
+            lines = sample_text.split('\n')[:5]  # Primeras 5 líneas
+            columns = max([len(line.split(sep)) for line in lines if line.strip()], default=0)
+            if columns > max_columns:
+                max_columns = columns
+                separator = sep
+        
+        return encoding, separator
+    
     @staticmethod
     def read_csv_file(filepath: str) -> pd.DataFrame:
         """Leer archivo CSV con detección automática de formato"""
         try:
-            # Detectar separador y encoding
-            with open(filepath, 'rb') as f:
-                raw_data = f.read(10000)  # Leer primeros 10KB
-                
-            # Detectar encoding
-            encoding = 'utf-8'
-            for enc in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
-                try:
-                    raw_data.decode(enc)
-                    encoding = enc
-                    break
-                except UnicodeDecodeError:
-                    continue
-            
-            # Detectar separador
-            sample_text = raw_data.decode(encoding, errors='ignore')
-            separators = [',', ';', '\t', '|']
-            separator = ','
-            max_columns = 0
-            
-            for sep in separators:
-                lines = sample_text.split('\n')[:5]  # Primeras 5 líneas
-                columns = max([len(line.split(sep)) for line in lines if line.strip()])
-                if columns > max_columns:
-                    max_columns = columns
-                    separator = sep
+            encoding, separator = FileProcessor.detect_csv_format(filepath)
             
             # Leer CSV con parámetros detectados
             df = pd.read_csv(filepath, encoding=encoding, sep=separator)
@@ -85,6 +119,127 @@ class FileProcessor:
             logger.error(f"Error leyendo archivo CSV: {e}")
             raise Exception(f"No se pudo leer el archivo CSV: {e}")
     
+    @staticmethod
+    def stream_file(filepath: str, chunk_rows: int = CHUNK_ROWS) -> Tuple[List[str], Iterator[List[List[str]]]]:
+        """
+        Leer un archivo por bloques de filas ya limpias, sin cargarlo completo en memoria.
+        
+        Devuelve los nombres de columna y un iterador de bloques; cada fila es una
+        lista de textos con la misma longitud que las columnas.
+        """
+        columns, chunks = FileProcessor.read_chunks(filepath, chunk_rows)
+        width = len(columns)
+        return columns, (FileProcessor.clean_rows(chunk, width) for chunk in chunks)
+    
+    @staticmethod
+    def read_chunks(filepath: str, chunk_rows: int = CHUNK_ROWS) -> Tuple[List[str], Iterator[List[Sequence]]]:
+        """Leer un archivo por bloques de filas tal como vienen, sin limpiar (ver ``stream_file``)"""
+        extension = filepath.rsplit('.', 1)[-1].lower()
+        if extension == 'csv':
+            columns, chunks = FileProcessor._csv_chunks(filepath, chunk_rows)
+        elif extension == 'xlsx':
+            columns, chunks = FileProcessor._xlsx_chunks(filepath, chunk_rows)
+        else:
+            # Los .xls (xlrd) no tienen modo de lectura incremental
+            df = FileProcessor.read_excel_file(filepath)
+            columns = [str(c) for c in df.columns]
+            rows = df.itertuples(index=False, name=None)
+            chunks = FileProcessor._batched(rows, chunk_rows)
+        
+        return [c.strip() for c in columns], chunks
+    
+    @staticmethod
+    def estimate_rows(filepath: str) -> Optional[int]:
+        """Estimar el número de filas de datos sin leer el archivo completo"""
+        extension = filepath.rsplit('.', 1)[-1].lower()
+        try:
+            if extension == 'xlsx':
+                from openpyxl import load_workbook
+                workbook = load_workbook(filepath, read_only=True)
+                try:
+                    max_row = workbook.active.max_row
+                finally:
+                    workbook.close()
+                return max(max_row - 1, 0) if max_row else None
+            if extension == 'csv':
+                with open(filepath, 'rb') as f:
+                    sample = f.read(64 * 1024)
+                lines = sample.count(b'\n')
+                if not lines:
+                    return 1
+                return max(round(os.path.getsize(filepath) * lines / len(sample)) - 1, 0)
+        except Exception as e:
+            logger.warning(f"No se pudo estimar el tamaño de {filepath}: {e}")
+        return None
+    
+    @staticmethod
+    def _batched(rows: Iterable[Sequence], size: int) -> Iterator[List[Sequence]]:
+        """Agrupar filas en bloques de tamaño fijo"""
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    @staticmethod
+    def _csv_chunks(filepath: str, chunk_rows: int) -> Tuple[List[str], Iterator[List[Sequence]]]:
+        """Leer un CSV por bloques con el encoding y separador detectados"""
+        encoding, separator = FileProcessor.detect_csv_format(filepath)
+        reader = pd.read_csv(filepath, encoding=encoding, sep=separator, dtype=str,
+                             keep_default_na=False, chunksize=chunk_rows)
+        first = next(reader, None)
+        if first is None:
+            return [], iter([])
+        columns = [str(c) for c in first.columns]
+        
+        def chunks():
+            yield list(first.itertuples(index=False, name=None))
+            for chunk in reader:
+                yield list(chunk.itertuples(index=False, name=None))
+            reader.close()
+        
+        logger.info(f"CSV en lectura incremental: {filepath}, encoding={encoding}, separator={separator}")
+        return columns, chunks()
+    
+    @staticmethod
+    def _xlsx_chunks(filepath: str, chunk_rows: int) -> Tuple[List[str], Iterator[List[Sequence]]]:
+        """Leer la primera hoja de un .xlsx en modo read_only de openpyxl"""
+        from openpyxl import load_workbook
+        
+        workbook = load_workbook(filepath, read_only=True, data_only=True)
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            workbook.close()
+            return [], iter([])
+        # Mismo nombre que usa pandas para las columnas sin encabezado
+        columns = [f"Unnamed: {i}" if value is None else str(value) for i, value in enumerate(header)]
+        
+        def chunks():
+            try:
+                yield from FileProcessor._batched(rows, chunk_rows)
+            finally:
+                workbook.close()
+        
+        return columns, chunks()
+    
+    @staticmethod
+    def clean_rows(rows: Iterable[Sequence], width: int) -> List[List[str]]:
+        """Limpiar un bloque de filas con las mismas reglas que clean_dataframe"""
+        cleaned = []
+        for row in rows:
+            values = ['' if value is None or value != value else str(value).strip() for value in row[:width]]
+            # Remover filas completamente vacías
+            if not any(values):
+                continue
+            if len(values) < width:
+                values.extend([''] * (width - len(values)))
+            cleaned.append(values)
+        return cleaned
+    
     @staticmethod
     def clean_dataframe(df: pd.DataFrame) -> pd.DataFrame:
         """Limpiar y preparar DataFrame"""
@@ -103,14 +258,415 @@ class FileProcessor:
         
         return df
 
+class QuerySyntaxError(ValueError):
+    """La consulta avanzada no se puede interpretar"""
+
+class Term(NamedTuple):
+    """Condición ``campo:valor`` (o solo ``valor``, en cualquier campo)"""
+    field: Optional[str]
+    value: str
+
+class And(NamedTuple):
+    children: Tuple
+
+class Or(NamedTuple):
+    children: Tuple
+
+class Not(NamedTuple):
+    child: Any
+
+QueryNode = Union[Term, And, Or, Not]
+
+class AdvancedQuery:
+    """
+    Consulta avanzada compilada una sola vez en un árbol de condiciones.
+    
+    Sintaxis: ``campo:valor``, ``AND``, ``OR``, ``NOT`` y paréntesis; dos condiciones
+    seguidas equivalen a ``AND``. Campos o valores con espacios van entre comillas
+    (``"EXP BN":024``) y una palabra sin campo se busca en todos los campos. Los
+    nombres de campo no distinguen mayúsculas y los valores se comparan como
+    subcadena sin distinguir mayúsculas.
+    
+    El árbol se evalúa por término: cada condición da un conjunto de filas (desde
+    un índice si lo hay, o recorriendo solo ese campo) y luego se combinan con
+    intersección, unión y diferencia.
+    """
+    
+    _TOKEN = re.compile(r'\s*(?:(\()|(\))|(:)|"([^"]*)"|([^\s():"]+))')
+    _KEYWORDS = {'and', 'or', 'not'}
+    
+    def __init__(self, query: str):
+        self.query = query
+        self.terms: List[Term] = []
+        self._tokens = self._tokenize(query)
+        self._pos = 0
+        if not self._tokens:
+            raise QuerySyntaxError("La consulta está vacía")
+        self.tree: QueryNode = self._parse_or()
+        if self._pos < len(self._tokens):
+            raise QuerySyntaxError(f"Elemento inesperado: {self._tokens[self._pos][1]}")
+        del self._tokens
+    
+    # --- Análisis ---
+    @classmethod
+    def _tokenize(cls, query: str) -> List[Tuple[str, str]]:
+        tokens = []
+        pos = 0
+        query = query.rstrip()
+        while pos < len(query):
+            match = cls._TOKEN.match(query, pos)
+            if match is None:
+                raise QuerySyntaxError(f"Comillas sin cerrar en la posición {pos}")
+            lparen, rparen, colon, quoted, word = match.groups()
+            if lparen:
+                tokens.append(('(', '('))
+            elif rparen:
+                tokens.append((')', ')'))
+            elif colon:
+                tokens.append((':', ':'))
+            elif quoted is not None:
+                tokens.append(('word', quoted))
+            elif word.lower() in cls._KEYWORDS:
+                tokens.append((word.lower(), word))
+            else:
+                tokens.append(('word', word))
+            pos = match.end()
+        return tokens
+    
+    def _peek(self) -> Optional[str]:
+        return self._tokens[self._pos][0] if self._pos < len(self._tokens) else None
+    
+    def _take(self, kind: str) -> str:
+        if self._peek() != kind:
+            expected = 'un valor' if kind == 'word' else f"'{kind}'"
+            found = f"'{self._tokens[self._pos][1]}'" if self._pos < len(self._tokens) else 'el final de la consulta'
+            raise QuerySyntaxError(f"Se esperaba {expected} y se encontró {found}")
+        self._pos += 1
+        return self._tokens[self._pos - 1][1]
+    
+    def _parse_or(self) -> QueryNode:
+        children = [self._parse_and()]
+        while self._peek() == 'or':
+            self._pos += 1
+            children.append(self._parse_and())
+        return children[0] if len(children) == 1 else Or(tuple(children))
+    
+    def _parse_and(self) -> QueryNode:
+        children = [self._parse_not()]
+        while self._peek() in ('and', 'not', '(', 'word'):
+            if self._peek() == 'and':
+                self._pos += 1
+            children.append(self._parse_not())
+        return children[0] if len(children) == 1 else And(tuple(children))
+    
+    def _parse_not(self) -> QueryNode:
+        if self._peek() == 'not':
+            self._pos += 1
+            return Not(self._parse_not())
+        if self._peek() == '(':
+            self._pos += 1
+            node = self._parse_or()
+            self._take(')')
+            return node
+        value = self._take('word')
+        field = None
+        if self._peek() == ':':
+            self._pos += 1
+            field, value = value, self._take('word')
+        term = Term(field, normalize_text(value))
+        self.terms.append(term)
+        return term
+    
+    # --- Evaluación ---
+    @staticmethod
+    def field_key(item: Dict, field: str) -> Optional[str]:
+        """Nombre real del campo en el elemento, sin distinguir mayúsculas"""
+        if field in item:
+            return field
+        upper = field.upper()
+        if upper in item:
+            return upper
+        lower = field.lower()
+        return next((key for key in item if str(key).lower() == lower), None)
+    
+    @staticmethod
+    def term_matches(term: Term, item: Dict) -> bool:
+        """Evalúa una condición sobre un elemento"""
+        if term.field is None:
+            return any(term.value in normalize_text(str(value)) for value in item.values())
+        key = AdvancedQuery.field_key(item, term.field)
+        return key is not None and term.value in normalize_text(str(item[key]))
+    
+    @staticmethod
+    def shadow_matches(term: Term, shadow: Dict[str, str]) -> bool:
+        """``term_matches`` sobre los valores ya normalizados de un elemento (sin volver a normalizar)"""
+        if term.field is None:
+            return any(term.value in value for value in shadow.values())
+        key = AdvancedQuery.field_key(shadow, term.field)
+        return key is not None and term.value in shadow[key]
+    
+    @staticmethod
+    def scan(term: Term, data: Sequence[Dict]) -> Set[int]:
+        """Filas que cumplen una condición, recorriendo solo el campo de la condición"""
+        if term.field is None:
+            return {i for i, item in enumerate(data) if AdvancedQuery.term_matches(term, item)}
+        value = term.value
+        rows = set()
+        for i, item in enumerate(data):
+            key = AdvancedQuery.field_key(item, term.field)
+            if key is not None and value in normalize_text(str(item[key])):
+                rows.add(i)
+        return rows
+    
+    def matches(self, item: Dict) -> bool:
+        """Evalúa la consulta completa sobre un solo elemento"""
+        def evaluate(node):
+            if isinstance(node, Term):
+                return self.term_matches(node, item)
+            if isinstance(node, Not):
+                return not evaluate(node.child)
+            if isinstance(node, And):
+                return all(evaluate(child) for child in node.children)
+            return any(evaluate(child) for child in node.children)
+        return evaluate(self.tree)
+    
+    def evaluate(self, term_rows: Callable[[Term], Set[int]], size: int) -> Tuple[Set[int], Dict[Term, Set[int]]]:
+        """
+        Filas que cumplen la consulta. ``term_rows`` da las filas de cada condición
+        (se llama una vez por condición distinta) y ``size`` es el total de filas,
+        necesario solo para un ``NOT`` que no está dentro de un ``AND``.
+        Devuelve también las filas de cada condición, para calcular relevancia.
+        """
+        cache: Dict[Term, Set[int]] = {}
+        
+        def rows_for(term):
+            if term not in cache:
+                cache[term] = term_rows(term)
+            return cache[term]
+        
+        def evaluate(node) -> Set[int]:
+            if isinstance(node, Term):
+                return rows_for(node)
+            if isinstance(node, Not):
+                return set(range(size)) - evaluate(node.child)
+            if isinstance(node, Or):
+                result = set()
+                for child in node.children:
+                    result |= evaluate(child)
+                return result
+            # AND: primero las condiciones positivas, de menor a mayor; las negadas se restan
+            positive = [child for child in node.children if not isinstance(child, Not)]
+            negative = [child.child for child in node.children if isinstance(child, Not)]
+            if not positive:
+                return set(range(size)) - set().union(*(evaluate(child) for child in negative))
+            sets = sorted((evaluate(child) for child in positive), key=len)
+            result = set(sets[0])
+            for other in sets[1:]:
+                if not result:
+                    break
+                result &= other
+            for child in negative:
+                if not result:
+                    break
+                result -= evaluate(child)
+            return result
+        
+        return evaluate(self.tree), cache
+    
+    def relevance(self, row: int, term_sets: Dict[Term, Set[int]]) -> float:
+        """50 puntos por cada condición de la consulta que cumple la fila"""
+        return 50.0 * sum(1 for term in self.terms if row in term_sets.get(term, ()))
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Distancia de edición entre ``a`` y ``b`` (Levenshtein más transposición de dos
+    letras vecinas, el error de tipeo más común), o ``max_distance + 1`` si la supera.
+    Usa el algoritmo de bits en paralelo de Hyyrö: una operación por carácter de ``b``.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    if not a or not b:
+        return min(max(len(a), len(b)), max_distance + 1)
+    masks: Dict[str, int] = {}
+    for i, char in enumerate(a):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    last = 1 << (len(a) - 1)
+    positive, negative, distance = full, 0, len(a)
+    diagonal = previous_match = 0
+    for char in b:
+        match = masks.get(char, 0)
+        transposed = (((~diagonal) & match) << 1) & previous_match
+        diagonal = (((match & positive) + positive) ^ positive) | match | negative | transposed
+        up = negative | (~(diagonal | positive) & full)
+        down = diagonal & positive
+        if up & last:
+            distance += 1
+        elif down & last:
+            distance -= 1
+        up = ((up << 1) | 1) & full
+        down = (down << 1) & full
+        positive = down | (~(diagonal | up) & full)
+        negative = up & diagonal
+        previous_match = match
+    return min(distance, max_distance + 1)
+
+class FuzzyIndex:
+    """
+    Índice para búsqueda tolerante a errores de tipeo.
+    
+    Guarda las palabras distintas de los valores (ya normalizados) con sus filas y
+    los bigramas de cada palabra, con marcas de inicio y fin y numerados por
+    repetición ("0000" tiene "00" tres veces). Una edición (incluida una transposición)
+    cambia a lo sumo tres bigramas, así que una palabra a distancia ``k`` de la consulta
+    comparte al menos ``bigramas(consulta) - 3k`` de ellos: se cuentan con ``np.bincount`` sobre las
+    listas de bigramas y solo las palabras que alcanzan ese mínimo se verifican con
+    la distancia de Levenshtein.
+    """
+    
+    _WORD = re.compile(r'\w+')
+    # Distancia máxima que se acepta en una palabra
+    MAX_DISTANCE = 2
+    
+    def __init__(self, rows: Iterable[Tuple[int, Sequence[str]]]):
+        """:param rows: pares (fila, valores normalizados con ``normalize_text``)."""
+        token_rows: Dict[str, array] = {}
+        size = 0
+        findall = self._WORD.findall
+        for row_id, values in rows:
+            size = max(size, row_id + 1)
+            # Cada palabra se cuenta una vez por fila
+            for token in set(findall(' '.join(values))):
+                postings = token_rows.get(token)
+                if postings is None:
+                    postings = token_rows[token] = array('q')
+                postings.append(row_id)
+        
+        self.size = size
+        self.tokens: List[str] = list(token_rows)
+        self._lengths = np.fromiter((len(token) for token in self.tokens), dtype=np.int64, count=len(self.tokens))
+        # Filas de cada palabra, todas en un solo arreglo: las de la palabra i van de offsets[i] a offsets[i + 1]
+        self._row_offsets = self._offsets(len(postings) for postings in token_rows.values())
+        self._row_data = np.frombuffer(b''.join(token_rows.values()), dtype=np.int64)
+        
+        # Palabras de cada bigrama, igual: se agrupan ordenando los pares (bigrama, palabra)
+        gram_ids: Dict[str, int] = {}
+        pair_grams = array('q')
+        pair_tokens = array('q')
+        for token_id, token in enumerate(self.tokens):
+            grams = self._grams(token)
+            pair_grams.extend(gram_ids.setdefault(gram, len(gram_ids)) for gram in grams)
+            pair_tokens.extend([token_id] * len(grams))
+        pair_grams = np.frombuffer(pair_grams, dtype=np.int64)
+        order = np.argsort(pair_grams, kind='stable')
+        self._gram_ids = gram_ids
+        self._gram_offsets = self._offsets(np.bincount(pair_grams, minlength=len(gram_ids)))
+        self._gram_data = np.frombuffer(pair_tokens, dtype=np.int64)[order]
+    
+    @staticmethod
+    def _offsets(counts: Iterable[int]) -> np.ndarray:
+        counts = np.fromiter(counts, dtype=np.int64)
+        return np.concatenate(([0], np.cumsum(counts)))
+    
+    @staticmethod
+    def _grams(token: str) -> List[str]:
+        """Bigramas con marcas de inicio y fin; las repeticiones llevan su número ('00', '00\x02'...)"""
+        padded = f"\x02{token}\x03"
+        grams = [padded[i:i + 2] for i in range(len(padded) - 1)]
+        if len(set(grams)) == len(grams):
+            return grams
+        seen: Dict[str, int] = {}
+        numbered = []
+        for gram in grams:
+            count = seen[gram] = seen.get(gram, 0) + 1
+            numbered.append(gram if count == 1 else gram + chr(count))
+        return numbered
+    
+    @classmethod
+    def default_distance(cls, word: str) -> int:
+        """Errores tolerados según el largo: ninguno hasta 2 caracteres, 1 hasta 7 y luego 2"""
+        return 0 if len(word) <= 2 else 1 if len(word) <= 7 else cls.MAX_DISTANCE
+    
+    def similar(self, word: str, max_distance: int) -> Dict[int, int]:
+        """Palabras del índice a distancia ``max_distance`` o menos: {id de palabra: distancia}"""
+        grams = self._grams(word)
+        threshold = len(grams) - 3 * max_distance
+        if threshold > 0:
+            offsets, data = self._gram_offsets, self._gram_data
+            ids = [self._gram_ids[gram] for gram in grams if gram in self._gram_ids]
+            if not ids:
+                return {}
+            postings = [data[offsets[i]:offsets[i + 1]] for i in ids]
+            counts = np.bincount(np.concatenate(postings), minlength=len(self.tokens))
+            candidates = np.flatnonzero(counts >= threshold)
+        else:
+            # Palabra muy corta para descartar por bigramas: basta con el largo
+            candidates = np.arange(len(self.tokens))
+        candidates = candidates[np.abs(self._lengths[candidates] - len(word)) <= max_distance]
+        
+        found = {}
+        for token_id in candidates.tolist():
+            distance = edit_distance(word, self.tokens[token_id], max_distance)
+            if distance <= max_distance:
+                found[token_id] = distance
+        return found
+    
+    def search(self, query: str, max_distance: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Filas donde cada palabra de la consulta (ya normalizada) tiene una palabra
+        parecida. Devuelve (filas, distancia total) ordenadas de menor a mayor
+        distancia y, a igual distancia, en el orden de las filas.
+        """
+        words = self._WORD.findall(query)
+        if not words or not self.size:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        
+        unmatched = np.iinfo(np.int64).max // (len(words) + 1)
+        total = np.zeros(self.size, dtype=np.int64)
+        for word in words:
+            limit = self.default_distance(word) if max_distance is None else min(max_distance, self.MAX_DISTANCE)
+            # Menor distancia de la palabra en cada fila
+            best = np.full(self.size, unmatched, dtype=np.int64)
+            for token_id, distance in self.similar(word, limit).items():
+                rows = self._row_data[self._row_offsets[token_id]:self._row_offsets[token_id + 1]]
+                best[rows] = np.minimum(best[rows], distance)
+            total += best
+        
+        rows = np.flatnonzero(total < unmatched)
+        order = np.argsort(total[rows], kind='stable')
+        return rows[order], total[rows][order]
+
 class SearchEngine:
     """Motor de búsqueda avanzado"""
     
     @staticmethod
-    def simple_search(query: str, data: List[Dict], case_sensitive: bool = False) -> List[Dict]:
-        """Búsqueda simple por texto"""
+    def simple_search(query: str, data: List[Dict], case_sensitive: bool = False,
+                      limit: Optional[int] = None) -> List[Dict]:
+        """Búsqueda simple por texto (con ``limit``, solo los ``limit`` más relevantes)"""
         if not case_sensitive:
-            query = query.lower()
+            query = normalize_text(query)
+        
+        if limit is not None:
+            words = normalize_text(query).split()
+            
+            def matches():
+                for item in data:
+                    # Cada valor se convierte una sola vez por consulta
+                    texts = [(key, str(value)) for key, value in item.items()]
+                    normalized = [(key, normalize_text(text)) for key, text in texts]
+                    compared = texts if case_sensitive else normalized
+                    if any(query in text for _, text in compared):
+                        values = [text for key, text in normalized if not key.startswith('_')]
+                        yield SearchEngine.score_values(words, values), item, compared
+            
+            results = []
+            # Solo se copian los elementos que quedan entre los mejores
+            for relevance, item, compared in heapq.nlargest(limit, matches(), key=lambda m: m[0]):
+                result = item.copy()
+                result['_match_fields'] = [key for key, text in compared if query in text]
+                result['_relevance'] = relevance
+                results.append(result)
+            return results
         
         results = []
         for item in data:
@@ -120,7 +676,7 @@ class SearchEngine:
             for key, value in item.items():
                 value_str = str(value)
                 if not case_sensitive:
-                    value_str = value_str.lower()
+                    value_str = normalize_text(value_str)
                 
                 if query in value_str:
                     found = True
@@ -138,14 +694,14 @@ class SearchEngine:
     def exact_search(query: str, data: List[Dict], case_sensitive: bool = False) -> List[Dict]:
         """Búsqueda exacta"""
         if not case_sensitive:
-            query = query.lower()
+            query = normalize_text(query)
         
         results = []
         for item in data:
             for key, value in item.items():
                 value_str = str(value)
                 if not case_sensitive:
-                    value_str = value_str.lower()
+                    value_str = normalize_text(value_str)
                 
                 if query == value_str:
                     result = item.copy()
@@ -157,17 +713,58 @@ class SearchEngine:
         return results
     
     @staticmethod
-    def field_search(field: str, query: str, data: List[Dict], case_sensitive: bool = False) -> List[Dict]:
-        """Búsqueda en un campo específico"""
+    def fuzzy_search(query: str, data: List[Dict], max_distance: Optional[int] = None,
+                     limit: Optional[int] = None, index: Optional[FuzzyIndex] = None) -> List[Dict]:
+        """
+        Búsqueda tolerante a errores de tipeo: cada palabra de la consulta debe tener
+        una palabra parecida en el elemento (ver ``FuzzyIndex``). Los resultados van
+        de menor a mayor ``_distance``; ``index`` permite reutilizar el índice de ``data``.
+        """
+        if index is None:
+            index = FuzzyIndex(
+                (row, [normalize_text(str(value)) for key, value in item.items() if not key.startswith('_')])
+                for row, item in enumerate(data)
+            )
+        rows, distances = index.search(normalize_text(query), max_distance)
+        if limit is not None:
+            rows, distances = rows[:limit], distances[:limit]
+        
+        results = []
+        for row, distance in zip(rows.tolist(), distances.tolist()):
+            result = data[row].copy()
+            result['_distance'] = distance
+            result['_relevance'] = 100.0 / (1 + distance)
+            results.append(result)
+        return results
+    
+    @staticmethod
+    def field_search(field: str, query: str, data: List[Dict], case_sensitive: bool = False,
+                     limit: Optional[int] = None) -> List[Dict]:
+        """Búsqueda en un campo específico (con ``limit``, solo los ``limit`` más relevantes)"""
         if not case_sensitive:
-            query = query.lower()
+            query = normalize_text(query)
+        
+        if limit is not None:
+            values = ((item, str(item[field])) for item in data if field in item)
+            matches = (
+                (SearchEngine.calculate_field_relevance(query, value), item)
+                for item, value in values
+                if query in (value if case_sensitive else normalize_text(value))
+            )
+            results = []
+            for relevance, item in heapq.nlargest(limit, matches, key=lambda m: m[0]):
+                result = item.copy()
+                result['_match_fields'] = [field]
+                result['_relevance'] = relevance
+                results.append(result)
+            return results
         
         results = []
         for item in data:
             if field in item:
                 value_str = str(item[field])
                 if not case_sensitive:
-                    value_str = value_str.lower()
+                    value_str = normalize_text(value_str)
                 
                 if query in value_str:
                     result = item.copy()
@@ -179,18 +776,17 @@ class SearchEngine:
     
     @staticmethod
     def advanced_search(query: str, data: List[Dict]) -> List[Dict]:
-        """Búsqueda avanzada con operadores"""
+        """Búsqueda avanzada con operadores: "campo:valor AND otro_campo:otro_valor" """
         try:
-            # Procesar consulta avanzada: "campo:valor AND otro_campo:otro_valor"
-            query = query.replace(' AND ', ' and ').replace(' OR ', ' or ')
-            query = query.replace(' NOT ', ' not ')
+            # La consulta se compila una sola vez y se evalúa condición por condición
+            plan = AdvancedQuery(query)
+            rows, term_sets = plan.evaluate(lambda term: AdvancedQuery.scan(term, data), len(data))
             
             results = []
-            for item in data:
-                if SearchEngine.evaluate_advanced_query(query, item):
-                    result = item.copy()
-                    result['_relevance'] = SearchEngine.calculate_advanced_relevance(query, item)
-                    results.append(result)
+            for row in sorted(rows):
+                result = data[row].copy()
+                result['_relevance'] = plan.relevance(row, term_sets)
+                results.append(result)
             
             return sorted(results, key=lambda x: x.get('_relevance', 0), reverse=True)
             
@@ -200,18 +796,35 @@ class SearchEngine:
             return SearchEngine.simple_search(query, data)
     
     @staticmethod
-    def calculate_relevance(query: str, item: Dict) -> float:
-        """Calcular relevancia de un resultado"""
-        relevance = 0.0
-        query_words = query.lower().split()
+    def top_k(query: str, candidates: Iterable[Tuple[int, Sequence[str]]], k: int) -> Tuple[int, List[Tuple[float, int]]]:
+        """
+        Ranking de las filas que ya coinciden con la consulta.
         
-        for key, value in item.items():
-            if key.startswith('_'):  # Ignorar campos especiales
-                continue
-                
-            value_str = str(value).lower()
-            
-            for word in query_words:
+        ``candidates`` da pares (fila, valores ya normalizados). Se mantiene un heap
+        acotado con los ``k`` mejores, O(n log k) en lugar de ordenar todo. Devuelve
+        el total de candidatos y [(relevancia, fila)] de mayor a menor relevancia;
+        los empates quedan en el orden de las filas, como con ``sorted``.
+        """
+        words = normalize_text(query).split()
+        heap: List[Tuple[float, int, int]] = []
+        total = 0
+        for row_id, values in candidates:
+            # En el heap, el peor elemento (menor relevancia, fila más alta) queda arriba
+            entry = (SearchEngine.score_values(words, values), -row_id, row_id)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry > heap[0]:
+                heapq.heapreplace(heap, entry)
+            total += 1
+        heap.sort(reverse=True)
+        return total, [(relevance, row_id) for relevance, _, row_id in heap]
+    
+    @staticmethod
+    def score_values(words: Sequence[str], values: Iterable[str]) -> float:
+        """``calculate_relevance`` sobre palabras y valores ya normalizados (``normalize_text``)"""
+        relevance = 0.0
+        for value_str in values:
+            for word in words:
                 if word in value_str:
                     # Coincidencia exacta del campo completo
                     if word == value_str:
@@ -231,11 +844,20 @@ class SearchEngine:
         
         return relevance
     
+    @staticmethod
+    def calculate_relevance(query: str, item: Dict) -> float:
+        """Calcular relevancia de un resultado"""
+        return SearchEngine.score_values(
+            normalize_text(query).split(),
+            # Ignorar campos especiales
+            [normalize_text(str(value)) for key, value in item.items() if not key.startswith('_')]
+        )
+    
     @staticmethod
     def calculate_field_relevance(query: str, field_value: str) -> float:
         """Calcular relevancia para búsqueda en campo específico"""
-        query_lower = query.lower()
-        field_lower = field_value.lower()
+        query_lower = normalize_text(query)
+        field_lower = normalize_text(field_value)
         
         if query_lower == field_lower:
             return 100.0
@@ -254,49 +876,296 @@ class SearchEngine:
     @staticmethod
     def calculate_advanced_relevance(query: str, item: Dict) -> float:
         """Calcular relevancia para búsqueda avanzada"""
-        # Implementación simplificada
-        relevance = 0.0
-        terms = re.findall(r'(\w+):(\w+)', query)
-        
-        for field, value in terms:
-            if field in item:
-                item_value = str(item[field]).lower()
-                if value.lower() in item_value:
-                    relevance += 50.0
-        
-        return relevance
+        try:
+            terms = AdvancedQuery(query).terms
+        except QuerySyntaxError:
+            return 0.0
+        return 50.0 * sum(1 for term in terms if AdvancedQuery.term_matches(term, item))
     
     @staticmethod
     def evaluate_advanced_query(query: str, item: Dict) -> bool:
-        """Evaluar consulta avanzada con operadores booleanos"""
+        """Evaluar consulta avanzada con operadores booleanos (sin ``eval``)"""
         try:
-            # Extraer términos campo:valor
-            field_terms = re.findall(r'(\w+):(\w+)', query)
-            conditions = []
-            
-            query_copy = query
-            for field, value in field_terms:
-                condition_result = False
-                if field in item:
-                    item_value = str(item[field]).lower()
-                    condition_result = value.lower() in item_value
-                
-                # Reemplazar en la consulta
-                pattern = f"{field}:{value}"
-                query_copy = query_copy.replace(pattern, str(condition_result))
-            
-            # Evaluar expresión booleana
-            # Seguridad: solo permitir True, False, and, or, not, paréntesis
-            allowed_tokens = {'True', 'False', 'and', 'or', 'not', '(', ')', ' '}
-            if all(token in allowed_tokens or token.isspace() for token in query_copy):
-                return eval(query_copy)
-            
-            return False
-            
-        except Exception as e:
+            return AdvancedQuery(query).matches(item)
+        except QuerySyntaxError as e:
             logger.error(f"Error evaluando consulta avanzada: {e}")
             return False
 
+class ColumnarFrame:
+    """
+    Representación por columnas para búsquedas vectorizadas.
+    
+    Cada columna se convierte una sola vez, y solo cuando se necesita, en una
+    ``Series`` de texto normalizado con ``normalize_text`` (categórica si tiene muchos valores repetidos,
+    como UBICADO o CUSTODIA: las operaciones se hacen sobre las categorías).
+    ``simple_search``, ``exact_search`` y ``field_search`` combinan máscaras de
+    columnas completas y devuelven lo mismo que los métodos de ``SearchEngine``.
+    """
+    
+    # Proporción máxima de valores distintos para guardar una columna como categórica
+    CATEGORY_RATIO = 0.5
+    
+    def __init__(self, columns: Sequence[str], length: int,
+                 column_loader: Callable[[str], Sequence[Optional[str]]],
+                 rows_loader: Callable[[List[int]], List[Dict]]):
+        """
+        :param column_loader: valores de una columna como texto (None si la fila no tiene el campo).
+        :param rows_loader: elementos originales de varias filas, en el orden pedido.
+        """
+        self.columns = list(columns)
+        self.length = length
+        self._load_column = column_loader
+        self._load_rows = rows_loader
+        self._raw: Dict[str, pd.Series] = {}
+        self._normalized: Dict[str, pd.Series] = {}
+        self._joined: Dict[Tuple[str, bool], Tuple[str, np.ndarray]] = {}
+    
+    @classmethod
+    def from_records(cls, data: List[Dict]) -> 'ColumnarFrame':
+        columns = list(dict.fromkeys(key for item in data for key in item))
+        
+        def load(column):
+            return [str(item[column]) if column in item else None for item in data]
+        return cls(columns, len(data), load, lambda rows: [data[row] for row in rows])
+    
+    @classmethod
+    def from_dataframe(cls, df: pd.DataFrame) -> 'ColumnarFrame':
+        # Cada fila tiene todas las columnas: los vacíos se comparan como 'nan', igual que con to_dict
+        def load(column):
+            return [str(value) for value in df[column].tolist()]
+        return cls([str(c) for c in df.columns], len(df), load, lambda rows: df.iloc[rows].to_dict('records'))
+    
+    # --- Columnas ---
+    def raw(self, column: str) -> pd.Series:
+        if column not in self._raw:
+            self._raw[column] = pd.Series(self._load_column(column), dtype=STRING_DTYPE)
+        return self._raw[column]
+    
+    def normalized(self, column: str) -> pd.Series:
+        if column not in self._normalized:
+            raw = self.raw(column)
+            # normalize_text una vez por valor distinto, no por fila
+            mapping = {value: normalize_text(value) for value in raw.dropna().unique()}
+            normalized = raw.map(mapping)
+            if normalized.nunique() <= self.CATEGORY_RATIO * self.length:
+                normalized = normalized.astype('category')
+            else:
+                normalized = normalized.astype(STRING_DTYPE)
+            self._normalized[column] = normalized
+        return self._normalized[column]
+    
+    def field_key(self, field: str) -> Optional[str]:
+        """Nombre real de la columna, sin distinguir mayúsculas (como ``AdvancedQuery.field_key``)"""
+        if field in self.columns:
+            return field
+        if field.upper() in self.columns:
+            return field.upper()
+        lower = field.lower()
+        return next((column for column in self.columns if column.lower() == lower), None)
+    
+    @staticmethod
+    def _apply(series: pd.Series, operation: Callable[[pd.Series], pd.Series],
+               rows: Optional[np.ndarray] = None, default=False) -> np.ndarray:
+        """
+        Aplica una operación de texto a toda la columna o solo a ``rows``. En columnas
+        categóricas se aplica una vez por categoría y se reparte por los códigos.
+        ``default`` es el resultado para valores ausentes.
+        """
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            values = operation(pd.Series(series.cat.categories, dtype=object))
+            # El código -1 (valor ausente) toma el último elemento
+            values = np.append(values.to_numpy(dtype=type(default), na_value=default), default)
+            codes = series.cat.codes.to_numpy()
+            return values[codes if rows is None else codes[rows]]
+        if rows is not None:
+            series = series.iloc[rows]
+        return operation(series).to_numpy(dtype=type(default), na_value=default)
+    
+    def _joined_text(self, column: str, case_sensitive: bool) -> Tuple[str, np.ndarray]:
+        """Valores de la columna unidos por '\x00' y el desplazamiento donde empieza cada fila"""
+        if (column, case_sensitive) not in self._joined:
+            series = self.raw(column) if case_sensitive else self.normalized(column)
+            values = [value if isinstance(value, str) else '' for value in series.tolist()]
+            lengths = np.fromiter((len(value) + 1 for value in values), dtype=np.int64, count=len(values))
+            starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            self._joined[(column, case_sensitive)] = ('\x00'.join(values), starts)
+        return self._joined[(column, case_sensitive)]
+    
+    def contains(self, column: str, query: str, case_sensitive: bool = False) -> np.ndarray:
+        series = self.raw(column) if case_sensitive else self.normalized(column)
+        if (isinstance(series.dtype, pd.CategoricalDtype) or STRING_DTYPE is not object
+                or not query or '\x00' in query):
+            return self._apply(series, lambda s: s.str.contains(query, regex=False))
+        
+        # Sin pyarrow, str.contains recorre la columna en Python: es más rápido buscar
+        # con str.find sobre todo el texto unido y pasar cada posición a su fila.
+        text, starts = self._joined_text(column, case_sensitive)
+        mask = np.zeros(self.length, dtype=bool)
+        position = text.find(query)
+        while position >= 0:
+            row = int(np.searchsorted(starts, position, side='right')) - 1
+            mask[row] = True
+            if row + 1 >= self.length:
+                break
+            position = text.find(query, int(starts[row + 1]))
+        return mask
+    
+    def equals(self, column: str, query: str, case_sensitive: bool = False) -> np.ndarray:
+        series = self.raw(column) if case_sensitive else self.normalized(column)
+        return self._apply(series, lambda s: s == query)
+    
+    def contains_rows(self, field: str, value: str) -> Set[int]:
+        """Filas donde el campo contiene ``value`` (ya normalizado)"""
+        column = self.field_key(field)
+        if column is None:
+            return set()
+        return set(np.flatnonzero(self.contains(column, value)).tolist())
+    
+    # --- Búsquedas ---
+    def _results(self, rows: np.ndarray, masks: Dict[str, np.ndarray], relevance,
+                 first_only: bool = False) -> List[Dict]:
+        """
+        Materializa las filas en el orden dado, con ``_match_fields`` (campos cuya
+        máscara es verdadera, en el orden del elemento) y ``_relevance``.
+        """
+        hits = {column: mask[rows].tolist() for column, mask in masks.items() if mask[rows].any()}
+        scores = relevance[rows].tolist() if isinstance(relevance, np.ndarray) else [relevance] * len(rows)
+        results = []
+        for i, item in enumerate(self._load_rows(rows.tolist())):
+            if len(hits) == 1:
+                fields = list(hits)
+            else:
+                fields = [key for key in item if key in hits and hits[key][i]]
+            result = item.copy()
+            # Como el recorrido original de exact_search: solo el primer campo que coincide
+            result['_match_fields'] = fields[:1] if first_only else fields
+            result['_relevance'] = scores[i]
+            results.append(result)
+        return results
+    
+    @staticmethod
+    def _ranked(rows: np.ndarray, relevance: np.ndarray, limit: Optional[int]) -> np.ndarray:
+        # Orden estable, igual que sorted(..., reverse=True) sobre los elementos en orden
+        order = rows[np.argsort(-relevance[rows], kind='stable')]
+        return order if limit is None else order[:limit]
+    
+    def simple_search(self, query: str, case_sensitive: bool = False, limit: Optional[int] = None) -> List[Dict]:
+        """Equivalente vectorizado de ``SearchEngine.simple_search``"""
+        needle = query if case_sensitive else normalize_text(query)
+        masks = {column: self.contains(column, needle, case_sensitive) for column in self.columns}
+        matched = np.zeros(self.length, dtype=bool)
+        for mask in masks.values():
+            matched |= mask
+        rows = np.flatnonzero(matched)
+        
+        # Relevancia de calculate_relevance, por columna y palabra, solo en las filas encontradas
+        relevance = np.zeros(self.length)
+        for column in self.columns:
+            if column.startswith('_'):
+                continue
+            normalized = self.normalized(column)
+            for word in normalize_text(query).split():
+                found = masks[column] if word == needle and not case_sensitive else self.contains(column, word)
+                found_rows = np.flatnonzero(found & matched)
+                if not len(found_rows):
+                    continue
+                score = np.select(
+                    [self._apply(normalized, lambda s: s == word, found_rows),
+                     self._apply(normalized, lambda s: s.str.startswith(word), found_rows),
+                     self._apply(normalized, lambda s: s.str.endswith(word), found_rows)],
+                    [20.0, 10.0, 5.0], 2.0)
+                # Dos sumas, en el mismo orden que calculate_relevance, para obtener el mismo float
+                relevance[found_rows] += score
+                relevance[found_rows] += len(word) * 0.1
+        
+        return self._results(self._ranked(rows, relevance, limit), masks, relevance)
+    
+    def exact_search(self, query: str, case_sensitive: bool = False) -> List[Dict]:
+        """Equivalente vectorizado de ``SearchEngine.exact_search``"""
+        needle = query if case_sensitive else normalize_text(query)
+        masks = {column: self.equals(column, needle, case_sensitive) for column in self.columns}
+        matched = np.zeros(self.length, dtype=bool)
+        for mask in masks.values():
+            matched |= mask
+        return self._results(np.flatnonzero(matched), masks, 100, first_only=True)
+    
+    def field_search(self, field: str, query: str, case_sensitive: bool = False,
+                     limit: Optional[int] = None) -> List[Dict]:
+        """Equivalente vectorizado de ``SearchEngine.field_search``"""
+        if field not in self.columns:
+            return []
+        needle = query if case_sensitive else normalize_text(query)
+        rows = np.flatnonzero(self.contains(field, needle, case_sensitive))
+        
+        # Relevancia de calculate_field_relevance, solo en las filas encontradas
+        normalized_query = normalize_text(query)
+        normalized = self.normalized(field)
+        position = self._apply(normalized, lambda s: s.str.find(normalized_query), rows, default=-1.0)
+        length = self._apply(normalized, lambda s: s.str.len(), rows, default=0.0)
+        relevance = np.zeros(self.length)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            relevance[rows] = np.select(
+                [self._apply(normalized, lambda s: s == normalized_query, rows),
+                 self._apply(normalized, lambda s: s.str.startswith(normalized_query), rows),
+                 self._apply(normalized, lambda s: s.str.endswith(normalized_query), rows),
+                 position >= 0],
+                [100.0, 80.0, 60.0, 40.0 + ((length - position) / length) * 20.0], 0.0)
+        
+        mask = np.zeros(self.length, dtype=bool)
+        mask[rows] = True
+        return self._results(self._ranked(rows, relevance, limit), {field: mask}, relevance)
+
+class SearchAnalytics:
+    """
+    Estadísticas del historial de búsquedas que se actualizan con cada entrada
+    (``add``) en lugar de recalcularse sobre todo el historial. Se cuentan como
+    mucho ``max_queries`` consultas distintas: al superarlas se conserva solo la
+    mitad más frecuente, así que los conteos de consultas raras son aproximados.
+    """
+
+    def __init__(self, max_queries: int = 10000):
+        self.max_queries = max(max_queries, 2)
+        self.total = 0
+        self.queries: Counter = Counter()
+        self.types: Counter = Counter()
+        self.hours = [0] * 24
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _hour(timestamp) -> Optional[int]:
+        if isinstance(timestamp, datetime):
+            return timestamp.hour
+        try:
+            return datetime.fromisoformat(timestamp).hour
+        except (TypeError, ValueError):
+            return None
+
+    def add(self, entry: Dict) -> None:
+        """Suma una entrada del historial (``query`` y, opcionales, ``type`` y ``timestamp``)."""
+        hour = self._hour(entry.get('timestamp'))
+        with self._lock:
+            self.total += 1
+            self.queries[entry['query']] += 1
+            self.types[entry.get('type', 'general')] += 1
+            if hour is not None:
+                self.hours[hour] += 1
+            if len(self.queries) > self.max_queries:
+                self.queries = Counter(dict(self.queries.most_common(self.max_queries // 2)))
+
+    def summary(self, recent_searches: List[Dict]) -> Dict[str, Any]:
+        """Resumen con las claves de ``DataAnalyzer.get_search_analytics``."""
+        if not self.total:
+            return {}
+        with self._lock:
+            return {
+                'total_searches': self.total,
+                'unique_queries': len(self.queries),
+                'most_common_queries': dict(self.queries.most_common(10)),
+                'searches_by_type': dict(self.types.most_common()),
+                'recent_searches': recent_searches,
+                'searches_by_hour': {hour: count for hour, count in enumerate(self.hours) if count},
+            }
+
 class DataAnalyzer:
     """Analizador de datos para estadísticas"""
     
@@ -330,27 +1199,14 @@ class DataAnalyzer:
     
     @staticmethod
     def get_search_analytics(search_history: List[Dict]) -> Dict[str, Any]:
-        """Analizar historial de búsquedas"""
-        if not search_history:
-            return {}
-        
-        df = pd.DataFrame(search_history)
-        
-        analytics = {
-            'total_searches': len(search_history),
-            'unique_queries': df['query'].nunique(),
-            'most_common_queries': df['query'].value_counts().head(10).to_dict(),
-            'searches_by_type': df.get('type', pd.Series(['general'] * len(df))).value_counts().to_dict(),
-            'recent_searches': search_history[-10:] if len(search_history) > 10 else search_history
-        }
-        
-        # Análisis temporal si hay timestamps
-        if 'timestamp' in df.columns:
-            df['timestamp'] = pd.to_datetime(df['timestamp'])
-            df['hour'] = df['timestamp'].dt.hour
-            analytics['searches_by_hour'] = df['hour'].value_counts().sort_index().to_dict()
-        
-        return analytics
+        """
+        Analizar historial de búsquedas completo. Para un historial que crece, es
+        mejor mantener un ``SearchAnalytics`` y sumarle cada búsqueda al registrarla.
+        """
+        analytics = SearchAnalytics(max(len(search_history), 2))
+        for entry in search_history:
+            analytics.add(entry)
+        return analytics.summary(list(search_history[-10:]))
 
 class ExportManager:
     """Manejador de exportaciones"""
@@ -416,6 +1272,133 @@ class ExportManager:
         
         return filepath
 
+    # --- Exportación en streaming (ruta /export) ---
+    # Filas por bloque enviado al cliente en CSV y JSON
+    STREAM_CHUNK_ROWS = 1000
+    # Filas de datos que admite una hoja de Excel (más el encabezado)
+    XLSX_MAX_ROWS = 1_048_575
+
+    @staticmethod
+    def iter_csv(columns: Sequence[str], records: Iterable[Dict]) -> Iterator[bytes]:
+        """CSV en UTF-8 (con BOM, para que Excel reconozca los acentos) por bloques de filas"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        buffer.write('\ufeff')
+        writer.writerow(columns)
+        for count, record in enumerate(records, 1):
+            writer.writerow([record.get(column) for column in columns])
+            if count % ExportManager.STREAM_CHUNK_ROWS == 0:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode('utf-8')
+
+    @staticmethod
+    def iter_json(records: Iterable[Dict], dumps: Callable[[Any], bytes]) -> Iterator[bytes]:
+        """Lista JSON con un registro por línea, generada por bloques de filas"""
+        chunk = [b'[']
+        separator = b'\n'
+        for count, record in enumerate(records, 1):
+            chunk.append(separator + dumps(record))
+            separator = b',\n'
+            if count % ExportManager.STREAM_CHUNK_ROWS == 0:
+                yield b''.join(chunk)
+                chunk = []
+        chunk.append(b'\n]\n')
+        yield b''.join(chunk)
+
+    @staticmethod
+    def _xlsx_cell(worksheet, value):
+        """Valor para una celda de openpyxl: sin caracteres de control y sin fórmulas"""
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+        if value is None or isinstance(value, (int, float)):
+            return value
+        value = ILLEGAL_CHARACTERS_RE.sub('', str(value))
+        if value.startswith('='):
+            # Un texto que empieza con '=' se guardaría como fórmula
+            cell = WriteOnlyCell(worksheet, value)
+            cell.data_type = 's'
+            return cell
+        return value
+
+    @staticmethod
+    def iter_xlsx(columns: Sequence[str], records: Iterable[Dict], sheet_name: str = 'Datos',
+                  chunk_bytes: int = 1 << 16) -> Iterator[bytes]:
+        """
+        XLSX con openpyxl en modo write_only. Las filas van al archivo temporal de
+        openpyxl a medida que llegan (memoria constante); al final el zip se escribe
+        desde otro hilo hacia una cola acotada que este generador va entregando.
+        Si el cliente se desconecta (se cierra el generador), el hilo se detiene.
+        """
+        from openpyxl import Workbook
+
+        chunks: 'queue.Queue' = queue.Queue(maxsize=8)
+        cancelled = threading.Event()
+
+        def put(item):
+            while True:
+                try:
+                    chunks.put(item, timeout=1)
+                    return
+                except queue.Full:
+                    if cancelled.is_set():
+                        raise InterruptedError('Exportación cancelada')
+
+        class Sink(io.RawIOBase):
+            """Archivo de solo escritura y sin posición (zipfile lo admite)"""
+            def __init__(self):
+                super().__init__()
+                self.pending = bytearray()
+
+            def writable(self):
+                return True
+
+            def write(self, data):
+                if cancelled.is_set():
+                    raise InterruptedError('Exportación cancelada')
+                self.pending += data
+                if len(self.pending) >= chunk_bytes:
+                    put(bytes(self.pending))
+                    self.pending.clear()
+                return len(data)
+
+        def produce():
+            try:
+                workbook = Workbook(write_only=True)
+                worksheet = workbook.create_sheet(sheet_name)
+                worksheet.append(list(columns))
+                for record in records:
+                    if cancelled.is_set():
+                        return
+                    worksheet.append([ExportManager._xlsx_cell(worksheet, record.get(column)) for column in columns])
+                sink = Sink()
+                workbook.save(sink)
+                put(bytes(sink.pending))
+                put(None)
+            except InterruptedError:
+                pass
+            except Exception as e:
+                logger.exception("Error generando la exportación XLSX")
+                try:
+                    put(e)
+                except InterruptedError:
+                    pass
+
+        producer = threading.Thread(target=produce, name='xlsx-export', daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = chunks.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+
 class ValidationUtils:
     """Utilidades de validación"""
     